@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+import time
+import MetaTrader5 as mt5
+
+logger = logging.getLogger(__name__)
+
+# Sampling interval when no consumer asks for a faster one
+BASE_INTERVAL_SECONDS = float(os.environ.get('MT5_API_ACCOUNT_SAMPLE_MS', 1000)) / 1000
+# Staleness accepted by readers that do not specify max_age_ms
+DEFAULT_MAX_AGE_MS = 1000
+
+# Fields whose changes are published to subscribers
+WATCHED_FIELDS = ('balance', 'equity', 'margin', 'margin_free', 'margin_level', 'profit')
+
+_account_info = None
+_sampled_at = 0.0
+_state_lock = threading.Lock()
+# Serializes terminal reads
+_refresh_lock = threading.Lock()
+
+# {name: seconds} requested by consumers; the sampler runs at the smallest
+_intervals = {}
+_subscribers = []
+_wake_event = threading.Event()
+
+_worker_thread = None
+_stop_event = threading.Event()
+
+def _publish(previous, account_info):
+    """Notify subscribers of changed watched fields."""
+    changes = {
+        field: (getattr(previous, field) if previous is not None else None, getattr(account_info, field))
+        for field in WATCHED_FIELDS
+        if previous is None or getattr(previous, field) != getattr(account_info, field)
+    }
+    if not changes:
+        return
+    for callback in list(_subscribers):
+        try:
+            callback(account_info, changes)
+        except Exception as e:
+            logger.error(f"Error in account state subscriber {getattr(callback, '__name__', callback)}: {str(e)}")
+
+def _read_terminal():
+    """Read account_info, update the cache and publish changes. Caller must hold _refresh_lock."""
+    global _account_info, _sampled_at
+    account_info = mt5.account_info()
+    if account_info is None:
+        logger.error(f"Failed to get account info. Last error: {mt5.last_error()}")
+        return None
+    with _state_lock:
+        previous = _account_info
+        _account_info = account_info
+        _sampled_at = time.monotonic()
+    _publish(previous, account_info)
+    return account_info
+
+def refresh():
+    """Read account_info from the terminal now."""
+    with _refresh_lock:
+        return _read_terminal()
+
+def _cached(max_age_ms: float):
+    with _state_lock:
+        if _account_info is not None and (time.monotonic() - _sampled_at) * 1000 <= max_age_ms:
+            return _account_info
+    return None
+
+def get_account_info(max_age_ms: float = DEFAULT_MAX_AGE_MS):
+    """
+    Return the cached account_info.
+
+    Args:
+        max_age_ms: If the cached value is older than this many milliseconds, it is
+            refreshed from the terminal first.
+
+    Returns:
+        The MT5 AccountInfo namedtuple, or None if a refresh failed.
+    """
+    account_info = _cached(max_age_ms)
+    if account_info is not None:
+        return account_info
+    with _refresh_lock:
+        # Concurrent stale readers share the refresh done by the first one
+        return _cached(max_age_ms) or _read_terminal()
+
+def get_age_ms():
+    """Milliseconds since the cached account_info was read, or None if there is none."""
+    with _state_lock:
+        return None if _account_info is None else (time.monotonic() - _sampled_at) * 1000
+
+def invalidate():
+    """Forget the cached account_info, e.g. after logging in to another account."""
+    global _account_info
+    with _state_lock:
+        _account_info = None
+
+def subscribe(callback):
+    """Call callback(account_info, changes) with {field: (old, new)} whenever a watched field changes."""
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+def unsubscribe(callback):
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+def request_interval(name: str, seconds: float = None):
+    """Ask the sampler to run at least every `seconds`; None withdraws the request."""
+    if seconds is None:
+        _intervals.pop(name, None)
+    else:
+        _intervals[name] = seconds
+    _wake_event.set()
+
+def _current_interval():
+    return min([BASE_INTERVAL_SECONDS, *_intervals.values()])
+
+def account_state_worker():
+    """Sample account_info at the fastest requested interval."""
+    logger.info("Account state sampler started.")
+    while not _stop_event.is_set():
+        try:
+            refresh()
+        except Exception as e:
+            logger.error(f"Error in account state sampler: {str(e)}")
+
+        # Interval requests wake the loop so a faster rate applies immediately
+        _wake_event.wait(_current_interval())
+        _wake_event.clear()
+    logger.info("Account state sampler stopped.")
+
+def start_worker():
+    """Start the account state sampler thread."""
+    global _worker_thread
+    if _worker_thread is None or not _worker_thread.is_alive():
+        _stop_event.clear()
+        _worker_thread = threading.Thread(target=account_state_worker, daemon=True)
+        _worker_thread.start()
+    else:
+        logger.info("Account state sampler is already running.")
+
+def stop_worker():
+    """Stop the account state sampler thread."""
+    global _worker_thread
+    if _worker_thread is not None and _worker_thread.is_alive():
+        _stop_event.set()
+        _wake_event.set()
+        _worker_thread.join(timeout=10)
+    _worker_thread = None
@@ -0,0 +1,343 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import MetaTrader5 as mt5
+from datetime import datetime
+from price_level_index import PriceLevelIndex
+from symbol_cache import get_symbol_info
+from telegram_utils import send_telegram_message
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn tới thư mục cấu hình trong volume
+CONFIG_DIR = "/config"
+ALERTS_FILE = os.path.join(CONFIG_DIR, "alerts.json")
+
+# Tick polling interval of the engine
+CHECK_INTERVAL_SECONDS = float(os.environ.get('MT5_API_ALERT_INTERVAL', 0.25))
+
+# Triggered alerts kept for listing; the oldest are dropped first
+MAX_TRIGGERED_ALERTS = 1000
+
+ALERT_TYPES = ('price_cross', 'percent_move', 'spread')
+
+# Per symbol indexes, by the value they watch and the direction that triggers them.
+# Spread is expressed in points and only triggers when it widens.
+INDEX_NAMES = ('bid_up', 'bid_down', 'ask_up', 'ask_down', 'spread_up')
+# Position of the watched value in the (bid, ask, spread) tuple of each index
+INDEX_VALUES = {'bid_up': 0, 'bid_down': 0, 'ask_up': 1, 'ask_down': 1, 'spread_up': 2}
+
+# {alert_id: alert_dict}, insertion ordered
+alerts = {}
+_indexes = {}
+# Last seen (bid, ask, spread) per symbol
+_last_values = {}
+# {symbol: {alert_id}} registered since the last tick, checked against the next one
+_fresh_alerts = {}
+_lock = threading.RLock()
+
+_worker_thread = None
+_stop_event = threading.Event()
+
+def _symbol_indexes(symbol):
+    if symbol not in _indexes:
+        _indexes[symbol] = {name: PriceLevelIndex() for name in INDEX_NAMES}
+    return _indexes[symbol]
+
+def _index_alert(alert):
+    """Add the levels of an active alert to the indexes. Caller must hold _lock."""
+    indexes = _symbol_indexes(alert['symbol'])
+    for index_name, level in alert['levels']:
+        indexes[index_name].add(level, alert['id'])
+
+def _unindex_alert(alert):
+    """Remove the levels of an alert from the indexes. Caller must hold _lock."""
+    indexes = _indexes.get(alert['symbol'])
+    if indexes is None:
+        return
+    for index_name, level in alert['levels']:
+        indexes[index_name].remove(level, alert['id'])
+    fresh = _fresh_alerts.get(alert['symbol'])
+    if fresh is not None:
+        fresh.discard(alert['id'])
+    if not any(len(index) for index in indexes.values()):
+        del _indexes[alert['symbol']]
+        _last_values.pop(alert['symbol'], None)
+        _fresh_alerts.pop(alert['symbol'], None)
+
+def _level_reached(index_name, level, values):
+    """True if the (bid, ask, spread) values are at or beyond an indexed level."""
+    value = values[INDEX_VALUES[index_name]]
+    return value >= level if index_name.endswith('_up') else value <= level
+
+def save_alerts():
+    """Persist alerts to alerts.json."""
+    try:
+        with _lock:
+            data = list(alerts.values())
+        tmp_file = ALERTS_FILE + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_file, ALERTS_FILE)
+    except Exception as e:
+        logger.error(f"Error saving alerts to {ALERTS_FILE}: {str(e)}")
+
+def load_alerts():
+    """Restore alerts from alerts.json."""
+    if not os.path.exists(ALERTS_FILE):
+        return
+    try:
+        with open(ALERTS_FILE, 'r') as f:
+            data = json.load(f)
+        with _lock:
+            for alert in data:
+                alerts[alert['id']] = alert
+                if alert['status'] == 'active':
+                    _index_alert(alert)
+        logger.info(f"Loaded {len(data)} alerts from {ALERTS_FILE}")
+    except Exception as e:
+        logger.error(f"Error loading alerts from {ALERTS_FILE}: {str(e)}")
+
+def _spread_points(tick, point):
+    return round((tick.ask - tick.bid) / point, 1)
+
+def create_alert(symbol: str, alert_type: str, level: float = None, direction: str = None,
+                 percent: float = None, threshold: float = None, price: str = 'bid', note: str = None):
+    """
+    Register a one-shot alert.
+
+    Args:
+        symbol: Symbol to watch.
+        alert_type: 'price_cross', 'percent_move' or 'spread'.
+        level: price_cross: price that has to be crossed.
+        direction: price_cross: 'above' or 'below'; percent_move: 'up', 'down' or 'both'.
+        percent: percent_move: move relative to the current price, in percent.
+        threshold: spread: spread in points that has to be reached.
+        price: Side of the quote to watch for price alerts, 'bid' or 'ask'.
+        note: Free text added to the notification.
+
+    Returns:
+        The registered alert.
+
+    Raises:
+        ValueError: If the parameters are invalid or the condition is already met.
+    """
+    if alert_type not in ALERT_TYPES:
+        raise ValueError(f"Invalid alert type. Must be one of {list(ALERT_TYPES)}")
+    if price not in ('bid', 'ask'):
+        raise ValueError("price must be 'bid' or 'ask'")
+
+    symbol_info = get_symbol_info(symbol)
+    if symbol_info is None:
+        raise ValueError(f"Symbol {symbol} not found")
+    tick = mt5.symbol_info_tick(symbol)
+    if tick is None:
+        raise ValueError(f"Failed to get tick for symbol: {symbol}")
+    current = tick.bid if price == 'bid' else tick.ask
+
+    if alert_type == 'price_cross':
+        if level is None or direction not in ('above', 'below'):
+            raise ValueError("price_cross alerts require level and direction ('above' or 'below')")
+        level = float(level)
+        if (direction == 'above' and level <= current) or (direction == 'below' and level >= current):
+            raise ValueError(f"Level {level} is already reached at the current {price} {current}")
+        levels = [[f"{price}_{'up' if direction == 'above' else 'down'}", level]]
+
+    elif alert_type == 'percent_move':
+        if percent is None or float(percent) <= 0 or direction not in ('up', 'down', 'both'):
+            raise ValueError("percent_move alerts require a positive percent and direction ('up', 'down' or 'both')")
+        # Converted once to absolute levels so the tick loop only compares prices
+        move = current * float(percent) / 100
+        levels = []
+        if direction in ('up', 'both'):
+            levels.append([f"{price}_up", round(current + move, symbol_info.digits)])
+        if direction in ('down', 'both'):
+            levels.append([f"{price}_down", round(current - move, symbol_info.digits)])
+
+    else:
+        if threshold is None or float(threshold) <= 0:
+            raise ValueError("spread alerts require a positive threshold in points")
+        current = _spread_points(tick, symbol_info.point)
+        if current >= float(threshold):
+            raise ValueError(f"Spread is already {current} points")
+        levels = [['spread_up', float(threshold)]]
+
+    alert = {
+        "id": uuid.uuid4().hex,
+        "symbol": symbol,
+        "type": alert_type,
+        "direction": direction,
+        "price": price,
+        "level": level,
+        "percent": percent,
+        "threshold": threshold,
+        "reference": current,
+        "levels": levels,
+        "note": note,
+        "status": "active",
+        "created": time.time(),
+        "triggered": None,
+        "triggered_value": None,
+    }
+    with _lock:
+        alerts[alert['id']] = alert
+        _index_alert(alert)
+        if symbol in _last_values:
+            # Checked directly against the next tick, see _collect_triggered
+            _fresh_alerts.setdefault(symbol, set()).add(alert['id'])
+    save_alerts()
+    logger.info(f"Alert {alert['id']} registered: {alert_type} on {symbol} {levels}")
+    return dict(alert)
+
+def delete_alert(alert_id: str) -> bool:
+    """Delete an alert. Returns False if it does not exist."""
+    with _lock:
+        alert = alerts.pop(alert_id, None)
+        if alert is None:
+            return False
+        if alert['status'] == 'active':
+            _unindex_alert(alert)
+    save_alerts()
+    logger.info(f"Alert {alert_id} deleted.")
+    return True
+
+def get_alerts(symbol: str = None, status: str = None):
+    """Return alerts, optionally filtered by symbol and status."""
+    with _lock:
+        return [
+            dict(alert) for alert in alerts.values()
+            if (symbol is None or alert['symbol'] == symbol) and (status is None or alert['status'] == status)
+        ]
+
+def _prune_triggered_alerts():
+    """Drop the oldest triggered alerts beyond MAX_TRIGGERED_ALERTS. Caller must hold _lock."""
+    triggered = [alert_id for alert_id, alert in alerts.items() if alert['status'] == 'triggered']
+    for alert_id in triggered[:max(0, len(triggered) - MAX_TRIGGERED_ALERTS)]:
+        del alerts[alert_id]
+
+def _collect_triggered(symbol, tick, point):
+    """Return {alert_id: value} for levels crossed since the previous tick or reached by fresh alerts. Caller must hold _lock."""
+    values = (tick.bid, tick.ask, _spread_points(tick, point))
+    previous = _last_values.get(symbol)
+    _last_values[symbol] = values
+    if previous is None:
+        # First tick (e.g. after a restart): levels already beyond the price count as crossed
+        previous_up = (float('-inf'),) * 3
+        previous_down = (float('inf'),) * 3
+    else:
+        previous_up = previous_down = previous
+
+    indexes = _indexes[symbol]
+    triggered = {}
+    for alert_id in indexes['bid_up'].pop_crossed_up(previous_up[0], values[0]):
+        triggered[alert_id] = values[0]
+    for alert_id in indexes['bid_down'].pop_crossed_down(previous_down[0], values[0]):
+        triggered[alert_id] = values[0]
+    for alert_id in indexes['ask_up'].pop_crossed_up(previous_up[1], values[1]):
+        triggered[alert_id] = values[1]
+    for alert_id in indexes['ask_down'].pop_crossed_down(previous_down[1], values[1]):
+        triggered[alert_id] = values[1]
+    for alert_id in indexes['spread_up'].pop_crossed_up(previous_up[2], values[2]):
+        triggered[alert_id] = values[2]
+
+    # An alert registered between ticks was checked against the live price, which may
+    # lie on the other side of its level than the previous tick, so the move from the
+    # previous tick would never cross it
+    for alert_id in _fresh_alerts.pop(symbol, ()):
+        alert = alerts.get(alert_id)
+        if alert is None or alert_id in triggered:
+            continue
+        for index_name, level in alert['levels']:
+            if _level_reached(index_name, level, values):
+                triggered[alert_id] = values[INDEX_VALUES[index_name]]
+                break
+    return triggered
+
+def format_alert_message(alert):
+    """Định dạng tin nhắn Telegram cho một cảnh báo đã kích hoạt."""
+    time_str = datetime.fromtimestamp(alert['triggered']).strftime("%Y-%m-%d %H:%M:%S")
+    if alert['type'] == 'price_cross':
+        condition = f"{alert['price'].capitalize()} {alert['direction']} {alert['level']}"
+    elif alert['type'] == 'percent_move':
+        condition = f"{alert['price'].capitalize()} moved {alert['percent']}% {alert['direction']} from {alert['reference']}"
+    else:
+        condition = f"Spread reached {alert['threshold']} points"
+    message = (
+        "🚨 *Price Alert (MT5)*\n"
+        f"**Symbol**: {alert['symbol']}\n"
+        f"**Condition**: {condition}\n"
+        f"**Value**: {alert['triggered_value']}\n"
+        f"**Time**: {time_str}"
+    )
+    if alert.get('note'):
+        message += f"\n**Note**: {alert['note']}"
+    return message
+
+def _send_notifications(messages):
+    for message in messages:
+        send_telegram_message(message, action="alert")
+
+def alert_worker():
+    """Poll ticks for symbols with active alerts and notify the ones whose condition is met."""
+    logger.info("Alert worker started.")
+
+    while not _stop_event.is_set():
+        try:
+            with _lock:
+                symbols = list(_indexes)
+
+            messages = []
+            for symbol in symbols:
+                tick = mt5.symbol_info_tick(symbol)
+                symbol_info = get_symbol_info(symbol)
+                if tick is None or symbol_info is None:
+                    continue
+                with _lock:
+                    if symbol not in _indexes:
+                        continue
+                    triggered = _collect_triggered(symbol, tick, symbol_info.point)
+                    for alert_id, value in triggered.items():
+                        alert = alerts.get(alert_id)
+                        if alert is None or alert['status'] != 'active':
+                            continue
+                        # Other levels of the alert (percent_move 'both') are still indexed
+                        _unindex_alert(alert)
+                        alert.update({"status": "triggered", "triggered": time.time(), "triggered_value": value})
+                        messages.append(format_alert_message(alert))
+                        logger.info(f"Alert {alert_id} triggered on {symbol} at {value}.")
+
+            if messages:
+                with _lock:
+                    _prune_triggered_alerts()
+                save_alerts()
+                # Telegram calls are slow; keep them off the tick loop
+                threading.Thread(target=_send_notifications, args=(messages,), daemon=True).start()
+
+        except Exception as e:
+            logger.error(f"Error in alert worker: {str(e)}")
+
+        _stop_event.wait(CHECK_INTERVAL_SECONDS)
+
+    logger.info("Alert worker stopped.")
+
+def start_worker():
+    """Start the alert worker thread."""
+    global _worker_thread
+    if _worker_thread is None or not _worker_thread.is_alive():
+        _stop_event.clear()
+        load_alerts()
+        _worker_thread = threading.Thread(target=alert_worker, daemon=True)
+        _worker_thread.start()
+    else:
+        logger.info("Alert worker is already running.")
+
+def stop_worker():
+    """Stop the alert worker thread."""
+    global _worker_thread
+    if _worker_thread is not None and _worker_thread.is_alive():
+        _stop_event.set()
+        _worker_thread.join(timeout=10)
+    _worker_thread = None
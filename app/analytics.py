@@ -0,0 +1,196 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import MetaTrader5 as mt5
+import trade_ledger
+
+logger = logging.getLogger(__name__)
+
+GROUP_BY_FIELDS = ('symbol', 'magic', 'comment')
+TOTAL_KEY = '__total__'
+
+SECONDS_PER_DAY = 86400
+# Per-day aggregates kept in memory, least recently used evicted first
+MAX_CACHED_DAYS = 20000
+
+# Deals that realize a result
+CLOSING_ENTRIES = (mt5.DEAL_ENTRY_OUT, mt5.DEAL_ENTRY_INOUT, mt5.DEAL_ENTRY_OUT_BY)
+TRADE_DEAL_TYPES = (mt5.DEAL_TYPE_BUY, mt5.DEAL_TYPE_SELL)
+
+# Composable aggregate of a run of closed trades. sum/max_prefix/min_prefix/max_drawdown
+# describe the closed-trade equity curve so consecutive runs can be merged exactly.
+EMPTY_AGGREGATE = {
+    "trades": 0, "wins": 0, "losses": 0, "gross_profit": 0.0, "gross_loss": 0.0,
+    "profit": 0.0, "commission": 0.0, "swap": 0.0, "fee": 0.0,
+    "holding_seconds": 0.0, "holding_count": 0,
+    "sum": 0.0, "max_prefix": 0.0, "min_prefix": 0.0, "max_drawdown": 0.0,
+}
+
+# {(group_by, day_start): {group_key: aggregate}}
+_day_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def merge_aggregates(first: dict, second: dict) -> dict:
+    """Combine the aggregate of a period with the aggregate of the period right after it."""
+    merged = {key: first[key] + second[key] for key in (
+        "trades", "wins", "losses", "gross_profit", "gross_loss", "profit", "commission",
+        "swap", "fee", "holding_seconds", "holding_count", "sum")}
+    merged["max_prefix"] = max(first["max_prefix"], first["sum"] + second["max_prefix"])
+    merged["min_prefix"] = min(first["min_prefix"], first["sum"] + second["min_prefix"])
+    # A drawdown lies within one period or runs from a peak in the first to a trough in the second
+    merged["max_drawdown"] = max(first["max_drawdown"], second["max_drawdown"],
+                                 first["max_prefix"] - (first["sum"] + second["min_prefix"]))
+    return merged
+
+def _column(deals, name, dtype=float):
+    return np.fromiter((deal[name] for deal in deals), dtype=dtype, count=len(deals))
+
+def _aggregate(mask, closing, result, profit, commission, swap, fee, holding):
+    """Aggregate the deals selected by mask, in time order."""
+    trade_results = result[mask & closing]
+    curve = np.concatenate(([0.0], np.cumsum(trade_results)))
+    drawdowns = np.maximum.accumulate(curve) - curve
+    trade_holding = holding[mask & closing]
+    trade_holding = trade_holding[~np.isnan(trade_holding)]
+    return {
+        "trades": int(trade_results.size),
+        "wins": int(np.count_nonzero(trade_results > 0)),
+        "losses": int(np.count_nonzero(trade_results < 0)),
+        "gross_profit": float(trade_results[trade_results > 0].sum()),
+        "gross_loss": float(trade_results[trade_results < 0].sum()),
+        "profit": float(profit[mask].sum()),
+        "commission": float(commission[mask].sum()),
+        "swap": float(swap[mask].sum()),
+        "fee": float(fee[mask].sum()),
+        "holding_seconds": float(trade_holding.sum()),
+        "holding_count": int(trade_holding.size),
+        "sum": float(curve[-1]),
+        "max_prefix": float(curve.max()),
+        "min_prefix": float(curve.min()),
+        "max_drawdown": float(drawdowns.max()),
+    }
+
+def _entry_cost_share(entry, volume: float) -> float:
+    """Part of a position's entry costs attributed to a closing deal of the given volume."""
+    if entry is None or not entry['volume']:
+        return 0.0
+    return entry['costs'] * min(volume / entry['volume'], 1.0)
+
+def compute_period(from_timestamp: int, to_timestamp: int, group_by: str = None):
+    """
+    Aggregate the trade deals of a period from the ledger.
+
+    Returns:
+        {group_key: aggregate}, with the whole period under TOTAL_KEY.
+    """
+    deals = [deal for deal in trade_ledger.query_deals(from_timestamp, to_timestamp) if deal['type'] in TRADE_DEAL_TYPES]
+    if not deals:
+        return {}
+
+    profit = _column(deals, 'profit')
+    commission = _column(deals, 'commission')
+    swap = _column(deals, 'swap')
+    fee = _column(deals, 'fee')
+    closing = np.isin(_column(deals, 'entry', np.int64), CLOSING_ENTRIES)
+
+    entries = trade_ledger.position_entries(deal['position_id'] for deal, is_closing in zip(deals, closing) if is_closing)
+    # Costs charged on entry belong to the trade: closing deals carry them pro rata by
+    # volume, so per-trade results include the entry commission counted in net_pnl
+    entry_costs = np.fromiter(
+        (_entry_cost_share(entries.get(deal['position_id']), deal['volume']) if is_closing else 0.0
+         for deal, is_closing in zip(deals, closing)),
+        dtype=float, count=len(deals))
+    result = profit + commission + swap + fee + entry_costs
+
+    # Holding time of a closing deal: from the first entry deal of its position
+    opened = np.fromiter(
+        (entries[deal['position_id']]['open_time'] if deal['position_id'] in entries else np.nan for deal in deals),
+        dtype=float, count=len(deals))
+    holding = _column(deals, 'time') - opened
+
+    columns = (closing, result, profit, commission, swap, fee, holding)
+    aggregates = {TOTAL_KEY: _aggregate(np.ones(len(deals), dtype=bool), *columns)}
+    if group_by:
+        keys = np.array([str(deal[group_by]) for deal in deals])
+        for key in np.unique(keys):
+            aggregates[str(key)] = _aggregate(keys == key, *columns)
+    return aggregates
+
+def _day_aggregates(day_start: int, group_by: str):
+    """Aggregates of a complete day, cached since closed history does not change."""
+    cache_key = (group_by, day_start)
+    with _cache_lock:
+        aggregates = _day_cache.get(cache_key)
+        if aggregates is not None:
+            _day_cache.move_to_end(cache_key)
+            return aggregates
+
+    aggregates = compute_period(day_start, day_start + SECONDS_PER_DAY - 1, group_by)
+    with _cache_lock:
+        _day_cache[cache_key] = aggregates
+        while len(_day_cache) > MAX_CACHED_DAYS:
+            _day_cache.popitem(last=False)
+    return aggregates
+
+def finalize_metrics(aggregate: dict) -> dict:
+    """Turn an aggregate into the reported metrics."""
+    trades = aggregate["trades"]
+    return {
+        "net_pnl": round(aggregate["profit"] + aggregate["commission"] + aggregate["swap"] + aggregate["fee"], 2),
+        "realized_pnl": round(aggregate["profit"], 2),
+        "commission": round(aggregate["commission"], 2),
+        "swap": round(aggregate["swap"], 2),
+        "fee": round(aggregate["fee"], 2),
+        "trades": trades,
+        "wins": aggregate["wins"],
+        "losses": aggregate["losses"],
+        "win_rate": round(aggregate["wins"] / trades, 4) if trades else None,
+        "profit_factor": round(aggregate["gross_profit"] / -aggregate["gross_loss"], 4) if aggregate["gross_loss"] else None,
+        "expectancy": round(aggregate["sum"] / trades, 2) if trades else None,
+        "max_drawdown": round(aggregate["max_drawdown"], 2),
+        "avg_holding_seconds": round(aggregate["holding_seconds"] / aggregate["holding_count"]) if aggregate["holding_count"] else None,
+    }
+
+def performance(from_timestamp: int, to_timestamp: int, group_by: str = None):
+    """
+    Performance metrics of the closed trades in a time window.
+
+    Complete days that are safely in the past are served from the per-day cache;
+    the partial days at the edges of the window are computed directly.
+
+    Returns:
+        {"total": metrics, "groups": {group_key: metrics}}
+
+    Raises:
+        ValueError: If group_by or the window is invalid.
+    """
+    if group_by is not None and group_by not in GROUP_BY_FIELDS:
+        raise ValueError(f"Invalid group_by. Must be one of {list(GROUP_BY_FIELDS)}")
+    if from_timestamp > to_timestamp:
+        raise ValueError("from_date must be before to_date")
+
+    trade_ledger.ensure_fresh()
+    # Server time can be ahead of UTC; a day is complete once it ended more than a day ago
+    complete_before = time.time() - SECONDS_PER_DAY
+
+    totals = {}
+    start = from_timestamp
+    while start <= to_timestamp:
+        day_start = start - start % SECONDS_PER_DAY
+        day_end = day_start + SECONDS_PER_DAY - 1
+        end = min(day_end, to_timestamp)
+        if start == day_start and end == day_end and day_end < complete_before:
+            aggregates = _day_aggregates(day_start, group_by)
+        else:
+            aggregates = compute_period(start, end, group_by)
+        for key, aggregate in aggregates.items():
+            totals[key] = merge_aggregates(totals.get(key, EMPTY_AGGREGATE), aggregate)
+        start = end + 1
+
+    total = totals.pop(TOTAL_KEY, EMPTY_AGGREGATE)
+    return {
+        "total": finalize_metrics(total),
+        "groups": {key: finalize_metrics(aggregate) for key, aggregate in totals.items()} if group_by else {},
+    }
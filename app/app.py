@@ -1,14 +1,21 @@
+import argparse
 import logging
 import os
+import threading
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 import MetaTrader5 as mt5
 from flasgger import Swagger
 from werkzeug.middleware.proxy_fix import ProxyFix
+from compression import CompressionMiddleware
 from swagger import swagger_config
+from json_provider import create_json_provider
 from telegram_utils import load_telegram_config
+from idempotency import load_idempotency_cache
 import json
-from routes.login import load_api_token  # Import load_api_token từ routes/login.py
+from auth import (load_api_token, verify_header_token, verify_request_token, has_header_tokens,
+                  set_blueprint_policy, build_policy_table, get_policy, PUBLIC, HEADER, HEADER_OR_TOKEN,
+                  SUBREQUEST_ENVIRON_KEY)
 
 # Import routes
 from routes.health import health_bp
@@ -20,41 +27,59 @@ from routes.history import history_bp
 from routes.error import error_bp
 from routes.telegram import telegram_bp
 from routes.login import login_bp
+from routes.virtual_stop import virtual_stop_bp
+from routes.alert import alert_bp
+from routes.analytics import analytics_bp
+from routes.risk import risk_bp
+from routes.batch import batch_bp
 
 # Import worker functions
 from trailing_stop_worker import start_worker, stop_worker
+from auth import start_worker as start_token_watcher, stop_worker as stop_token_watcher
+from account_state import start_worker as start_account_state, stop_worker as stop_account_state
 from trade_signal_worker import start_worker as start_signal_worker, stop_worker as stop_signal_worker
+from order_queue import start_dispatcher, stop_dispatcher
+from virtual_stops import start_worker as start_virtual_stop_worker, stop_worker as stop_virtual_stop_worker
+from alert_engine import start_worker as start_alert_worker, stop_worker as stop_alert_worker
+from trade_ledger import start_worker as start_ledger_worker, stop_worker as stop_ledger_worker
+from risk_guard import start_worker as start_risk_guard, stop_worker as stop_risk_guard
+from equity_recorder import start_worker as start_equity_recorder, stop_worker as stop_equity_recorder
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['PREFERRED_URL_SCHEME'] = 'https'
+# orjson-backed JSON for every jsonify/get_json; MT5_API_JSON_PROVIDER=stdlib selects the stdlib encoder
+app.json = create_json_provider(app, os.environ.get('MT5_API_JSON_PROVIDER', 'orjson'))
 
-# Load the API token from environment variable
-MT5_API_AUTH_TOKEN = os.environ.get('MT5_API_AUTH_TOKEN')
+# Load API tokens into memory; the token watcher reloads them when api_token.json changes
+load_api_token()
 
 # Load Telegram configuration from file at startup
 load_telegram_config()
 
+# Restore idempotency keys so retries across a restart are still deduplicated
+load_idempotency_cache()
+
 # Middleware to check Authorization header or token in body/query
 @app.before_request
 def check_auth_token():
-    # Skip auth check for health endpoint and Swagger-related endpoints
-    swagger_paths = ['/apidocs/', '/apispec_1.json']
-    if (request.path == '/health' or 
-        request.path in swagger_paths or 
-        request.path.startswith('/flasgger_static/')):
+    # Policy declared by the blueprint or view, resolved once by build_policy_table()
+    policy = get_policy(request.endpoint)
+    if policy == PUBLIC:
         return None
+
+    # /batch sub-requests were authorized once with the batch itself
+    batch_scope = request.environ.get(SUBREQUEST_ENVIRON_KEY)
+    if batch_scope:
+        if batch_scope == HEADER or policy == HEADER_OR_TOKEN:
+            return None
+        return jsonify({"error": "Authorization header is required"}), 401
     
     # Get the Authorization header
     auth_header = request.headers.get('Authorization')
     
-    # Check if the request is for /Position or /Order endpoints
-    is_position_or_order = request.path.startswith(('/close_position', '/close_all_positions', '/modify_sl_tp', 
-                                                    '/get_positions', '/positions_total', '/apply_trailing_stop', 
-                                                    '/cancel_trailing_stop', '/list_trailing_stop_jobs', '/order'))
-    
     if auth_header:
         # Accept either 'Bearer <token>' or raw token
         token = auth_header
@@ -65,48 +90,46 @@ def check_auth_token():
                 logger.warning("Malformed Authorization header")
                 return jsonify({"error": "Malformed Authorization header, expected 'Bearer <token>' or raw token"}), 401
         
-        if not MT5_API_AUTH_TOKEN:
+        if not has_header_tokens():
             logger.error("MT5_API_AUTH_TOKEN environment variable not set")
             return jsonify({"error": "Server configuration error"}), 500
         
-        if token != MT5_API_AUTH_TOKEN:
+        if verify_header_token(token) is None:
             logger.warning("Invalid API token provided in Authorization header")
             return jsonify({"error": "Invalid API token"}), 401
         
         logger.debug("API token validated successfully via Authorization header")
         return None
     
-    # If no Authorization header, check token for /Position and /Order endpoints
-    if is_position_or_order:
+    # If no Authorization header, check token for endpoints that accept it in the query or body
+    if policy == HEADER_OR_TOKEN:
         try:
             # For GET requests, check token in query parameters
             if request.method == 'GET':
                 query_token = request.args.get('token')
                 if query_token:
-                    stored_token = load_api_token()  # Load token from api_token.json
-                    if query_token == stored_token:
+                    if verify_request_token(query_token) is not None:
                         logger.debug("API token validated successfully via query parameter")
                         return None
                     else:
                         logger.warning("Invalid token provided in query parameter")
                         return jsonify({"error": "Invalid token in query parameter"}), 401
                 else:
-                    logger.warning("No token provided in query parameter for GET /Position or /Order endpoint")
+                    logger.warning(f"No token provided in query parameter for GET {request.path}")
                     return jsonify({"error": "Authorization header or token in query parameter is required"}), 401
             
-            # For POST requests, check token in body
+            # For POST requests, check token in body. get_json caches the parsed body,
+            # so the handler's own get_json() call does not parse it again
             data = request.get_json(silent=True)
-            if data and 'token' in data:
-                body_token = data['token']
-                stored_token = load_api_token()  # Load token from api_token.json
-                if body_token == stored_token:
+            if isinstance(data, dict) and 'token' in data:
+                if verify_request_token(str(data['token'])) is not None:
                     logger.debug("API token validated successfully via request body")
                     return None
                 else:
                     logger.warning("Invalid token provided in request body")
                     return jsonify({"error": "Invalid token in request body"}), 401
             else:
-                logger.warning("No token provided in request body for /Position or /Order endpoint")
+                logger.warning(f"No token provided in request body for {request.path}")
                 return jsonify({"error": "Authorization header or token in request body is required"}), 401
         except Exception as e:
             logger.error(f"Error checking token: {str(e)}")
@@ -117,6 +140,8 @@ def check_auth_token():
     return jsonify({"error": "Authorization header is required"}), 401
 
 swagger = Swagger(app, config=swagger_config)
+# Swagger UI, spec and static files are public
+set_blueprint_policy('flasgger', PUBLIC)
 
 # Register blueprints
 app.register_blueprint(health_bp)
@@ -128,15 +153,113 @@ app.register_blueprint(history_bp)
 app.register_blueprint(error_bp)
 app.register_blueprint(telegram_bp)
 app.register_blueprint(login_bp)
+app.register_blueprint(virtual_stop_bp)
+app.register_blueprint(alert_bp)
+app.register_blueprint(analytics_bp)
+app.register_blueprint(risk_bp)
+app.register_blueprint(batch_bp)
+
+# Resolve auth policies now that every endpoint is registered
+build_policy_table(app)
 
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# Negotiated gzip/deflate/brotli for large responses; MT5_API_COMPRESS=0 leaves compression to the proxy
+if os.environ.get('MT5_API_COMPRESS', '1') != '0':
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app)
 
-if __name__ == '__main__':
-    try:
+_services_started = False
+_services_lock = threading.Lock()
+
+def start_services():
+    """
+    Start the background workers. Safe to call more than once; every server entry point
+    calls it: app.py's __main__, the asgi.py lifespan and the wsgi.py module for
+    external WSGI servers.
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+        start_token_watcher()
+        start_account_state()
         start_worker()
         start_signal_worker()
-        app.run(host='0.0.0.0', port=5001)
-    finally:
+        start_dispatcher(app)
+        start_virtual_stop_worker()
+        start_alert_worker()
+        start_ledger_worker()
+        start_risk_guard()
+        start_equity_recorder()
+        logger.info("Background workers started.")
+
+def stop_services():
+    """Stop the background workers started by start_services()."""
+    global _services_started
+    with _services_lock:
+        if not _services_started:
+            return
+        _services_started = False
         stop_worker()
         stop_signal_worker()
-        logger.info("Flask app finished running.")
\ No newline at end of file
+        stop_dispatcher()
+        stop_virtual_stop_worker()
+        stop_alert_worker()
+        stop_ledger_worker()
+        stop_risk_guard()
+        stop_equity_recorder()
+        stop_account_state()
+        stop_token_watcher()
+        logger.info("Background workers stopped.")
+
+def serve_waitress(host: str, port: int, threads: int, connection_limit: int, channel_timeout: int, backlog: int):
+    """Serve the app with waitress, a production WSGI server that runs on Windows (and so under Wine)."""
+    from waitress import serve
+    logger.info(f"Starting waitress on {host}:{port} with {threads} threads, "
+                f"connection limit {connection_limit}, channel timeout {channel_timeout}s.")
+    serve(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        # Open connections beyond this wait in the listen backlog instead of being accepted
+        connection_limit=connection_limit,
+        # Idle keep-alive and stalled connections are closed after this many seconds
+        channel_timeout=channel_timeout,
+        backlog=backlog,
+        ident="mt5-api",
+    )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MT5 Trading API server")
+    parser.add_argument('--server', choices=['waitress', 'dev'], default=os.environ.get('MT5_API_SERVER', 'waitress'),
+                        help="waitress for production, dev for Flask's development server. Env: MT5_API_SERVER")
+    parser.add_argument('--host', default=os.environ.get('MT5_API_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('MT5_API_PORT', 5001)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('MT5_API_THREADS', 16)),
+                        help="Request worker threads. Env: MT5_API_THREADS")
+    parser.add_argument('--connection-limit', type=int, default=int(os.environ.get('MT5_API_CONNECTION_LIMIT', 200)),
+                        help="Maximum open connections. Env: MT5_API_CONNECTION_LIMIT")
+    parser.add_argument('--channel-timeout', type=int, default=int(os.environ.get('MT5_API_CHANNEL_TIMEOUT', 60)),
+                        help="Seconds before an idle or stalled connection is closed. Env: MT5_API_CHANNEL_TIMEOUT")
+    parser.add_argument('--backlog', type=int, default=int(os.environ.get('MT5_API_BACKLOG', 1024)),
+                        help="Listen backlog. Env: MT5_API_BACKLOG")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        start_services()
+        if args.server == 'waitress':
+            try:
+                import waitress  # noqa: F401
+            except ImportError:
+                logger.error("waitress is not installed, falling back to Flask's development server.")
+                args.server = 'dev'
+        if args.server == 'waitress':
+            serve_waitress(args.host, args.port, args.threads, args.connection_limit, args.channel_timeout, args.backlog)
+        else:
+            app.run(host=args.host, port=args.port, threaded=True)
+    finally:
+        stop_services()
+        logger.info("Flask app finished running.")
@@ -0,0 +1,322 @@
+# Asyncio front end for the read-heavy and streaming endpoints. Ticks, account and
+# positions are served by coroutines and Server-Sent Events, so an idle subscriber
+# costs a queue, not a thread. Terminal calls from this side go through a single
+# gateway thread. Every other route, trading included, is the unchanged Flask app
+# mounted through a2wsgi. Run with `python asgi.py` (MT5_API_SERVER=asgi).
+import asyncio
+import contextlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import MetaTrader5 as mt5
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import app as flask_app, start_services, stop_services
+import account_state
+from auth import verify_header_token, verify_request_token, has_header_tokens
+from lib import ensure_symbol_in_marketwatch
+from position_snapshot import get_snapshot
+from routes.login import account_info_payload
+
+logger = logging.getLogger(__name__)
+
+# Stream poll intervals; one terminal read per interval serves every subscriber
+TICK_INTERVAL_SECONDS = float(os.environ.get('MT5_API_STREAM_TICK_MS', 100)) / 1000
+POSITIONS_INTERVAL_SECONDS = float(os.environ.get('MT5_API_STREAM_POSITIONS_MS', 500)) / 1000
+ACCOUNT_INTERVAL_SECONDS = float(os.environ.get('MT5_API_STREAM_ACCOUNT_MS', 250)) / 1000
+# Comment lines sent on quiet streams so proxies keep the connection open
+HEARTBEAT_SECONDS = 15
+MAX_SUBSCRIBERS = int(os.environ.get('MT5_API_STREAM_MAX_SUBSCRIBERS', 5000))
+# Threads running the mounted Flask app
+WSGI_THREADS = int(os.environ.get('MT5_API_THREADS', 16))
+
+# The MT5 gateway: coroutines never call the terminal concurrently
+_mt5_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mt5-gateway')
+
+class _JSONResponse(JSONResponse):
+    """JSONResponse encoded with the Flask app's JSON provider, so both front ends agree."""
+
+    def render(self, content):
+        return flask_app.json.dumps(content).encode()
+
+async def call_mt5(fn, *args):
+    """Run a blocking terminal call on the MT5 gateway thread."""
+    return await asyncio.get_running_loop().run_in_executor(_mt5_executor, fn, *args)
+
+class _Channel:
+    """Fans the latest value out to subscriber queues. A slow subscriber skips to the newest value."""
+
+    def __init__(self, on_active=None):
+        self._queues = set()
+        self.latest = None
+        # Called with True on the first subscriber and False when the last one leaves
+        self._on_active = on_active
+
+    def __len__(self):
+        return len(self._queues)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1)
+        if self.latest is not None:
+            queue.put_nowait(self.latest)
+        self._queues.add(queue)
+        if len(self._queues) == 1 and self._on_active:
+            self._on_active(True)
+        return queue
+
+    def unsubscribe(self, queue):
+        if queue in self._queues:
+            self._queues.remove(queue)
+            if not self._queues and self._on_active:
+                self._on_active(False)
+
+    def publish(self, value):
+        self.latest = value
+        for queue in self._queues:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(value)
+
+def _account_stream_active(active):
+    # Sample the account faster only while someone is streaming it
+    account_state.request_interval('account_stream', ACCOUNT_INTERVAL_SECONDS if active else None)
+
+_tick_channels = {}
+_positions_channel = _Channel()
+_account_channel = _Channel(on_active=_account_stream_active)
+_loop = None
+
+def _subscriber_count():
+    return len(_positions_channel) + len(_account_channel) + sum(len(channel) for channel in _tick_channels.values())
+
+def _read_ticks(symbols):
+    """Read the ticks of several symbols in one gateway call."""
+    return {symbol: mt5.symbol_info_tick(symbol) for symbol in symbols}
+
+def _read_tick(symbol):
+    if not ensure_symbol_in_marketwatch(symbol):
+        return None
+    return mt5.symbol_info_tick(symbol)
+
+async def _tick_poller():
+    """Poll the ticks of subscribed symbols and publish new ones."""
+    last_time_msc = {}
+    while True:
+        try:
+            symbols = list(_tick_channels)
+            if symbols:
+                ticks = await call_mt5(_read_ticks, symbols)
+                for symbol, tick in ticks.items():
+                    channel = _tick_channels.get(symbol)
+                    if channel is not None and tick is not None and tick.time_msc != last_time_msc.get(symbol):
+                        last_time_msc[symbol] = tick.time_msc
+                        channel.publish({"symbol": symbol, **tick._asdict()})
+            for symbol in set(last_time_msc) - set(_tick_channels):
+                del last_time_msc[symbol]
+        except Exception as e:
+            logger.error(f"Error in tick stream poller: {str(e)}")
+        await asyncio.sleep(TICK_INTERVAL_SECONDS)
+
+async def _positions_poller():
+    """Poll the positions snapshot while anyone listens and publish it when it changes."""
+    last_positions = None
+    while True:
+        try:
+            if len(_positions_channel):
+                positions = await call_mt5(get_snapshot, POSITIONS_INTERVAL_SECONDS)
+                if positions is not None and positions != last_positions:
+                    last_positions = positions
+                    _positions_channel.publish([position._asdict() for position in positions])
+            else:
+                last_positions = None
+        except Exception as e:
+            logger.error(f"Error in positions stream poller: {str(e)}")
+        await asyncio.sleep(POSITIONS_INTERVAL_SECONDS)
+
+def _on_account_update(account_info, changes):
+    """Account state subscriber, called on the sampler thread."""
+    if len(_account_channel) and _loop is not None:
+        _loop.call_soon_threadsafe(_account_channel.publish, account_info_payload(account_info))
+
+def _authorize(request, allow_query_token: bool):
+    """Return an error response, or None if the request carries a valid token."""
+    auth_header = request.headers.get('Authorization')
+    if auth_header:
+        token = auth_header.split(' ', 1)[1] if auth_header.lower().startswith('bearer ') else auth_header
+        if not has_header_tokens():
+            logger.error("MT5_API_AUTH_TOKEN environment variable not set")
+            return _JSONResponse({"error": "Server configuration error"}, status_code=500)
+        if verify_header_token(token) is None:
+            return _JSONResponse({"error": "Invalid API token"}, status_code=401)
+        return None
+    if not allow_query_token:
+        return _JSONResponse({"error": "Authorization header is required"}, status_code=401)
+    # EventSource cannot set headers, so streams also accept the query token
+    query_token = request.query_params.get('token')
+    if query_token:
+        if verify_request_token(query_token) is None:
+            return _JSONResponse({"error": "Invalid token in query parameter"}, status_code=401)
+        return None
+    return _JSONResponse({"error": "Authorization header or token in query parameter is required"}, status_code=401)
+
+async def _event_stream(get_channels, on_close=None):
+    """Yield SSE events from the channels until the client disconnects."""
+    # Channels are looked up once the response starts so none is dropped in between
+    queues = [(channel, channel.subscribe()) for channel in get_channels()]
+    try:
+        yield "retry: 2000\n\n"
+        getters = {asyncio.ensure_future(queue.get()): queue for _, queue in queues}
+        try:
+            while True:
+                done, _ = await asyncio.wait(getters, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    yield ": keep-alive\n\n"
+                    continue
+                for task in done:
+                    queue = getters.pop(task)
+                    yield f"data: {flask_app.json.dumps(task.result())}\n\n"
+                    getters[asyncio.ensure_future(queue.get())] = queue
+        finally:
+            for task in getters:
+                task.cancel()
+    finally:
+        for channel, queue in queues:
+            channel.unsubscribe(queue)
+        if on_close:
+            on_close()
+
+def _stream_response(get_channels, on_close=None):
+    return StreamingResponse(_event_stream(get_channels, on_close), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def stream_ticks(request):
+    """SSE stream of ticks for symbols=EURUSD,GBPUSD."""
+    error = _authorize(request, allow_query_token=True)
+    if error:
+        return error
+    symbols = [symbol.strip() for symbol in request.query_params.get('symbols', '').split(',') if symbol.strip()]
+    if not symbols:
+        return _JSONResponse({"error": "symbols parameter is required"}, status_code=400)
+    if _subscriber_count() >= MAX_SUBSCRIBERS:
+        return _JSONResponse({"error": "Too many stream subscribers"}, status_code=503)
+    try:
+        for symbol in symbols:
+            if symbol not in _tick_channels and not await call_mt5(ensure_symbol_in_marketwatch, symbol):
+                return _JSONResponse({"error": f"Failed to add symbol {symbol} to MarketWatch"}, status_code=400)
+    except Exception as e:
+        logger.error(f"Error in stream_ticks: {str(e)}")
+        return _JSONResponse({"error": "Internal server error"}, status_code=500)
+
+    def release():
+        # Stop polling symbols nobody streams any more
+        for symbol in symbols:
+            if symbol in _tick_channels and not len(_tick_channels[symbol]):
+                del _tick_channels[symbol]
+
+    return _stream_response(lambda: [_tick_channels.setdefault(symbol, _Channel()) for symbol in symbols], release)
+
+async def stream_positions(request):
+    """SSE stream of the open positions, sent whenever they change."""
+    error = _authorize(request, allow_query_token=True)
+    if error:
+        return error
+    if _subscriber_count() >= MAX_SUBSCRIBERS:
+        return _JSONResponse({"error": "Too many stream subscribers"}, status_code=503)
+    return _stream_response(lambda: [_positions_channel])
+
+async def stream_account(request):
+    """SSE stream of account info, sent whenever balance, equity or margin change."""
+    error = _authorize(request, allow_query_token=True)
+    if error:
+        return error
+    if _subscriber_count() >= MAX_SUBSCRIBERS:
+        return _JSONResponse({"error": "Too many stream subscribers"}, status_code=503)
+    if _account_channel.latest is None:
+        account_info = await call_mt5(account_state.get_account_info)
+        if account_info is not None:
+            _account_channel.latest = account_info_payload(account_info)
+    return _stream_response(lambda: [_account_channel])
+
+async def symbol_info_tick(request):
+    """Async /symbol_info_tick/<symbol>, same response as the Flask route."""
+    error = _authorize(request, allow_query_token=False)
+    if error:
+        return error
+    symbol = request.path_params['symbol']
+    try:
+        tick = await call_mt5(_read_tick, symbol)
+        if tick is None:
+            return _JSONResponse({"error": "Failed to get symbol tick info"}, status_code=404)
+        return _JSONResponse(tick._asdict())
+    except Exception as e:
+        logger.error(f"Error in get_symbol_info_tick: {str(e)}")
+        return _JSONResponse({"error": "Internal server error"}, status_code=500)
+
+async def account_info(request):
+    """Async /account_info, same response and max_age_ms parameter as the Flask route."""
+    error = _authorize(request, allow_query_token=False)
+    if error:
+        return error
+    try:
+        max_age_ms = float(request.query_params.get('max_age_ms', account_state.DEFAULT_MAX_AGE_MS))
+        if max_age_ms < 0:
+            raise ValueError
+    except ValueError:
+        return _JSONResponse({"error": "max_age_ms must be a non-negative number"}, status_code=400)
+    try:
+        age_ms = account_state.get_age_ms()
+        # A fresh enough sample is served without a gateway hop
+        if age_ms is not None and age_ms <= max_age_ms:
+            info = account_state.get_account_info(max_age_ms)
+        else:
+            info = await call_mt5(account_state.get_account_info, max_age_ms)
+        if info is None:
+            return _JSONResponse({"error": "Failed to retrieve account info"}, status_code=500)
+        return _JSONResponse(account_info_payload(info))
+    except Exception as e:
+        logger.error(f"Error in account_info: {str(e)}")
+        return _JSONResponse({"error": "Internal server error"}, status_code=500)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global _loop
+    _loop = asyncio.get_running_loop()
+    start_services()
+    account_state.subscribe(_on_account_update)
+    pollers = [asyncio.ensure_future(_tick_poller()), asyncio.ensure_future(_positions_poller())]
+    try:
+        yield
+    finally:
+        for poller in pollers:
+            poller.cancel()
+        account_state.unsubscribe(_on_account_update)
+        stop_services()
+        _mt5_executor.shutdown(wait=False)
+
+app = Starlette(
+    routes=[
+        Route('/stream/ticks', stream_ticks),
+        Route('/stream/positions', stream_positions),
+        Route('/stream/account', stream_account),
+        Route('/symbol_info_tick/{symbol}', symbol_info_tick),
+        Route('/account_info', account_info),
+        # Everything else, including all trading endpoints, keeps the Flask semantics
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    uvicorn.run(
+        app,
+        host=os.environ.get('MT5_API_HOST', '0.0.0.0'),
+        port=int(os.environ.get('MT5_API_PORT', 5001)),
+        timeout_keep_alive=int(os.environ.get('MT5_API_KEEPALIVE_TIMEOUT', 5)),
+        # Starlette handles proxy headers for its own routes; ProxyFix still wraps the Flask app
+        proxy_headers=True,
+        log_level="info",
+    )
@@ -0,0 +1,190 @@
+import hmac
+import json
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn tới thư mục cấu hình trong volume
+CONFIG_DIR = "/config"
+TOKEN_FILE = os.path.join(CONFIG_DIR, "api_token.json")
+
+# How often the watcher checks api_token.json for changes
+RELOAD_INTERVAL_SECONDS = float(os.environ.get('MT5_API_TOKEN_RELOAD_INTERVAL', 2))
+
+# Name of the token kept under "token" in api_token.json, managed by /generate_token
+DEFAULT_TOKEN_NAME = "default"
+
+# Authorization header tokens: {name: token}
+_header_tokens = {"env": os.environ.get('MT5_API_AUTH_TOKEN')} if os.environ.get('MT5_API_AUTH_TOKEN') else {}
+# Tokens accepted in the query string or body, from api_token.json: {name: token}
+_file_tokens = {}
+# (mtime_ns, size) of api_token.json when it was last loaded
+_file_signature = None
+_lock = threading.Lock()
+
+# Auth policies: no check, Authorization header only, or header / token in query (GET) or body
+PUBLIC = "public"
+HEADER = "header"
+HEADER_OR_TOKEN = "header_or_token"
+
+# Set in the WSGI environ of /batch sub-requests to the policy the batch itself satisfied.
+# Clients cannot set it: request headers only reach the environ as HTTP_* keys
+SUBREQUEST_ENVIRON_KEY = "mt5_api.batch_subrequest"
+
+# Declared policies, resolved by build_policy_table() into {endpoint: policy}
+_blueprint_policies = {}
+_policy_table = {}
+
+_worker_thread = None
+_stop_event = threading.Event()
+
+def _signature():
+    try:
+        stat = os.stat(TOKEN_FILE)
+        return (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+
+def _write_tokens(tokens: dict):
+    """Save tokens to api_token.json, the default one under "token" and the others under "tokens"."""
+    data = {"token": tokens.get(DEFAULT_TOKEN_NAME, "")}
+    named = {name: token for name, token in tokens.items() if name != DEFAULT_TOKEN_NAME}
+    if named:
+        data["tokens"] = named
+    tmp_file = TOKEN_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_file, TOKEN_FILE)
+
+def load_api_token():
+    """
+    (Re)load api_token.json into memory, creating it with a new token if missing.
+
+    A file that cannot be read or parsed keeps the tokens already loaded, so an edit
+    in progress never locks clients out.
+
+    Returns:
+        The default token.
+    """
+    global _file_tokens, _file_signature
+    signature = _signature()
+    if signature is None:
+        logger.info(f"No api_token.json found at {TOKEN_FILE}, creating new token.")
+        return generate_and_save_token()
+    try:
+        with open(TOKEN_FILE, 'r') as f:
+            data = json.load(f)
+        tokens = {DEFAULT_TOKEN_NAME: data.get("token", "")}
+        tokens.update({str(name): str(token) for name, token in data.get("tokens", {}).items()})
+        with _lock:
+            _file_tokens = {name: token for name, token in tokens.items() if token}
+            _file_signature = signature
+        logger.info(f"Loaded {len(_file_tokens)} API tokens from {TOKEN_FILE}")
+    except Exception as e:
+        logger.error(f"Error loading API tokens from {TOKEN_FILE}, keeping the previous ones: {str(e)}")
+        with _lock:
+            # Do not retry until the file changes again
+            _file_signature = signature
+    return get_api_token()
+
+def generate_and_save_token():
+    """Generate a new default token, keeping the other named tokens, and save it to api_token.json."""
+    global _file_tokens, _file_signature
+    new_token = str(uuid.uuid4())
+    with _lock:
+        tokens = {**_file_tokens, DEFAULT_TOKEN_NAME: new_token}
+        try:
+            _write_tokens(tokens)
+        except Exception as e:
+            logger.error(f"Error generating/saving API token to {TOKEN_FILE}: {str(e)}")
+            raise
+        _file_tokens = tokens
+        _file_signature = _signature()
+    logger.info(f"New API token generated and saved to {TOKEN_FILE}")
+    return new_token
+
+def get_api_token():
+    """Return the default token from memory."""
+    return _file_tokens.get(DEFAULT_TOKEN_NAME, "")
+
+def has_header_tokens() -> bool:
+    return bool(_header_tokens)
+
+def _match(token: str, tokens: dict):
+    """Return the name of the matching token, comparing against every token in constant time."""
+    if not token:
+        return None
+    matched = None
+    supplied = token.encode()
+    for name, expected in tokens.items():
+        if hmac.compare_digest(supplied, expected.encode()) and matched is None:
+            matched = name
+    return matched
+
+def verify_header_token(token: str):
+    """Return the name of the Authorization header token that matches, or None."""
+    return _match(token, _header_tokens)
+
+def verify_request_token(token: str):
+    """Return the name of the query/body token that matches, or None."""
+    return _match(token, _file_tokens)
+
+def auth_policy(policy: str):
+    """Decorator declaring the auth policy of one view, overriding its blueprint's."""
+    def decorator(view):
+        view.auth_policy = policy
+        return view
+    return decorator
+
+def set_blueprint_policy(blueprint, policy: str):
+    """Declare the auth policy of every view of a blueprint (a Blueprint or its name)."""
+    _blueprint_policies[getattr(blueprint, 'name', blueprint)] = policy
+
+def build_policy_table(app):
+    """Resolve declared policies into {endpoint: policy} once all blueprints are registered."""
+    global _policy_table
+    table = {}
+    for endpoint, view in app.view_functions.items():
+        blueprint = endpoint.rsplit('.', 1)[0] if '.' in endpoint else None
+        table[endpoint] = getattr(view, 'auth_policy', None) or _blueprint_policies.get(blueprint, HEADER)
+    _policy_table = table
+    logger.info(f"Auth policy table built for {len(table)} endpoints.")
+    return table
+
+def get_policy(endpoint):
+    """Return the auth policy of an endpoint; unknown endpoints (including 404s) need the header."""
+    return _policy_table.get(endpoint, HEADER)
+
+def token_watcher_worker():
+    """Reload api_token.json when its mtime or size changes."""
+    logger.info("API token watcher started.")
+    while not _stop_event.wait(RELOAD_INTERVAL_SECONDS):
+        try:
+            signature = _signature()
+            if signature != _file_signature:
+                logger.info(f"{TOKEN_FILE} changed, reloading API tokens.")
+                load_api_token()
+        except Exception as e:
+            logger.error(f"Error in API token watcher: {str(e)}")
+    logger.info("API token watcher stopped.")
+
+def start_worker():
+    """Start the API token watcher thread."""
+    global _worker_thread
+    if _worker_thread is None or not _worker_thread.is_alive():
+        _stop_event.clear()
+        _worker_thread = threading.Thread(target=token_watcher_worker, daemon=True)
+        _worker_thread.start()
+    else:
+        logger.info("API token watcher is already running.")
+
+def stop_worker():
+    """Stop the API token watcher thread."""
+    global _worker_thread
+    if _worker_thread is not None and _worker_thread.is_alive():
+        _stop_event.set()
+        _worker_thread.join(timeout=10)
+    _worker_thread = None
@@ -0,0 +1,176 @@
+import itertools
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses with a known length below this many bytes are sent uncompressed
+MIN_SIZE = int(os.environ.get('MT5_API_COMPRESS_MIN_BYTES', 1024))
+# zlib level for gzip/deflate (1-9) and brotli quality (0-11)
+LEVEL = int(os.environ.get('MT5_API_COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('MT5_API_BROTLI_QUALITY', 4))
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+def _supported_encodings():
+    return ('br', 'gzip', 'deflate') if brotli is not None else ('gzip', 'deflate')
+
+def choose_encoding(accept_encoding: str):
+    """Return the best encoding the client accepts (br, gzip, then deflate), or None."""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    for encoding in _supported_encodings():
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+class _Compressor:
+    """Incremental compressor with the same interface for every encoding."""
+
+    def __init__(self, encoding: str, level: int, brotli_quality: int):
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            # wbits 31 writes a gzip header and trailer, 15 a zlib (deflate) stream
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+            self._brotli = None
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compress data; with flush, everything written so far is emitted so the client can decode it."""
+        if self._brotli is not None:
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+class CompressionMiddleware:
+    """
+    WSGI middleware compressing responses with gzip, deflate or brotli as negotiated
+    through Accept-Encoding.
+
+    Responses with a Content-Length are compressed whole when at least min_size bytes.
+    Streamed responses (no Content-Length) are compressed chunk by chunk, flushing
+    after each chunk so the client receives data as the app produces it.
+    """
+
+    def __init__(self, app, min_size: int = MIN_SIZE, level: int = LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+
+    def _should_compress(self, environ, status: str, headers):
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return False
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        header_map = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in header_map or 'no-transform' in header_map.get('cache-control', ''):
+            return False
+        if not header_map.get('content-type', '').startswith(COMPRESSIBLE_TYPES):
+            return False
+        length = header_map.get('content-length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        encoding = choose_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        captured = {}
+        written = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            if exc_info is not None:
+                captured.clear()
+                return start_response(status, headers, exc_info)
+            captured['status'] = status
+            captured['headers'] = headers
+            return written.append
+
+        app_iter = self.app(environ, capture_start_response)
+        if not captured:
+            # start_response was passed through with exc_info
+            return app_iter
+        status, headers = captured['status'], captured['headers']
+
+        if not self._should_compress(environ, status, headers):
+            start_response(status, headers)
+            return self._passthrough(written, app_iter) if written else app_iter
+
+        headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+        headers = self._encoded_headers(headers, encoding)
+        compressor = _Compressor(encoding, self.level, self.brotli_quality)
+
+        if any(name.lower() == 'content-length' for name, _ in captured['headers']):
+            # Known length: compress the whole body and send it with its new length
+            try:
+                body = b''.join(written) + b''.join(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            data = compressor.compress(body) + compressor.finish()
+            start_response(status, headers + [('Content-Length', str(len(data)))])
+            return [data]
+
+        start_response(status, headers)
+        return self._stream(compressor, written, app_iter)
+
+    @staticmethod
+    def _encoded_headers(headers, encoding):
+        result = []
+        vary = None
+        for name, value in headers:
+            lower = name.lower()
+            if lower == 'vary':
+                vary = value
+                continue
+            if lower == 'etag' and not value.startswith('W/'):
+                # The compressed body differs byte for byte, so the validator becomes weak
+                value = f"W/{value}"
+            result.append((name, value))
+        if vary is None:
+            vary = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            vary = f"{vary}, Accept-Encoding"
+        return result + [('Vary', vary), ('Content-Encoding', encoding)]
+
+    @staticmethod
+    def _passthrough(written, app_iter):
+        try:
+            yield from written
+            yield from app_iter
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    @staticmethod
+    def _stream(compressor, written, app_iter):
+        try:
+            for chunk in itertools.chain(written, app_iter):
+                if chunk:
+                    yield compressor.compress(chunk, flush=True)
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
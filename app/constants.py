@@ -53,4 +53,8 @@ TRADE_RETCODE_DESCRIPTION = {
     mt5.TRADE_RETCODE_SHORT_ONLY: "The request is rejected, because the 'Only short positions are allowed' rule is set for the symbol",
     mt5.TRADE_RETCODE_CLOSE_ONLY: "The request is rejected, because the 'Only position closing is allowed' rule is set for the symbol",
     mt5.TRADE_RETCODE_FIFO_CLOSE: "The request is rejected, because 'Position closing is allowed only by FIFO rule' flag is set for the trading account",
-}
\ No newline at end of file
+}
+
+# Bit flags of SymbolInfo.filling_mode (SYMBOL_FILLING_MODE in MQL5)
+SYMBOL_FILLING_FOK = 1
+SYMBOL_FILLING_IOC = 2
@@ -0,0 +1,232 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+import account_state
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn tới thư mục cấu hình trong volume
+CONFIG_DIR = "/config"
+EQUITY_DIR = os.path.join(CONFIG_DIR, "equity")
+
+# account_info sampling interval
+SAMPLE_INTERVAL_SECONDS = float(os.environ.get('MT5_API_EQUITY_SAMPLE_MS', 250)) / 1000
+# Closed buckets are buffered in memory and appended to disk at this interval
+FLUSH_INTERVAL_SECONDS = 10
+# The 1s series is trimmed to this many days; coarser series are kept in full
+SECOND_RETENTION_DAYS = float(os.environ.get('MT5_API_EQUITY_1S_RETENTION_DAYS', 7))
+TRIM_INTERVAL_SECONDS = 3600
+
+RESOLUTIONS = {'1s': 1, '1m': 60, '1h': 3600}
+# Fields sampled from account_info; each bucket keeps the last value, plus the equity range
+SAMPLED_FIELDS = ('balance', 'equity', 'margin', 'margin_free', 'profit')
+VALUE_COLUMNS = ('balance', 'equity', 'equity_min', 'equity_max', 'margin', 'margin_free', 'profit')
+
+# Largest number of points a range query returns
+MAX_POINTS = 10000
+
+class _RollupSeries:
+    """
+    One resolution of the time series, stored column by column: <name>.time.i8 holds
+    bucket start times, <name>.<column>.f8 one float64 per bucket. Appends are
+    cheap and range queries binary-search the time column.
+    """
+
+    def __init__(self, name: str, seconds: int):
+        self.name = name
+        self.seconds = seconds
+        self.current = None
+        self.pending = []
+
+    def _path(self, column):
+        if column == 'time':
+            return os.path.join(EQUITY_DIR, f"{self.name}.time.i8")
+        return os.path.join(EQUITY_DIR, f"{self.name}.{column}.f8")
+
+    def add(self, sample_time: float, sample: dict):
+        """Fold a sample into the open bucket, closing the previous one when it ends."""
+        bucket = int(sample_time) - int(sample_time) % self.seconds
+        if self.current is not None and self.current['time'] != bucket:
+            self.pending.append(self.current)
+            self.current = None
+        if self.current is None:
+            self.current = {'time': bucket, **sample, 'equity_min': sample['equity'], 'equity_max': sample['equity']}
+        else:
+            self.current.update(sample)
+            self.current['equity_min'] = min(self.current['equity_min'], sample['equity'])
+            self.current['equity_max'] = max(self.current['equity_max'], sample['equity'])
+
+    def flush(self):
+        """Append closed buckets to the column files."""
+        if not self.pending:
+            return
+        rows, self.pending = self.pending, []
+        for column in VALUE_COLUMNS:
+            with open(self._path(column), 'ab') as f:
+                np.array([row[column] for row in rows], dtype=np.float64).tofile(f)
+        # Time is written last: a partial write leaves it the shortest column and is ignored
+        with open(self._path('time'), 'ab') as f:
+            np.array([row['time'] for row in rows], dtype=np.int64).tofile(f)
+
+    def _stored_count(self):
+        sizes = [os.path.getsize(self._path(column)) // 8 if os.path.exists(self._path(column)) else 0
+                 for column in ('time', *VALUE_COLUMNS)]
+        return min(sizes)
+
+    def repair(self):
+        """Cut every column to the length of the shortest one, dropping a partially written append."""
+        count = self._stored_count()
+        for column in ('time', *VALUE_COLUMNS):
+            path = self._path(column)
+            if os.path.exists(path) and os.path.getsize(path) != count * 8:
+                os.truncate(path, count * 8)
+                logger.warning(f"Equity series {self.name}: truncated {column} to {count} buckets.")
+
+    def trim(self, before: int):
+        """Drop stored buckets older than before."""
+        count = self._stored_count()
+        if count == 0:
+            return
+        times = np.fromfile(self._path('time'), dtype=np.int64, count=count)
+        start = int(np.searchsorted(times, before, side='left'))
+        if start == 0:
+            return
+        for column, dtype in (*((column, np.float64) for column in VALUE_COLUMNS), ('time', np.int64)):
+            values = np.fromfile(self._path(column), dtype=dtype, count=count)[start:]
+            tmp_file = self._path(column) + '.tmp'
+            values.tofile(tmp_file)
+            os.replace(tmp_file, self._path(column))
+        logger.info(f"Equity series {self.name}: trimmed {start} buckets older than {before}.")
+
+    def read(self, from_timestamp: int, to_timestamp: int):
+        """Return {column: ndarray} of the buckets starting within the range, including unflushed ones."""
+        count = self._stored_count()
+        times = np.fromfile(self._path('time'), dtype=np.int64, count=count) if count else np.empty(0, dtype=np.int64)
+        lo = int(np.searchsorted(times, from_timestamp, side='left'))
+        hi = int(np.searchsorted(times, to_timestamp, side='right'))
+        columns = {'time': times[lo:hi]}
+        for column in VALUE_COLUMNS:
+            columns[column] = np.fromfile(self._path(column), dtype=np.float64, count=hi - lo, offset=lo * 8) if hi > lo else np.empty(0)
+
+        recent = [row for row in (*self.pending, *([self.current] if self.current else []))
+                  if from_timestamp <= row['time'] <= to_timestamp]
+        if recent:
+            columns['time'] = np.concatenate((columns['time'], np.array([row['time'] for row in recent], dtype=np.int64)))
+            for column in VALUE_COLUMNS:
+                columns[column] = np.concatenate((columns[column], np.array([row[column] for row in recent])))
+        return columns
+
+_series = {name: _RollupSeries(name, seconds) for name, seconds in RESOLUTIONS.items()}
+_lock = threading.Lock()
+
+_worker_thread = None
+_stop_event = threading.Event()
+
+def record_sample(account_info, sample_time: float = None):
+    """Add one account_info sample to every resolution."""
+    sample = {field: float(getattr(account_info, field)) for field in SAMPLED_FIELDS}
+    sample_time = time.time() if sample_time is None else sample_time
+    with _lock:
+        for series in _series.values():
+            series.add(sample_time, sample)
+
+def flush():
+    """Write closed buckets of every resolution to disk."""
+    with _lock:
+        for series in _series.values():
+            try:
+                series.flush()
+            except Exception as e:
+                logger.error(f"Error writing equity series {series.name}: {str(e)}")
+
+def query(from_timestamp: int, to_timestamp: int, resolution: str = None, fields=None):
+    """
+    Return the recorded series between two timestamps.
+
+    Args:
+        resolution: '1s', '1m' or '1h'; by default the finest one that fits in MAX_POINTS.
+        fields: Value columns to return; all by default.
+
+    Returns:
+        {"resolution": str, "time": [...], <field>: [...]}
+
+    Raises:
+        ValueError: On an unknown resolution or field, or a range too long for the resolution.
+    """
+    if from_timestamp > to_timestamp:
+        raise ValueError("from_date must be before to_date")
+    fields = list(fields) if fields else list(VALUE_COLUMNS)
+    unknown = [field for field in fields if field not in VALUE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}. Must be among {list(VALUE_COLUMNS)}")
+
+    span = to_timestamp - from_timestamp
+    if resolution is None:
+        resolution = next((name for name, seconds in RESOLUTIONS.items() if span / seconds <= MAX_POINTS), '1h')
+    elif resolution not in RESOLUTIONS:
+        raise ValueError(f"Invalid resolution. Must be one of {list(RESOLUTIONS)}")
+    if span / RESOLUTIONS[resolution] > MAX_POINTS:
+        raise ValueError(f"Range too long for resolution {resolution}, use a coarser one")
+
+    with _lock:
+        columns = _series[resolution].read(from_timestamp, to_timestamp)
+    return {"resolution": resolution, "time": columns['time'].tolist(),
+            **{field: columns[field].tolist() for field in fields}}
+
+def equity_recorder_worker():
+    """Record the shared account state at a fixed rate and persist the rollups."""
+    logger.info("Equity recorder started.")
+    last_flush = last_trim = time.monotonic()
+    next_sample = time.monotonic()
+
+    while not _stop_event.is_set():
+        try:
+            # The sampler runs at least this fast; allowing one late tick keeps this on the shared cache
+            account_info = account_state.get_account_info(max_age_ms=SAMPLE_INTERVAL_SECONDS * 2000)
+            if account_info is not None:
+                record_sample(account_info)
+
+            now = time.monotonic()
+            if now - last_flush >= FLUSH_INTERVAL_SECONDS:
+                last_flush = now
+                flush()
+            if now - last_trim >= TRIM_INTERVAL_SECONDS:
+                last_trim = now
+                with _lock:
+                    _series['1s'].trim(int(time.time() - SECOND_RETENTION_DAYS * 86400))
+        except Exception as e:
+            logger.error(f"Error in equity recorder: {str(e)}")
+
+        # Keep a fixed rate regardless of how long the sample took
+        next_sample += SAMPLE_INTERVAL_SECONDS
+        _stop_event.wait(max(0.0, next_sample - time.monotonic()))
+        next_sample = max(next_sample, time.monotonic())
+
+    flush()
+    logger.info("Equity recorder stopped.")
+
+def start_worker():
+    """Start the equity recorder thread."""
+    global _worker_thread
+    if _worker_thread is None or not _worker_thread.is_alive():
+        os.makedirs(EQUITY_DIR, exist_ok=True)
+        account_state.request_interval('equity_recorder', SAMPLE_INTERVAL_SECONDS)
+        with _lock:
+            for series in _series.values():
+                series.repair()
+        _stop_event.clear()
+        _worker_thread = threading.Thread(target=equity_recorder_worker, daemon=True)
+        _worker_thread.start()
+    else:
+        logger.info("Equity recorder is already running.")
+
+def stop_worker():
+    """Stop the equity recorder thread, flushing buffered buckets."""
+    global _worker_thread
+    if _worker_thread is not None and _worker_thread.is_alive():
+        _stop_event.set()
+        _worker_thread.join(timeout=10)
+    account_state.request_interval('equity_recorder', None)
+    _worker_thread = None
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+import numpy as np
+import MetaTrader5 as mt5
+from symbol_cache import get_symbol_info
+from position_snapshot import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Margin per lot moves with price, but slowly enough for a risk overview
+MARGIN_PER_LOT_TTL_SECONDS = 60
+# Snapshot age accepted by /exposure before positions are re-read from the terminal
+SNAPSHOT_MAX_AGE_SECONDS = 1
+
+# {(symbol, order_type): (fetched_at, margin for 1 lot)}
+_margin_cache = {}
+_margin_lock = threading.Lock()
+
+def get_margin_per_lot(symbol: str, order_type: int, price: float):
+    """Return the (cached) margin in account currency required for 1 lot, or None."""
+    now = time.monotonic()
+    with _margin_lock:
+        entry = _margin_cache.get((symbol, order_type))
+    if entry is not None and now - entry[0] <= MARGIN_PER_LOT_TTL_SECONDS:
+        return entry[1]
+
+    margin = mt5.order_calc_margin(order_type, symbol, 1.0, price)
+    if margin is None:
+        logger.error(f"Failed to calculate margin for {symbol}. Last error: {mt5.last_error()}")
+        return None
+    with _margin_lock:
+        _margin_cache[(symbol, order_type)] = (now, margin)
+    return margin
+
+def _sums(keys, columns):
+    """Sum each column per distinct key. Returns (unique keys, {column: sums})."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, {name: np.bincount(inverse, weights=values, minlength=len(unique)) for name, values in columns.items()}
+
+def _group_entry(sums, index):
+    return {
+        "positions": int(sums["positions"][index]),
+        "buy_volume": round(float(sums["buy_volume"][index]), 2),
+        "sell_volume": round(float(sums["sell_volume"][index]), 2),
+        "net_volume": round(float(sums["net_volume"][index]), 2),
+        "notional": round(float(sums["notional"][index]), 2),
+        "profit": round(float(sums["profit"][index]), 2),
+        "swap": round(float(sums["swap"][index]), 2),
+        "margin": round(float(sums["margin"][index]), 2),
+    }
+
+def compute_exposure():
+    """
+    Aggregate one positions snapshot per symbol and per magic number.
+
+    Notional is in the profit currency of each symbol; profit, swap and margin are
+    in the account currency. Margin is estimated from the margin of 1 lot and does
+    not account for hedged positions.
+
+    Returns:
+        A dictionary with "symbols", "magics" and "total", or None if the positions
+        could not be read.
+    """
+    positions = get_snapshot(max_age=SNAPSHOT_MAX_AGE_SECONDS)
+    if positions is None:
+        return None
+    if not positions:
+        return {"symbols": {}, "magics": {}, "total": {"positions": 0, "profit": 0.0, "swap": 0.0, "margin": 0.0}}
+
+    count = len(positions)
+    symbols = np.array([position.symbol for position in positions])
+    magics = np.fromiter((position.magic for position in positions), dtype=np.int64, count=count)
+    is_buy = np.fromiter((position.type == mt5.POSITION_TYPE_BUY for position in positions), dtype=bool, count=count)
+    volume = np.fromiter((position.volume for position in positions), dtype=float, count=count)
+    price = np.fromiter((position.price_current for position in positions), dtype=float, count=count)
+    profit = np.fromiter((position.profit for position in positions), dtype=float, count=count)
+    swap = np.fromiter((position.swap for position in positions), dtype=float, count=count)
+
+    # Per-symbol specifications are looked up once per distinct symbol from the caches
+    contract_size = np.zeros(count)
+    margin_per_lot = np.zeros(count)
+    for symbol in np.unique(symbols):
+        symbol_mask = symbols == symbol
+        symbol_info = get_symbol_info(str(symbol))
+        if symbol_info is not None:
+            contract_size[symbol_mask] = symbol_info.trade_contract_size
+        for buy, order_type in ((True, mt5.ORDER_TYPE_BUY), (False, mt5.ORDER_TYPE_SELL)):
+            mask = symbol_mask & (is_buy == buy)
+            if mask.any():
+                margin_per_lot[mask] = get_margin_per_lot(str(symbol), order_type, float(price[mask][0])) or 0.0
+
+    signed_volume = np.where(is_buy, volume, -volume)
+    columns = {
+        "positions": np.ones(count),
+        "buy_volume": np.where(is_buy, volume, 0.0),
+        "sell_volume": np.where(is_buy, 0.0, volume),
+        "net_volume": signed_volume,
+        "notional": signed_volume * contract_size * price,
+        "profit": profit,
+        "swap": swap,
+        "margin": volume * margin_per_lot,
+    }
+
+    unique_symbols, symbol_sums = _sums(symbols, columns)
+    by_symbol = {str(symbol): _group_entry(symbol_sums, index) for index, symbol in enumerate(unique_symbols)}
+
+    unique_magics, magic_sums = _sums(magics, columns)
+    by_magic = {}
+    for index, magic in enumerate(unique_magics):
+        entry = _group_entry(magic_sums, index)
+        # Volumes and notional only add up within a symbol, so report them per symbol
+        for key in ("buy_volume", "sell_volume", "net_volume", "notional"):
+            del entry[key]
+        entry["symbols"] = {}
+        by_magic[str(magic)] = entry
+
+    pair_keys = np.array([f"{magic}|{symbol}" for magic, symbol in zip(magics, symbols)])
+    unique_pairs, pair_sums = _sums(pair_keys, columns)
+    for index, pair in enumerate(unique_pairs):
+        magic, symbol = str(pair).split('|', 1)
+        entry = _group_entry(pair_sums, index)
+        by_magic[magic]["symbols"][symbol] = {key: entry[key] for key in ("positions", "net_volume", "notional")}
+
+    return {
+        "symbols": by_symbol,
+        "magics": by_magic,
+        "total": {
+            "positions": count,
+            "profit": round(float(profit.sum()), 2),
+            "swap": round(float(swap.sum()), 2),
+            "margin": round(float(columns["margin"].sum()), 2),
+        },
+    }
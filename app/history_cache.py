@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from flask import request, Response
+import MetaTrader5 as mt5
+
+logger = logging.getLogger(__name__)
+
+# Total size of cached response bodies; least recently used entries are evicted first
+MAX_BYTES = int(os.environ.get('MT5_API_HISTORY_CACHE_BYTES', 16 * 1024 * 1024))
+
+# Finalized records never change, so clients may keep them for a year
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Order states after which a history order can no longer change
+FINAL_ORDER_STATES = (
+    mt5.ORDER_STATE_FILLED,
+    mt5.ORDER_STATE_CANCELED,
+    mt5.ORDER_STATE_REJECTED,
+    mt5.ORDER_STATE_EXPIRED,
+)
+
+# {key: (body bytes, etag)}
+_entries = OrderedDict()
+_total_bytes = 0
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def is_final_order(order: dict) -> bool:
+    """True if a history order is in a terminal state."""
+    return order.get('state') in FINAL_ORDER_STATES
+
+def is_closed_position(position_ticket: int) -> bool:
+    """True if the position is no longer open, so its deals are complete."""
+    positions = mt5.positions_get(ticket=position_ticket)
+    return positions is not None and len(positions) == 0
+
+def deals_close_position(deals) -> bool:
+    """
+    True if the deals of a position bring its volume back to zero, i.e. the closing
+    deals are among them. Volumes are signed by deal direction, which also balances
+    reversals (DEAL_ENTRY_INOUT) and close-by deals.
+    """
+    net_volume = 0.0
+    for deal in deals or ():
+        if deal['type'] == mt5.DEAL_TYPE_BUY:
+            net_volume += deal['volume']
+        elif deal['type'] == mt5.DEAL_TYPE_SELL:
+            net_volume -= deal['volume']
+    return bool(deals) and abs(net_volume) < 1e-8
+
+def _finalize(response: Response, etag: str):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response.make_conditional(request)
+
+def cached_response(key: str):
+    """Return the cached response for key (304 if the client's ETag matches), or None."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+    body, etag = entry
+    return _finalize(Response(body, mimetype='application/json'), etag)
+
+def store_response(key: str, response: Response):
+    """
+    Cache the body of a JSON response for a finalized record and add the
+    ETag/Cache-Control headers to it.
+    """
+    global _total_bytes
+    body = response.get_data()
+    etag = hashlib.sha1(body).hexdigest()
+    if len(body) <= MAX_BYTES:
+        with _lock:
+            previous = _entries.pop(key, None)
+            if previous is not None:
+                _total_bytes -= len(previous[0])
+            _entries[key] = (body, etag)
+            _total_bytes += len(body)
+            while _total_bytes > MAX_BYTES:
+                _, (evicted_body, _) = _entries.popitem(last=False)
+                _total_bytes -= len(evicted_body)
+                _stats["evictions"] += 1
+    return _finalize(response, etag)
+
+def get_stats():
+    """Return cache size and hit counters."""
+    with _lock:
+        return {"entries": len(_entries), "bytes": _total_bytes, "max_bytes": MAX_BYTES, **_stats}
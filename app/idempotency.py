@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, jsonify, make_response, Response
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn tới thư mục cấu hình trong volume
+CONFIG_DIR = "/config"
+IDEMPOTENCY_FILE = os.path.join(CONFIG_DIR, "idempotency_keys.jsonl")
+
+# Number of keys remembered; the oldest are evicted first
+MAX_KEYS = int(os.environ.get('MT5_API_IDEMPOTENCY_MAX_KEYS', 5000))
+# How long a duplicate waits for the original request before giving up
+IN_FLIGHT_WAIT_SECONDS = 30
+# Client errors replayed on retry: the request itself was invalid. Other rejections, such
+# as the rate limit (429) or a risk guard halt (403), are transient and run again. Views
+# override this with record_outcome() once the request reached the terminal
+REPLAYED_CLIENT_ERRORS = (400, 404, 422)
+# The journal is rewritten once it holds this many times MAX_KEYS lines
+COMPACT_RATIO = 2
+
+# {scoped_key: {"status": int, "body": str, "created": float, "fingerprint": str}}
+_results = OrderedDict()
+# {scoped_key: (threading.Event, fingerprint)} for requests that are still running
+_in_flight = {}
+_lock = threading.Lock()
+_file_lock = threading.Lock()
+# Lines in the journal file, including those of evicted or overwritten keys
+_journal_lines = 0
+
+def _compact_journal():
+    """Rewrite the journal with only the remembered keys. Caller must hold _file_lock."""
+    global _journal_lines
+    with _lock:
+        entries = list(_results.items())
+    tmp_file = IDEMPOTENCY_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        for key, entry in entries:
+            f.write(json.dumps({"key": key, **entry}) + '\n')
+    os.replace(tmp_file, IDEMPOTENCY_FILE)
+    _journal_lines = len(entries)
+
+def load_idempotency_cache():
+    """
+    Load remembered keys from the journal file and compact it.
+
+    The journal is append-only while running (one JSON line per stored result), so
+    storing a result costs one small write instead of rewriting the whole cache.
+    """
+    if not os.path.exists(IDEMPOTENCY_FILE):
+        logger.info(f"No idempotency journal found at {IDEMPOTENCY_FILE}, starting empty.")
+        return
+    try:
+        with _file_lock:
+            with open(IDEMPOTENCY_FILE, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    _results[entry['key']] = {key: value for key, value in entry.items() if key != 'key'}
+                    _results.move_to_end(entry['key'])
+            while len(_results) > MAX_KEYS:
+                _results.popitem(last=False)
+            _compact_journal()
+        logger.info(f"Loaded {len(_results)} idempotency keys from {IDEMPOTENCY_FILE}")
+    except Exception as e:
+        logger.error(f"Error loading idempotency journal from {IDEMPOTENCY_FILE}: {str(e)}")
+
+def _store_result(key, status, body, fingerprint):
+    global _journal_lines
+    entry = {"status": status, "body": body, "created": time.time(), "fingerprint": fingerprint}
+    with _lock:
+        _results[key] = entry
+        _results.move_to_end(key)
+        while len(_results) > MAX_KEYS:
+            _results.popitem(last=False)
+    try:
+        with _file_lock:
+            with open(IDEMPOTENCY_FILE, 'a') as f:
+                f.write(json.dumps({"key": key, **entry}) + '\n')
+            _journal_lines += 1
+            # Evicted keys stay in the journal until it is compacted
+            if _journal_lines > COMPACT_RATIO * MAX_KEYS:
+                _compact_journal()
+    except Exception as e:
+        logger.error(f"Error appending to idempotency journal {IDEMPOTENCY_FILE}: {str(e)}")
+
+def _is_definitive(status):
+    return 200 <= status < 300 or status in REPLAYED_CLIENT_ERRORS
+
+def record_outcome(replay: bool = True):
+    """
+    Decide whether the response of the running request is remembered, whatever its
+    status. Trading views call record_outcome() as soon as the terminal filled an order,
+    so a retry never trades again even if a later step fails, and record_outcome(False)
+    when the terminal or market state refused it, so a retry trades again.
+    """
+    g.idempotency_replay = replay
+
+def _replay(entry):
+    response = Response(entry['body'], status=entry['status'], mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def _mismatch(key):
+    return jsonify({"error": f"Idempotency key {key} was already used with a different request body"}), 422
+
+def _get_request_fingerprint(data):
+    """Hash of the request body, so a key cannot be reused for a different request."""
+    if isinstance(data, dict):
+        # The token authenticates the request and may differ between retries
+        data = {name: value for name, value in data.items() if name != 'token'}
+        payload = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+    else:
+        payload = request.get_data()
+    return hashlib.sha256(payload).hexdigest()
+
+def _get_request_key():
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and data.get('client_order_id'):
+            key = str(data['client_order_id'])
+    if not key:
+        return None
+    # Keys are scoped per endpoint so the same id can be reused across operations
+    return f"{request.endpoint}:{key}"
+
+def idempotent(view):
+    """
+    Decorator making a trading endpoint safe to retry.
+
+    A request carrying an Idempotency-Key header (or client_order_id in the body) runs
+    once; later requests with the same key get the stored response back. A duplicate
+    arriving while the first request is still running waits for its result instead of
+    sending a second order. Successes and validation errors are remembered; transient
+    rejections and 5xx responses run again when retried, unless the view decided
+    otherwise with record_outcome().
+    Reusing a key with a different request body is rejected with 422.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = _get_request_key()
+        if key is None:
+            return view(*args, **kwargs)
+        fingerprint = _get_request_fingerprint(request.get_json(silent=True))
+
+        with _lock:
+            entry = _results.get(key)
+            if entry is not None:
+                _results.move_to_end(key)
+            else:
+                in_flight = _in_flight.get(key)
+                owner = in_flight is None
+                if owner:
+                    in_flight = _in_flight[key] = (threading.Event(), fingerprint)
+        if entry is not None:
+            # Entries journaled before fingerprints were recorded have none
+            if entry.get('fingerprint', fingerprint) != fingerprint:
+                return _mismatch(key)
+            logger.info(f"Replaying stored response for idempotency key {key}.")
+            return _replay(entry)
+
+        event, running_fingerprint = in_flight
+        if not owner:
+            if running_fingerprint != fingerprint:
+                return _mismatch(key)
+            logger.info(f"Request with idempotency key {key} is in flight, waiting for its result.")
+            event.wait(IN_FLIGHT_WAIT_SECONDS)
+            with _lock:
+                entry = _results.get(key)
+            if entry is not None:
+                return _replay(entry)
+            return jsonify({"error": f"A request with this idempotency key is still in progress or failed: {key}"}), 409
+
+        try:
+            g.pop('idempotency_replay', None)
+            response = make_response(view(*args, **kwargs))
+            replay = g.pop('idempotency_replay', None)
+            if replay if replay is not None else _is_definitive(response.status_code):
+                _store_result(key, response.status_code, response.get_data(as_text=True), fingerprint)
+            return response
+        finally:
+            with _lock:
+                _in_flight.pop(key, None)
+            event.set()
+
+    return wrapper
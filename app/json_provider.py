@@ -0,0 +1,126 @@
+import dataclasses
+import decimal
+import logging
+import uuid
+from datetime import date
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JSON_PROVIDERS = ('orjson', 'stdlib')
+
+def _datetime64_isoformat(value):
+    """Format a np.datetime64 the way orjson does: ISO 8601 truncated to microseconds, no offset."""
+    value = value.astype('datetime64[us]').item()
+    return None if value is None else value.isoformat()
+
+def _default(o):
+    """
+    Encode types neither encoder handles natively. Dates keep Flask's HTTP date format;
+    np.datetime64 values are written as ISO 8601 strings, as orjson serializes them.
+    """
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, tuple) and hasattr(o, '_asdict'):
+        return o._asdict()
+    if isinstance(o, np.datetime64):
+        return _datetime64_isoformat(o)
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        if o.dtype.kind == 'M':
+            return [_default(value) for value in o]
+        return o.tolist()
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+_CONTAINERS = (dict, list, tuple)
+
+def _namedtuples_as_dicts(o):
+    """
+    Return o with every namedtuple replaced by a dict of its fields. Containers holding
+    no other containers, such as route records of scalars, are returned as they are.
+    """
+    if isinstance(o, dict):
+        if not any(isinstance(value, _CONTAINERS) for value in o.values()):
+            return o
+        return {key: _namedtuples_as_dicts(value) for key, value in o.items()}
+    if isinstance(o, (list, tuple)):
+        if hasattr(o, '_asdict'):
+            return {key: _namedtuples_as_dicts(value) for key, value in o._asdict().items()}
+        if not any(isinstance(value, _CONTAINERS) for value in o):
+            return o
+        return [_namedtuples_as_dicts(value) for value in o]
+    return o
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """
+    Flask's stdlib provider extended with NumPy values, producing the same shapes as
+    OrjsonJSONProvider. The stdlib encoder writes tuples as arrays before consulting
+    default, so namedtuples are turned into dicts before encoding.
+    """
+
+    default = staticmethod(_default)
+
+    def dumps(self, obj, **kwargs):
+        return super().dumps(_namedtuples_as_dicts(obj), **kwargs)
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider built on orjson. NumPy arrays and scalars are serialized natively
+    and namedtuples become objects. NaN and infinity become null instead of the
+    invalid NaN literal the stdlib writes. Of the json.dumps keyword arguments only
+    sort_keys is honoured.
+    """
+
+    default = staticmethod(_default)
+
+    def _options(self, sort_keys: bool, indent: bool = False):
+        # Datetimes are passed to _default to keep the HTTP date format of the stdlib provider
+        options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=self._options(kwargs.get('sort_keys', self.sort_keys))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        # Build the body as bytes directly, skipping the str round trip of dumps()
+        body = orjson.dumps(obj, default=_default, option=self._options(self.sort_keys, indent))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+def create_json_provider(app, name: str = 'orjson'):
+    """
+    Return the JSON provider selected by name, falling back to the stdlib one when
+    orjson is not installed.
+
+    Raises:
+        ValueError: If name is not one of JSON_PROVIDERS.
+    """
+    if name not in JSON_PROVIDERS:
+        raise ValueError(f"Invalid JSON provider {name}. Must be one of {list(JSON_PROVIDERS)}")
+    if name == 'orjson' and orjson is None:
+        logger.warning("orjson is not installed, using the stdlib JSON provider.")
+        name = 'stdlib'
+    logger.info(f"Using the {name} JSON provider.")
+    return OrjsonJSONProvider(app) if name == 'orjson' else StdlibJSONProvider(app)
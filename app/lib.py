@@ -1,9 +1,17 @@
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import MetaTrader5 as mt5
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Dict
 import pandas as pd
 from constants import MT5Timeframe # Assuming constants.py exists and has MT5Timeframe enum
+from symbol_cache import get_symbol_info
+from trade_validator import TradeValidationError, resolve_filling_mode, forget_filling_mode
+import rate_governor
+import trade_ledger
+from rate_governor import OrderRateLimited
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +54,73 @@ def get_timeframe(timeframe_str: str) -> MT5Timeframe:
         )
 
 
-def close_position(position, deviation=20, magic=0, comment='', type_filling=mt5.ORDER_FILLING_IOC):
+# Server-side retry budget for requotes and price changes on market orders
+REQUOTE_RETRY_MS = int(os.environ.get('MT5_API_REQUOTE_RETRY_MS', 500))
+REQUOTE_RETCODES = (mt5.TRADE_RETCODE_REQUOTE, mt5.TRADE_RETCODE_PRICE_CHANGED)
+
+def send_market_order(request, request_class, retry_ms=None, max_slippage=None):
+    """
+    Send a market (TRADE_ACTION_DEAL) request, re-pricing and resubmitting it on
+    requotes and price changes.
+
+    Args:
+        request: The order_send request dictionary, including 'price'.
+        request_class: Rate governor class of the request.
+        retry_ms: Time budget for retries in milliseconds (default MT5_API_REQUOTE_RETRY_MS, 0 disables).
+        max_slippage: Maximum distance in points between the first and a re-priced
+            attempt (default: the request deviation).
+
+    Returns:
+        (order_result, attempts) where attempts lists price, retcode and latency of each try.
+
+    Raises:
+        OrderRateLimited: If the first attempt could not get a rate governor token.
+    """
+    retry_ms = REQUOTE_RETRY_MS if retry_ms is None else retry_ms
+    max_slippage = request.get('deviation', 0) if max_slippage is None else max_slippage
+    deadline = time.monotonic() + retry_ms / 1000.0
+    first_price = request['price']
+    attempts = []
+
+    while True:
+        started = time.perf_counter()
+        try:
+            result = rate_governor.order_send(request, request_class)
+        except OrderRateLimited:
+            if not attempts:
+                raise
+            logger.warning(f"Retry for {request['symbol']} stopped by rate governor.")
+            break
+        attempts.append({
+            "attempt": len(attempts) + 1,
+            "price": request['price'],
+            "retcode": result.retcode if result else None,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3)
+        })
+
+        if result is None or result.retcode not in REQUOTE_RETCODES or time.monotonic() >= deadline:
+            break
+
+        tick = mt5.symbol_info_tick(request['symbol'])
+        symbol_info = get_symbol_info(request['symbol'])
+        if tick is None or symbol_info is None:
+            break
+        price = tick.ask if request['type'] == mt5.ORDER_TYPE_BUY else tick.bid
+        if price == 0.0 or abs(price - first_price) > max_slippage * symbol_info.point:
+            logger.warning(f"Not retrying {request['symbol']} order: price moved from {first_price} to {price}, beyond {max_slippage} points.")
+            break
+        logger.info(f"Order on {request['symbol']} got retcode {result.retcode}, resubmitting at {price}.")
+        request = dict(request, price=price)
+
+    return result, attempts
+
+def close_position(position, deviation=20, magic=0, comment='', type_filling=None, retry_ms=None, max_slippage=None, attempts=None):
+    """
+    Close a position at market.
+
+    retry_ms/max_slippage configure the requote retry (see send_market_order). If an
+    attempts list is given, it is extended with the per-attempt report.
+    """
     if 'type' not in position or 'ticket' not in position:
         logger.error("Position dictionary missing 'type' or 'ticket' keys.")
         return None
@@ -76,6 +150,13 @@ def close_position(position, deviation=20, magic=0, comment='', type_filling=mt5
         logger.error(f"Invalid price retrieved for symbol: {position['symbol']}")
         return None
 
+    if type_filling is None:
+        try:
+            type_filling = resolve_filling_mode(position['symbol'])
+        except TradeValidationError as e:
+            logger.error(f"Cannot close position {position['ticket']}: {str(e)}")
+            return None
+
     request = {
         "action": mt5.TRADE_ACTION_DEAL,
         "position": position['ticket'],  # select the position you want to close
@@ -90,19 +171,51 @@ def close_position(position, deviation=20, magic=0, comment='', type_filling=mt5
         "type_filling": type_filling,
     }
 
-    order_result = mt5.order_send(request)
+    try:
+        order_result, send_attempts = send_market_order(request, rate_governor.CLASS_CLOSE, retry_ms, max_slippage)
+        if attempts is not None:
+            attempts.extend(send_attempts)
+    except OrderRateLimited as e:
+        logger.error(f"Failed to close position {position['ticket']}: {str(e)}")
+        return None
 
     if order_result is None or order_result.retcode != mt5.TRADE_RETCODE_DONE: # Added None check
         error_code, error_str = mt5.last_error()
         error_message = order_result.comment if order_result else "MT5 order_send returned None" # Added None check
         logger.error(f"Failed to close position {position['ticket']}: {error_message}. MT5 Error: {error_str}")
+        if order_result is not None and order_result.retcode == mt5.TRADE_RETCODE_INVALID_FILL:
+            forget_filling_mode(position['symbol'])
         return None
 
     logger.info(f"Position {position['ticket']} closed successfully.")
     return order_result
 
+def close_positions(positions, type_filling=None, comment='', max_workers=1):
+    """
+    Close several positions, concurrently when max_workers > 1.
+
+    Args:
+        positions: Position dictionaries (see close_position).
+        max_workers: Number of close requests in flight at once.
 
-def close_all_positions(order_type='all', symbol='', comment='', magic=None, type_filling=mt5.ORDER_FILLING_IOC):
+    Returns:
+        The order results of the positions that were closed, in input order.
+    """
+    def close(position):
+        order_result = close_position(position, comment=comment, type_filling=type_filling)
+        if not order_result:
+            logger.error(f"Failed to close position {position['ticket']}.")
+        return order_result
+
+    if max_workers > 1 and len(positions) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(positions))) as executor:
+            results = list(executor.map(close, positions))
+    else:
+        results = [close(position) for position in positions]
+    return [order_result for order_result in results if order_result]
+
+
+def close_all_positions(order_type='all', symbol='', comment='', magic=None, type_filling=None):
     order_type_dict = {
         'BUY': mt5.ORDER_TYPE_BUY,
         'SELL': mt5.ORDER_TYPE_SELL
@@ -141,15 +254,7 @@ def close_all_positions(order_type='all', symbol='', comment='', magic=None, typ
             logger.error('No open positions matching the criteria.')
             return []
 
-        results = []
-        for _, position in positions_df.iterrows():
-            order_result = close_position(position, type_filling=type_filling)
-            if order_result:
-                results.append(order_result)
-            else:
-                logger.error(f"Failed to close position {position['ticket']}.")
-
-        return results
+        return close_positions(positions_df.to_dict(orient='records'), type_filling=type_filling)
     else:
         logger.error("No open positions to close.")
         return []
@@ -197,38 +302,18 @@ def get_deal_from_ticket(ticket, from_date=None, to_date=None):
         logger.error("Ticket must be an integer.")
         return None
 
-    # Define default date range if not provided
-    # Note: MT5 history deals/orders are typically recent.
-    # Adjusting default range to be wider for potential trailing stop history checks if needed,
-    # but for a single deal lookup, a shorter range around current time might be sufficient.
-    # Let's keep the original logic for now, assuming recent deal.
-    if from_date is None or to_date is None:
-        # Using UTC timezone for consistency with MetaTrader5
-        utc_now = datetime.now(mt5.TIMEZONE)
-        to_date = utc_now
-        # Assuming the deal happened recently relative to the position close
-        from_date = utc_now - timedelta(hours=1) # Adjusted to 1 hour, can be changed
-
-    # Convert datetime to MT5 time (integer)
-    from_timestamp = int(from_date.timestamp())
-    to_timestamp = int(to_date.timestamp())
-
-    # Retrieve deals using the specified date range and position
-    # Note: history_deals_get can take 'position' argument to filter by position ticket
-    deals = mt5.history_deals_get(from_timestamp, to_timestamp, position=ticket)
-    if deals is None or len(deals) == 0:
-        logger.error(f"No deal history found for position ticket {ticket} between {from_date} and {to_date}.")
+    # Deals come from the local ledger, so positions of any age are found.
+    # The date range is only applied when given.
+    from_timestamp = int(from_date.timestamp()) if from_date is not None else None
+    to_timestamp = int(to_date.timestamp()) if to_date is not None else None
+
+    deals = trade_ledger.get_position_deals(ticket, from_timestamp, to_timestamp)
+    if not deals:
+        logger.error(f"No deal history found for position ticket {ticket}.")
         return None
 
     # Convert deals to a DataFrame for easier processing
-    deals_df = pd.DataFrame([deal._asdict() for deal in deals])
-
-    # Filter deals to only include those related to the specified position ticket
-    deals_df = deals_df[deals_df['position_id'] == ticket]
-
-    if deals_df.empty:
-         logger.error(f"No deals found for position ticket {ticket} within the specified date range.")
-         return None
+    deals_df = pd.DataFrame(deals)
 
     # Optional: Verify that all deals belong to the same symbol
     if not all(deal == deals_df['symbol'].iloc[0] for deal in deals_df['symbol']):
@@ -263,15 +348,14 @@ def get_order_from_ticket(ticket):
         logger.error("Ticket must be an integer.")
         return None
 
-    # Get the order history
-    # Note: history_orders_get can take 'ticket' argument directly
-    orders = mt5.history_orders_get(ticket=ticket)
+    # Get the order history from the local ledger
+    orders = trade_ledger.get_orders(ticket)
     if orders is None or len(orders) == 0:
         logger.error(f"No order history found for ticket {ticket}")
         return None
 
     # Convert order to a dictionary (assuming only one order per ticket in history context)
-    order_dict = orders[0]._asdict()
+    order_dict = orders[0]
 
     return order_dict
 
@@ -395,7 +479,12 @@ def apply_trailing_stop(position_ticket: int, trailing_distance: float):
 
     # Send the modification order
     logger.info(f"  Sending MT5 modification request: {request}")
-    result = mt5.order_send(request)
+    try:
+        # Trailing updates never wait for the budget; the worker simply retries next cycle
+        result = rate_governor.order_send(request, rate_governor.CLASS_TRAILING)
+    except OrderRateLimited:
+        logger.info(f"  Trailing stop update for position {position_ticket} deferred by rate governor.")
+        return {"message": "Deferred by rate governor"}
 
     if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
         error_code, error_str = mt5.last_error()
@@ -405,3 +494,143 @@ def apply_trailing_stop(position_ticket: int, trailing_distance: float):
 
     logger.info(f"Successfully applied trailing stop for position {position_ticket}. New SL: {formatted_new_sl}. MT5 Result: {result._asdict()}")
     return result._asdict() # Modification successful
+
+
+SLTP_MODES = ('price', 'points_from_open', 'points_from_current')
+
+def _resolve_sltp_level(value, is_sl, position, close_price, point, mode):
+    """
+    Convert a requested SL/TP value into an absolute price.
+
+    None keeps the current level, 0 removes it. In the points modes the value is a
+    distance in points from the open price or from the current (closing) price.
+    """
+    if value is None:
+        return position.sl if is_sl else position.tp
+    value = float(value)
+    if value == 0.0 or mode == 'price':
+        return value
+
+    reference = position.price_open if mode == 'points_from_open' else close_price
+    distance = value * point
+    # SL sits on the losing side of the reference price, TP on the winning side
+    if (position.type == mt5.ORDER_TYPE_BUY) == is_sl:
+        return reference - distance
+    return reference + distance
+
+def modify_sl_tp_bulk(tickets=None, symbol='', comment='', magic=None, order_type='all', sl=None, tp=None, mode='price'):
+    """
+    Modify SL/TP on every position matching the filters (or the ticket list).
+
+    Positions are read with a single positions_get call, ticks are fetched once per
+    symbol and symbol specifications come from the symbol cache. New levels are checked
+    locally against the stops and freeze levels, and order_send is only issued for
+    positions whose SL or TP would actually change.
+
+    Args:
+        tickets: Optional list of position tickets. When given, the other filters still apply;
+            an empty list matches no position.
+        symbol, comment, magic, order_type: Same filters as close_all_positions.
+        sl, tp: New levels; None keeps the current level, 0 removes it.
+        mode: 'price' (absolute prices), 'points_from_open' or 'points_from_current'.
+
+    Returns:
+        A list of per-position result dictionaries, or None if positions could not be read.
+    """
+    if mode not in SLTP_MODES:
+        raise ValueError(f"Invalid mode: {mode}. Must be one of {', '.join(SLTP_MODES)}.")
+
+    order_type_dict = {
+        'BUY': mt5.ORDER_TYPE_BUY,
+        'SELL': mt5.ORDER_TYPE_SELL
+    }
+    if order_type != 'all' and order_type not in order_type_dict:
+        raise ValueError(f"Invalid order_type: {order_type}. Must be 'BUY', 'SELL', or 'all'.")
+
+    positions = mt5.positions_get()
+    if positions is None:
+        logger.error("Failed to retrieve positions.")
+        return None
+
+    ticket_filter = set(int(ticket) for ticket in tickets) if tickets is not None else None
+    selected = [
+        position for position in positions
+        if (ticket_filter is None or position.ticket in ticket_filter)
+        and (symbol == '' or position.symbol == symbol)
+        and (comment == '' or position.comment == comment)
+        and (magic is None or position.magic == magic)
+        and (order_type == 'all' or position.type == order_type_dict[order_type])
+    ]
+
+    results = []
+    ticks = {}
+    for position in selected:
+        if position.symbol not in ticks:
+            ticks[position.symbol] = mt5.symbol_info_tick(position.symbol)
+        tick = ticks[position.symbol]
+        symbol_info = get_symbol_info(position.symbol)
+        if tick is None or symbol_info is None:
+            results.append({"ticket": position.ticket, "status": "failed", "reason": f"No market data for {position.symbol}"})
+            continue
+
+        is_buy = position.type == mt5.ORDER_TYPE_BUY
+        # A position is closed at the opposite price: BUY at Bid, SELL at Ask
+        close_price = tick.bid if is_buy else tick.ask
+        point = symbol_info.point
+        digits = symbol_info.digits
+
+        new_sl = round(_resolve_sltp_level(sl, True, position, close_price, point, mode), digits)
+        new_tp = round(_resolve_sltp_level(tp, False, position, close_price, point, mode), digits)
+        entry = {"ticket": position.ticket, "symbol": position.symbol, "sl": new_sl, "tp": new_tp}
+
+        if new_sl == round(position.sl, digits) and new_tp == round(position.tp, digits):
+            entry["status"] = "unchanged"
+            results.append(entry)
+            continue
+
+        # Levels closer than the freeze level to the market cannot be touched at all
+        freeze_distance = symbol_info.trade_freeze_level * point
+        if freeze_distance > 0 and any(
+            level != 0.0 and abs(close_price - level) <= freeze_distance
+            for level in (position.sl, position.tp)
+        ):
+            entry.update({"status": "rejected", "reason": f"Position is within the freeze level ({symbol_info.trade_freeze_level} points)"})
+            results.append(entry)
+            continue
+
+        stops_distance = symbol_info.trade_stops_level * point
+        if is_buy:
+            sl_invalid = new_sl != 0.0 and new_sl > close_price - stops_distance
+            tp_invalid = new_tp != 0.0 and new_tp < close_price + stops_distance
+        else:
+            sl_invalid = new_sl != 0.0 and new_sl < close_price + stops_distance
+            tp_invalid = new_tp != 0.0 and new_tp > close_price - stops_distance
+        if sl_invalid or tp_invalid:
+            entry.update({"status": "rejected", "reason": f"{'SL' if sl_invalid else 'TP'} violates the stops level ({symbol_info.trade_stops_level} points from {close_price})"})
+            results.append(entry)
+            continue
+
+        request = {
+            "action": mt5.TRADE_ACTION_SLTP,
+            "position": position.ticket,
+            "symbol": position.symbol,
+            "sl": new_sl,
+            "tp": new_tp
+        }
+        try:
+            result = rate_governor.order_send(request, rate_governor.CLASS_MODIFY)
+        except OrderRateLimited as e:
+            entry.update({"status": "deferred", "reason": str(e)})
+            results.append(entry)
+            continue
+        if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+            error_code, error_str = mt5.last_error()
+            error_message = result.comment if result else "MT5 order_send returned None"
+            logger.error(f"Failed to modify SL/TP for position {position.ticket}: {error_message}. MT5 Error: {error_str}")
+            entry.update({"status": "failed", "reason": error_message, "mt5_error": error_str})
+        else:
+            entry.update({"status": "modified", "result": result._asdict()})
+        results.append(entry)
+
+    logger.info(f"Bulk SL/TP: {len(selected)} positions matched, {sum(1 for r in results if r['status'] == 'modified')} modified.")
+    return results
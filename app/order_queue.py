@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+import requests
+from flask import make_response, request
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn tới thư mục cấu hình trong volume
+CONFIG_DIR = "/config"
+JOBS_FILE = os.path.join(CONFIG_DIR, "order_jobs.jsonl")
+
+# A queued job not started within this many seconds fails instead of trading at
+# whatever price is current, e.g. after a restart or behind a long queue
+MAX_QUEUED_SECONDS = float(os.environ.get('MT5_API_JOB_MAX_QUEUED_SECONDS', 60))
+
+# Finished jobs kept for status polling; the oldest are dropped first
+MAX_FINISHED_JOBS = 1000
+# The journal is rewritten once it holds this many lines per kept job
+COMPACT_RATIO = 4
+
+# Endpoints that can be executed asynchronously: {name: (view endpoint, path)}
+ASYNC_ENDPOINTS = {
+    'order': ('order.post_order', '/order'),
+    'close_all_positions': ('position.close_all_positions_endpoint', '/close_all_positions'),
+}
+
+# {job_id: job_dict}, insertion ordered
+_jobs = {}
+_jobs_lock = threading.Lock()
+_job_queue = queue.Queue()
+_file_lock = threading.Lock()
+# Lines in the journal file, including superseded states and pruned jobs
+_journal_lines = 0
+
+_app = None
+_dispatcher_thread = None
+_stop_event = threading.Event()
+
+def _append_job(job):
+    """
+    Append the current state of a job to the journal.
+
+    The journal holds one JSON line per state change and the last line of a job wins,
+    so a change costs one small write instead of rewriting the whole job table.
+    """
+    global _journal_lines
+    try:
+        with _file_lock:
+            with open(JOBS_FILE, 'a') as f:
+                f.write(json.dumps(job) + '\n')
+            _journal_lines += 1
+    except Exception as e:
+        logger.error(f"Error appending to order jobs journal {JOBS_FILE}: {str(e)}")
+
+def _compact_jobs():
+    """Rewrite the journal with one line per kept job."""
+    global _journal_lines
+    try:
+        with _file_lock:
+            with _jobs_lock:
+                jobs = [json.dumps(job) for job in _jobs.values()]
+            tmp_file = JOBS_FILE + '.tmp'
+            with open(tmp_file, 'w') as f:
+                f.writelines(line + '\n' for line in jobs)
+            os.replace(tmp_file, JOBS_FILE)
+            _journal_lines = len(jobs)
+    except Exception as e:
+        logger.error(f"Error compacting order jobs journal {JOBS_FILE}: {str(e)}")
+
+def _read_journal():
+    if not os.path.exists(JOBS_FILE):
+        return []
+    jobs = {}
+    with open(JOBS_FILE, 'r') as f:
+        for line in f:
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash
+                continue
+            jobs.pop(job['id'], None)
+            jobs[job['id']] = job
+    return list(jobs.values())
+
+def _load_jobs():
+    """Restore jobs from the journal, re-queue the ones that never started and compact it."""
+    try:
+        jobs = _read_journal()
+    except Exception as e:
+        logger.error(f"Error loading order jobs from {JOBS_FILE}: {str(e)}")
+        return
+    if not jobs:
+        return
+
+    requeued = 0
+    with _jobs_lock:
+        for job in sorted(jobs, key=lambda job: job['created']):
+            if job['status'] == 'running':
+                # The order may or may not have reached the broker; never send it twice
+                job.update({"status": "failed", "finished": time.time(), "error": "Interrupted by a restart while running, check positions before resubmitting"})
+            _jobs[job['id']] = job
+            if job['status'] == 'queued':
+                _job_queue.put(job['id'])
+                requeued += 1
+        _prune_finished_jobs()
+    _compact_jobs()
+    logger.info(f"Loaded {len(jobs)} order jobs from {JOBS_FILE}, {requeued} re-queued.")
+
+def _prune_finished_jobs():
+    """Drop the oldest finished jobs beyond MAX_FINISHED_JOBS. Caller must hold _jobs_lock."""
+    finished = [job_id for job_id, job in _jobs.items() if job['status'] in ('done', 'failed')]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+# Body fields that only concern the submission, not the queued execution
+_SUBMISSION_FIELDS = ('async', 'callback_url', 'client_order_id', 'token')
+
+def wants_async(data) -> bool:
+    """True if the current request asked for asynchronous execution (?async=1 or "async": true)."""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return isinstance(data, dict) and bool(data.get('async'))
+
+def job_payload(data: dict) -> dict:
+    """Strip submission-only fields from a request body before queuing it."""
+    return {key: value for key, value in (data or {}).items() if key not in _SUBMISSION_FIELDS}
+
+def submit_job(kind: str, payload: dict, callback_url: str = None):
+    """
+    Persist a job and queue it for the dispatcher.
+
+    Args:
+        kind: A key of ASYNC_ENDPOINTS.
+        payload: The JSON body the endpoint will be called with.
+        callback_url: Optional URL the finished job is POSTed to.
+
+    Returns:
+        The job dictionary.
+    """
+    if kind not in ASYNC_ENDPOINTS:
+        raise ValueError(f"Unsupported async job kind: {kind}")
+
+    now = time.time()
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "payload": payload,
+        "callback_url": callback_url,
+        "status": "queued",
+        "created": now,
+        "expires": now + MAX_QUEUED_SECONDS,
+        "started": None,
+        "finished": None,
+        "http_status": None,
+        "result": None,
+    }
+    with _jobs_lock:
+        _jobs[job['id']] = job
+        _prune_finished_jobs()
+    _append_job(job)
+    _job_queue.put(job['id'])
+    logger.info(f"Queued {kind} job {job['id']} (queue depth {_job_queue.qsize()}).")
+    return dict(job)
+
+def get_job(job_id: str):
+    """Return a copy of a job, or None if it is unknown."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+def queue_depth():
+    """Number of jobs waiting to be dispatched."""
+    return _job_queue.qsize()
+
+def _notify(job):
+    try:
+        requests.post(job['callback_url'], json=job, timeout=5)
+    except requests.RequestException as e:
+        logger.error(f"Failed to push result of job {job['id']} to {job['callback_url']}: {str(e)}")
+
+def _run_job(job_id: str):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job['status'] != 'queued':
+            return
+        expired = time.time() > job.get('expires', job['created'] + MAX_QUEUED_SECONDS)
+        if expired:
+            job.update({"status": "failed", "finished": time.time(), "error": f"Not started within {MAX_QUEUED_SECONDS:g} seconds of submission and never sent, resubmit if still wanted"})
+        else:
+            job.update({"status": "running", "started": time.time()})
+        current_job = dict(job)
+    _append_job(current_job)
+    if expired:
+        logger.warning(f"Order job {job_id} expired in the queue and was not sent.")
+        if current_job.get('callback_url'):
+            threading.Thread(target=_notify, args=(current_job,), daemon=True).start()
+        return
+
+    endpoint, path = ASYNC_ENDPOINTS[job['kind']]
+    try:
+        # Run the regular handler in a synthetic request context; authentication
+        # already happened when the job was submitted
+        with _app.test_request_context(path, method='POST', json=job['payload']):
+            response = make_response(_app.view_functions[endpoint]())
+            http_status = response.status_code
+            result = response.get_json(silent=True)
+        status = 'done' if http_status < 400 else 'failed'
+    except Exception as e:
+        logger.error(f"Error running order job {job_id}: {str(e)}")
+        http_status, result, status = 500, {"error": "Internal server error"}, 'failed'
+
+    with _jobs_lock:
+        job.update({"status": status, "finished": time.time(), "http_status": http_status, "result": result})
+        finished_job = dict(job)
+        kept_jobs = len(_jobs)
+    _append_job(finished_job)
+    # Compaction runs on the dispatcher, off the submission path
+    if _journal_lines > COMPACT_RATIO * max(kept_jobs, MAX_FINISHED_JOBS):
+        _compact_jobs()
+    logger.info(f"Order job {job_id} finished with status {status} ({http_status}).")
+
+    if finished_job.get('callback_url'):
+        threading.Thread(target=_notify, args=(finished_job,), daemon=True).start()
+
+def order_dispatcher():
+    """Drain the job queue back-to-back against the terminal."""
+    logger.info("Order dispatcher started.")
+    while not _stop_event.is_set():
+        try:
+            job_id = _job_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+        _run_job(job_id)
+    logger.info("Order dispatcher stopped.")
+
+def start_dispatcher(app):
+    """Start the order dispatcher thread for the given Flask app."""
+    global _app, _dispatcher_thread
+    _app = app
+    if _dispatcher_thread is None or not _dispatcher_thread.is_alive():
+        _stop_event.clear()
+        _load_jobs()
+        _dispatcher_thread = threading.Thread(target=order_dispatcher, daemon=True)
+        _dispatcher_thread.start()
+    else:
+        logger.info("Order dispatcher is already running.")
+
+def stop_dispatcher():
+    """Stop the order dispatcher thread."""
+    global _dispatcher_thread
+    if _dispatcher_thread is not None and _dispatcher_thread.is_alive():
+        _stop_event.set()
+        _dispatcher_thread.join(timeout=10)
+    _dispatcher_thread = None
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+import MetaTrader5 as mt5
+
+logger = logging.getLogger(__name__)
+
+# Latest positions_get() result shared between workers and routes: {ticket: position}
+_positions = {}
+_snapshot_time = 0.0
+_snapshot_lock = threading.Lock()
+
+# Account margin mode, read once per login (hedging accounts get one position per order)
+_hedging_account = None
+
+def update_snapshot(positions):
+    """Replace the shared snapshot with a fresh positions_get() result."""
+    global _positions, _snapshot_time
+    snapshot = {position.ticket: position for position in positions}
+    with _snapshot_lock:
+        _positions = snapshot
+        _snapshot_time = time.monotonic()
+
+def get_snapshot(max_age: float = None):
+    """
+    Return the shared positions snapshot as a list.
+
+    Args:
+        max_age: If given and the snapshot is older than this many seconds, it is
+            refreshed from the terminal first.
+
+    Returns:
+        A list of MT5 TradePosition namedtuples, or None if a refresh failed.
+    """
+    with _snapshot_lock:
+        age = time.monotonic() - _snapshot_time
+        positions = list(_positions.values())
+    if max_age is None or age <= max_age:
+        return positions
+
+    positions = mt5.positions_get()
+    if positions is None:
+        logger.error("Failed to refresh positions snapshot.")
+        return None
+    update_snapshot(positions)
+    return list(positions)
+
+def find_position_by_symbol(symbol: str):
+    """Return a snapshot position on symbol, or None. Only meaningful on netting accounts."""
+    with _snapshot_lock:
+        for position in _positions.values():
+            if position.symbol == symbol:
+                return position
+    return None
+
+def is_hedging_account():
+    """
+    Return True if the logged in account uses the hedging margin mode (cached), or None
+    if the terminal did not return the account info, so callers never guess netting.
+    """
+    global _hedging_account
+    if _hedging_account is None:
+        account_info = mt5.account_info()
+        if account_info is None:
+            logger.warning(f"Failed to read the account margin mode. Last error: {mt5.last_error()}")
+            return None
+        _hedging_account = account_info.margin_mode == mt5.ACCOUNT_MARGIN_MODE_RETAIL_HEDGING
+        logger.info(f"Account margin mode: {'hedging' if _hedging_account else 'netting/exchange'}.")
+    return _hedging_account
+
+def reset_account_mode():
+    """Forget the cached margin mode, e.g. after logging in to another account."""
+    global _hedging_account
+    _hedging_account = None
+
+def resolve_position_ticket(order_result, symbol: str):
+    """
+    Work out the position ticket of a filled market order without a history lookup.
+
+    On hedging accounts every market order opens its own position whose ticket equals
+    the order ticket. On netting accounts the order joins the existing position on the
+    symbol, if the snapshot knows one, or opens a new position identified by the order.
+
+    Returns:
+        (position_ticket, confirmed) - confirmed is False when the result is a best
+        guess that should be checked against the deal history off the response path.
+    """
+    if is_hedging_account():
+        return order_result.order, True
+    # Netting, or a margin mode not known yet: an unconfirmed guess either way
+    existing = find_position_by_symbol(symbol)
+    if existing is not None:
+        return existing.ticket, False
+    return order_result.order, False
@@ -0,0 +1,57 @@
+from bisect import bisect_left, bisect_right
+
+class PriceLevelIndex:
+    """
+    Price levels kept in a sorted array so a price move only has to look at the
+    levels it crossed, found with two binary searches, instead of every level.
+
+    Levels are (price, level_id) pairs; the same price can hold several ids.
+    """
+
+    def __init__(self):
+        self._prices = []
+        self._ids = []
+
+    def __len__(self):
+        return len(self._prices)
+
+    def add(self, price: float, level_id):
+        """Insert a level, keeping the arrays sorted by price."""
+        index = bisect_right(self._prices, price)
+        self._prices.insert(index, price)
+        self._ids.insert(index, level_id)
+
+    def remove(self, price: float, level_id) -> bool:
+        """Remove one level. Returns False if it was not found."""
+        index = bisect_left(self._prices, price)
+        while index < len(self._prices) and self._prices[index] == price:
+            if self._ids[index] == level_id:
+                del self._prices[index]
+                del self._ids[index]
+                return True
+            index += 1
+        return False
+
+    def _pop_range(self, lo: int, hi: int):
+        level_ids = self._ids[lo:hi]
+        del self._prices[lo:hi]
+        del self._ids[lo:hi]
+        return level_ids
+
+    def pop_crossed_down(self, previous: float, current: float):
+        """
+        Remove and return the levels reached by a price falling from previous to
+        current, i.e. current <= level < previous.
+        """
+        if current >= previous:
+            return []
+        return self._pop_range(bisect_left(self._prices, current), bisect_left(self._prices, previous))
+
+    def pop_crossed_up(self, previous: float, current: float):
+        """
+        Remove and return the levels reached by a price rising from previous to
+        current, i.e. previous < level <= current.
+        """
+        if current <= previous:
+            return []
+        return self._pop_range(bisect_right(self._prices, previous), bisect_right(self._prices, current))
@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+import MetaTrader5 as mt5
+
+logger = logging.getLogger(__name__)
+
+# Request classes, highest priority first
+CLASS_CLOSE = 'close'        # closing positions
+CLASS_ENTRY = 'entry'        # new market orders
+CLASS_MODIFY = 'modify'      # user initiated SL/TP changes
+CLASS_TRAILING = 'trailing'  # background trailing stop updates
+
+# Shared budget for every order_send: sustained requests per second and burst size
+ORDER_RATE = float(os.environ.get('MT5_API_ORDER_RATE', 10))
+ORDER_BURST = float(os.environ.get('MT5_API_ORDER_BURST', 20))
+
+# Tokens a class must leave in the bucket. Lower priority classes stop earlier, so
+# the remaining headroom is always available to closes and new entries.
+RESERVED_TOKENS = {
+    CLASS_CLOSE: 0.0,
+    CLASS_ENTRY: 1.0,
+    CLASS_MODIFY: 2.0,
+    CLASS_TRAILING: ORDER_BURST / 2,
+}
+
+# Default time a caller is willing to wait for a token, in seconds
+DEFAULT_WAIT = {
+    CLASS_CLOSE: 5.0,
+    CLASS_ENTRY: 2.0,
+    CLASS_MODIFY: 2.0,
+    CLASS_TRAILING: 0.0,
+}
+
+class OrderRateLimited(Exception):
+    """Raised when an order_send could not get a token within its wait budget."""
+    pass
+
+_tokens = ORDER_BURST
+_last_refill = time.monotonic()
+_condition = threading.Condition()
+
+_stats = {
+    request_class: {"granted": 0, "throttled": 0, "deferred": 0, "wait_seconds": 0.0}
+    for request_class in RESERVED_TOKENS
+}
+_broker_throttled = 0
+
+def _refill():
+    """Add the tokens earned since the last refill. Caller must hold _condition."""
+    global _tokens, _last_refill
+    now = time.monotonic()
+    _tokens = min(ORDER_BURST, _tokens + (now - _last_refill) * ORDER_RATE)
+    _last_refill = now
+
+def acquire(request_class: str, timeout: float = None) -> bool:
+    """
+    Take one token for a request of the given class.
+
+    Args:
+        request_class: One of the CLASS_* constants.
+        timeout: Seconds to wait for a token; defaults to the class budget.
+
+    Returns:
+        True if a token was taken, False if the request has to be deferred.
+    """
+    global _tokens
+    reserve = RESERVED_TOKENS[request_class]
+    if timeout is None:
+        timeout = DEFAULT_WAIT[request_class]
+    stats = _stats[request_class]
+    started = time.monotonic()
+    deadline = started + timeout
+    waited = False
+
+    with _condition:
+        while True:
+            _refill()
+            if _tokens - 1.0 >= reserve:
+                _tokens -= 1.0
+                stats["granted"] += 1
+                if waited:
+                    stats["throttled"] += 1
+                    stats["wait_seconds"] += time.monotonic() - started
+                return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                stats["deferred"] += 1
+                return False
+            waited = True
+            _condition.wait(min(remaining, (reserve + 1.0 - _tokens) / ORDER_RATE))
+
+def order_send(request: dict, request_class: str, timeout: float = None):
+    """
+    mt5.order_send behind the shared token bucket.
+
+    Raises:
+        OrderRateLimited: If no token became available within the wait budget.
+    """
+    global _tokens, _last_refill, _broker_throttled
+    if not acquire(request_class, timeout):
+        logger.warning(f"order_send deferred by rate governor ({request_class}).")
+        raise OrderRateLimited(f"Order rate limit reached for {request_class} requests, try again shortly")
+
+    result = mt5.order_send(request)
+    if result is not None and result.retcode == mt5.TRADE_RETCODE_TOO_MANY_REQUESTS:
+        # The broker is already throttling us: empty the bucket so everyone backs off
+        with _condition:
+            _tokens = 0.0
+            _last_refill = time.monotonic()
+            _broker_throttled += 1
+        logger.warning("Broker answered TRADE_RETCODE_TOO_MANY_REQUESTS, draining the order budget.")
+    return result
+
+def get_stats():
+    """Return a snapshot of the governor configuration and counters."""
+    with _condition:
+        _refill()
+        return {
+            "rate_per_second": ORDER_RATE,
+            "burst": ORDER_BURST,
+            "available_tokens": round(_tokens, 3),
+            "reserved_tokens": dict(RESERVED_TOKENS),
+            "broker_throttled": _broker_throttled,
+            "classes": {
+                request_class: {**stats, "wait_seconds": round(stats["wait_seconds"], 3)}
+                for request_class, stats in _stats.items()
+            },
+        }
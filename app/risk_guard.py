@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import MetaTrader5 as mt5
+from lib import close_positions
+import account_state
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn tới thư mục cấu hình trong volume
+CONFIG_DIR = "/config"
+RISK_GUARD_FILE = os.path.join(CONFIG_DIR, "risk_guard.json")
+
+# Concurrent close requests when flattening
+FLATTEN_WORKERS = 8
+# Flatten passes before giving up on positions that refuse to close
+FLATTEN_ROUNDS = 3
+
+# Limits are disabled when None
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "interval_ms": int(os.environ.get('MT5_API_RISK_GUARD_INTERVAL_MS', 200)),
+    "max_daily_drawdown": None,      # account currency, from the day's starting equity
+    "max_daily_drawdown_pct": None,  # percent of the day's starting equity
+    "equity_floor": None,            # account currency
+    "min_margin_level": None,        # percent, only checked while margin is used
+    "flatten": True,                 # close every position on a breach
+}
+
+risk_config = DEFAULT_CONFIG.copy()
+
+# Trip state, persisted with the config so a restart does not silently resume trading
+_state = {
+    "tripped": False,
+    "reason": None,
+    "tripped_at": None,
+    "day": None,
+    "day_start_equity": None,
+}
+_last_sample = {}
+_lock = threading.Lock()
+
+def _save():
+    """Persist config and trip state. Caller must hold _lock."""
+    try:
+        tmp_file = RISK_GUARD_FILE + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({"config": risk_config, "state": _state}, f, indent=4)
+        os.replace(tmp_file, RISK_GUARD_FILE)
+    except Exception as e:
+        logger.error(f"Error saving risk guard to {RISK_GUARD_FILE}: {str(e)}")
+
+def load_risk_guard():
+    """Load config and trip state from risk_guard.json."""
+    if not os.path.exists(RISK_GUARD_FILE):
+        return
+    try:
+        with open(RISK_GUARD_FILE, 'r') as f:
+            data = json.load(f)
+        with _lock:
+            risk_config.update({key: data.get("config", {}).get(key, DEFAULT_CONFIG[key]) for key in DEFAULT_CONFIG})
+            _state.update({key: data.get("state", {}).get(key, _state[key]) for key in _state})
+        logger.info(f"Risk guard loaded from {RISK_GUARD_FILE} (tripped: {_state['tripped']})")
+    except Exception as e:
+        logger.error(f"Error loading risk guard from {RISK_GUARD_FILE}: {str(e)}")
+
+def set_risk_config(**changes):
+    """
+    Update risk limits.
+
+    Raises:
+        ValueError: On unknown keys or invalid values.
+    """
+    for key, value in changes.items():
+        if key not in DEFAULT_CONFIG:
+            raise ValueError(f"Unknown risk guard setting: {key}")
+        if key in ("enabled", "flatten"):
+            changes[key] = bool(value)
+        elif key == "interval_ms":
+            if int(value) < 10:
+                raise ValueError("interval_ms must be at least 10")
+            changes[key] = int(value)
+        elif value is not None:
+            if float(value) < 0:
+                raise ValueError(f"{key} must not be negative")
+            changes[key] = float(value)
+    with _lock:
+        risk_config.update(changes)
+        _save()
+        config = dict(risk_config)
+    _apply_interval()
+    logger.info(f"Risk guard config updated: {changes}")
+    # The account may already be past the new limits while equity stands still
+    check_now()
+    return config
+
+def get_status():
+    """Return config, trip state and the latest sample."""
+    with _lock:
+        return {"config": dict(risk_config), **_state, "last_sample": dict(_last_sample)}
+
+def is_tripped() -> bool:
+    """True while new orders are blocked."""
+    return _state["tripped"]
+
+def reset(rebase: bool = False):
+    """
+    Clear a trip and allow new orders again.
+
+    Args:
+        rebase: Measure the daily drawdown from the next sample instead of the
+            day's starting equity; otherwise a drawdown breach trips again at once.
+    """
+    with _lock:
+        _state.update({"tripped": False, "reason": None, "tripped_at": None})
+        if rebase:
+            _state["day_start_equity"] = None
+        _save()
+    logger.warning("Risk guard reset, new orders are allowed again.")
+    check_now()
+
+def _check_limits(account_info):
+    """Return the reason of the first breached limit, or None. Caller must hold _lock."""
+    equity = account_info.equity
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    if _state["day"] != day or _state["day_start_equity"] is None:
+        _state.update({"day": day, "day_start_equity": equity})
+        _save()
+    drawdown = _state["day_start_equity"] - equity
+
+    if risk_config["equity_floor"] is not None and equity <= risk_config["equity_floor"]:
+        return f"Equity {equity} at or below floor {risk_config['equity_floor']}"
+    if risk_config["max_daily_drawdown"] is not None and drawdown >= risk_config["max_daily_drawdown"]:
+        return f"Daily drawdown {drawdown:.2f} reached limit {risk_config['max_daily_drawdown']}"
+    if (risk_config["max_daily_drawdown_pct"] is not None and _state["day_start_equity"] > 0
+            and drawdown / _state["day_start_equity"] * 100 >= risk_config["max_daily_drawdown_pct"]):
+        return f"Daily drawdown {drawdown / _state['day_start_equity'] * 100:.2f}% reached limit {risk_config['max_daily_drawdown_pct']}%"
+    if (risk_config["min_margin_level"] is not None and account_info.margin > 0
+            and account_info.margin_level <= risk_config["min_margin_level"]):
+        return f"Margin level {account_info.margin_level:.2f}% at or below {risk_config['min_margin_level']}%"
+    return None
+
+def flatten():
+    """Close every open position with parallel close requests, retrying stragglers."""
+    started = time.monotonic()
+    for round_number in range(1, FLATTEN_ROUNDS + 1):
+        positions = mt5.positions_get()
+        if positions is None:
+            logger.error(f"Risk guard flatten: failed to retrieve positions. Last error: {mt5.last_error()}")
+            continue
+        if not positions:
+            break
+        results = close_positions([position._asdict() for position in positions], comment="risk guard", max_workers=FLATTEN_WORKERS)
+        logger.warning(f"Risk guard flatten round {round_number}: closed {len(results)}/{len(positions)} positions "
+                       f"after {time.monotonic() - started:.3f}s.")
+    else:
+        remaining = mt5.positions_get()
+        if remaining:
+            logger.error(f"Risk guard flatten: {len(remaining)} positions still open after {FLATTEN_ROUNDS} rounds.")
+
+def trip(reason: str, wait: bool = True):
+    """
+    Block new orders and flatten if configured. Does nothing if already tripped.
+
+    Args:
+        wait: Flatten before returning; otherwise orders are blocked at once and the
+            positions are closed in a background thread.
+    """
+    with _lock:
+        if _state["tripped"]:
+            return
+        _state.update({"tripped": True, "reason": reason, "tripped_at": time.time()})
+        _save()
+        should_flatten = risk_config["flatten"]
+    logger.critical(f"Risk guard tripped: {reason}. New orders are blocked until reset.")
+    if should_flatten:
+        if wait:
+            flatten()
+        else:
+            threading.Thread(target=flatten, daemon=True).start()
+
+def _on_account_update(account_info, changes):
+    """Account state subscriber: check the limits on every change and trip on a breach."""
+    if not risk_config["enabled"] or _state["tripped"]:
+        return
+    with _lock:
+        _last_sample.update({
+            "time": time.time(), "equity": account_info.equity, "balance": account_info.balance,
+            "margin_level": account_info.margin_level
+        })
+        reason = _check_limits(account_info)
+    if reason:
+        # Flattening takes a while; keep it off the sampler thread so other subscribers still get updates
+        trip(reason, wait=False)
+
+def check_now():
+    """Check the limits against the latest account state, without waiting for it to change."""
+    if not risk_config["enabled"] or _state["tripped"]:
+        return
+    account_info = account_state.get_account_info(max_age_ms=risk_config["interval_ms"])
+    if account_info is None:
+        logger.error("Risk guard: failed to read account info for a limit check.")
+        return
+    _on_account_update(account_info, None)
+
+def _apply_interval():
+    """Ask the account state sampler for the configured rate while the guard is enabled."""
+    account_state.request_interval('risk_guard', risk_config["interval_ms"] / 1000 if risk_config["enabled"] else None)
+
+def start_worker():
+    """Load the risk guard and subscribe it to account state changes."""
+    load_risk_guard()
+    _apply_interval()
+    account_state.subscribe(_on_account_update)
+    logger.info("Risk guard started.")
+
+def stop_worker():
+    """Unsubscribe the risk guard from account state changes."""
+    account_state.unsubscribe(_on_account_update)
+    account_state.request_interval('risk_guard', None)
+    logger.info("Risk guard stopped.")
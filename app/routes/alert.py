@@ -0,0 +1,219 @@
+from flask import Blueprint, jsonify, request
+import logging
+from flasgger import swag_from
+from alert_engine import create_alert, delete_alert, get_alerts
+from auth import set_blueprint_policy, HEADER_OR_TOKEN
+
+alert_bp = Blueprint('alert', __name__)
+set_blueprint_policy(alert_bp, HEADER_OR_TOKEN)
+logger = logging.getLogger(__name__)
+
+ALERT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'id': {'type': 'string'},
+        'symbol': {'type': 'string'},
+        'type': {'type': 'string'},
+        'direction': {'type': 'string'},
+        'price': {'type': 'string'},
+        'level': {'type': 'number'},
+        'percent': {'type': 'number'},
+        'threshold': {'type': 'number'},
+        'reference': {'type': 'number', 'description': 'Price (or spread) when the alert was registered.'},
+        'levels': {'type': 'array', 'items': {'type': 'array'}, 'description': 'Absolute [index, level] pairs the alert triggers on.'},
+        'note': {'type': 'string'},
+        'status': {'type': 'string', 'enum': ['active', 'triggered']},
+        'created': {'type': 'number'},
+        'triggered': {'type': 'number'},
+        'triggered_value': {'type': 'number'}
+    }
+}
+
+@alert_bp.route('/alerts', methods=['POST'])
+@swag_from({
+    'tags': ['Alerts'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'symbol': {'type': 'string', 'description': 'Symbol to watch.'},
+                    'type': {
+                        'type': 'string',
+                        'enum': ['price_cross', 'percent_move', 'spread'],
+                        'description': 'Kind of alert.'
+                    },
+                    'level': {'type': 'number', 'description': 'price_cross: price that has to be crossed.'},
+                    'direction': {
+                        'type': 'string',
+                        'description': "price_cross: 'above' or 'below'. percent_move: 'up', 'down' or 'both'."
+                    },
+                    'percent': {'type': 'number', 'description': 'percent_move: move from the current price, in percent.'},
+                    'threshold': {'type': 'number', 'description': 'spread: spread in points that triggers the alert.'},
+                    'price': {
+                        'type': 'string',
+                        'enum': ['bid', 'ask'],
+                        'description': 'Side of the quote watched by price alerts. Default: bid.'
+                    },
+                    'note': {'type': 'string', 'description': 'Free text added to the notification.'},
+                    'token': {'type': 'string', 'description': 'API token for authentication if Authorization header is not provided.'}
+                },
+                'required': ['symbol', 'type']
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Alert registered successfully.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'message': {'type': 'string'},
+                    'alert': ALERT_SCHEMA
+                }
+            }
+        },
+        400: {
+            'description': 'Bad request or condition already met.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def create_alert_endpoint():
+    """
+    Create Price Alert
+    ---
+    description: Register a one-shot price-cross, percent-move or spread alert. The server watches the ticks and sends a Telegram notification when the condition is met, so clients do not have to poll /symbol_info_tick. Percent moves are converted to absolute levels from the current price. Authenticate using Authorization header or token in request body.
+    """
+    try:
+        data = request.get_json()
+        if not data or 'symbol' not in data or 'type' not in data:
+            return jsonify({"error": "symbol and type are required"}), 400
+
+        alert = create_alert(
+            data['symbol'],
+            data['type'],
+            level=data.get('level'),
+            direction=data.get('direction'),
+            percent=data.get('percent'),
+            threshold=data.get('threshold'),
+            price=data.get('price', 'bid'),
+            note=data.get('note')
+        )
+        return jsonify({"message": "Alert registered successfully", "alert": alert})
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in create_alert: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@alert_bp.route('/alerts', methods=['GET'])
+@swag_from({
+    'tags': ['Alerts'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'symbol',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Only return alerts for this symbol.'
+        },
+        {
+            'name': 'status',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['active', 'triggered'],
+            'required': False,
+            'description': 'Only return alerts with this status.'
+        },
+        {
+            'name': 'token',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'API token for authentication if Authorization header is not provided.'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Alerts retrieved successfully.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'alerts': {'type': 'array', 'items': ALERT_SCHEMA}
+                }
+            }
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def list_alerts_endpoint():
+    """
+    List Price Alerts
+    ---
+    description: Retrieve registered alerts, including recently triggered ones. Authenticate using Authorization header or token in query parameter.
+    """
+    try:
+        return jsonify({"alerts": get_alerts(request.args.get('symbol'), request.args.get('status'))})
+
+    except Exception as e:
+        logger.error(f"Error in list_alerts: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@alert_bp.route('/alerts/<alert_id>', methods=['DELETE'])
+@swag_from({
+    'tags': ['Alerts'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'alert_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'Id of the alert to delete.'
+        },
+        {
+            'name': 'token',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'API token for authentication if Authorization header is not provided.'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Alert deleted successfully.'
+        },
+        404: {
+            'description': 'Alert not found.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def delete_alert_endpoint(alert_id):
+    """
+    Delete Price Alert
+    ---
+    description: Delete an active or triggered alert. Authenticate using Authorization header or token in query parameter.
+    """
+    try:
+        if not delete_alert(alert_id):
+            return jsonify({"error": f"Alert {alert_id} not found"}), 404
+
+        return jsonify({"message": f"Alert {alert_id} deleted successfully."})
+
+    except Exception as e:
+        logger.error(f"Error in delete_alert: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
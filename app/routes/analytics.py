@@ -0,0 +1,115 @@
+from flask import Blueprint, jsonify, request
+import logging
+from datetime import datetime
+from flasgger import swag_from
+from analytics import performance
+from trade_ledger import LedgerNotReady
+
+analytics_bp = Blueprint('analytics', __name__)
+logger = logging.getLogger(__name__)
+
+METRICS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'net_pnl': {'type': 'number', 'description': 'Profit plus commission, swap and fees.'},
+        'realized_pnl': {'type': 'number'},
+        'commission': {'type': 'number'},
+        'swap': {'type': 'number'},
+        'fee': {'type': 'number'},
+        'trades': {'type': 'integer', 'description': 'Number of closing deals.'},
+        'wins': {'type': 'integer'},
+        'losses': {'type': 'integer'},
+        'win_rate': {'type': 'number'},
+        'profit_factor': {'type': 'number'},
+        'expectancy': {'type': 'number', 'description': 'Average net result per closed trade, including the costs charged when the position was opened.'},
+        'max_drawdown': {'type': 'number', 'description': 'Largest peak-to-trough drop of the closed-trade equity curve.'},
+        'avg_holding_seconds': {'type': 'number'}
+    }
+}
+
+@analytics_bp.route('/analytics/performance', methods=['GET'])
+@swag_from({
+    'tags': ['History'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'from_date',
+            'in': 'query',
+            'type': 'string',
+            'required': True,
+            'format': 'date-time',
+            'description': 'Start date in ISO format.'
+        },
+        {
+            'name': 'to_date',
+            'in': 'query',
+            'type': 'string',
+            'required': True,
+            'format': 'date-time',
+            'description': 'End date in ISO format.'
+        },
+        {
+            'name': 'group_by',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['symbol', 'magic', 'comment'],
+            'required': False,
+            'description': 'Also report metrics per symbol, magic number or comment.'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Performance metrics computed successfully.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'from_date': {'type': 'string'},
+                    'to_date': {'type': 'string'},
+                    'group_by': {'type': 'string'},
+                    'total': METRICS_SCHEMA,
+                    'groups': {'type': 'object', 'additionalProperties': METRICS_SCHEMA}
+                }
+            }
+        },
+        400: {
+            'description': 'Invalid parameter format or missing parameters.'
+        },
+        503: {
+            'description': 'The trade ledger is still loading the account history.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def performance_endpoint():
+    """
+    Get Trading Performance
+    ---
+    description: Compute realized P&L, costs, win rate, profit factor, expectancy, maximum drawdown and average holding time of the trades closed in a time window, optionally grouped by symbol, magic number or comment. Computed from the local trade ledger; complete past days are cached, so repeated queries only compute the edges of the window.
+    """
+    try:
+        from_date = request.args.get('from_date')
+        to_date = request.args.get('to_date')
+        if not all([from_date, to_date]):
+            return jsonify({"error": "from_date and to_date parameters are required"}), 400
+
+        from_date = datetime.fromisoformat(from_date.replace('Z', '+00:00'))
+        to_date = datetime.fromisoformat(to_date.replace('Z', '+00:00'))
+        group_by = request.args.get('group_by')
+
+        result = performance(int(from_date.timestamp()), int(to_date.timestamp()), group_by)
+        return jsonify({
+            "from_date": from_date.isoformat(),
+            "to_date": to_date.isoformat(),
+            "group_by": group_by,
+            **result
+        })
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LedgerNotReady as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in performance: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
@@ -0,0 +1,246 @@
+from flask import Blueprint, jsonify, request, current_app
+import logging
+import re
+from flasgger import swag_from
+from werkzeug.test import EnvironBuilder
+from auth import set_blueprint_policy, HEADER, HEADER_OR_TOKEN, SUBREQUEST_ENVIRON_KEY
+
+batch_bp = Blueprint('batch', __name__)
+set_blueprint_policy(batch_bp, HEADER_OR_TOKEN)
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 50
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Headers a sub-request may set; auth is done once for the whole batch
+SUBREQUEST_HEADERS = ('Idempotency-Key',)
+# ${id.path.to.value} references a value in the body of an earlier sub-request's response
+REFERENCE_PATTERN = re.compile(r'\$\{([A-Za-z0-9_\-]+)((?:\.[A-Za-z0-9_\-]+)*)\}')
+
+class BatchReferenceError(ValueError):
+    pass
+
+def _lookup(results, ref_id, path):
+    if ref_id not in results:
+        raise BatchReferenceError(f"Reference to unknown or later sub-request '{ref_id}'")
+    value = results[ref_id]['body']
+    for key in filter(None, path.split('.')):
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, dict) and key in value:
+            value = value[key]
+        else:
+            raise BatchReferenceError(f"'{ref_id}{path}' not found in the response of '{ref_id}'")
+    return value
+
+def resolve_references(value, results):
+    """Replace ${id.path} references with values from earlier responses. A whole-string reference keeps its type."""
+    if isinstance(value, str):
+        match = REFERENCE_PATTERN.fullmatch(value)
+        if match:
+            return _lookup(results, match.group(1), match.group(2))
+        return REFERENCE_PATTERN.sub(lambda m: str(_lookup(results, m.group(1), m.group(2))), value)
+    if isinstance(value, dict):
+        return {key: resolve_references(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    return value
+
+def _validate(sub_requests):
+    """Raises ValueError on a malformed batch."""
+    if not isinstance(sub_requests, list) or not sub_requests:
+        raise ValueError("requests must be a non-empty list")
+    if len(sub_requests) > MAX_BATCH_SIZE:
+        raise ValueError(f"A batch holds at most {MAX_BATCH_SIZE} requests")
+    seen = set()
+    for index, sub in enumerate(sub_requests):
+        if not isinstance(sub, dict):
+            raise ValueError(f"requests[{index}] must be an object")
+        sub_id = str(sub.get('id', index))
+        if sub_id in seen:
+            raise ValueError(f"Duplicate request id '{sub_id}'")
+        method = str(sub.get('method', 'GET')).upper()
+        if method not in BATCH_METHODS:
+            raise ValueError(f"requests[{index}]: invalid method {method}. Must be one of {list(BATCH_METHODS)}")
+        path = sub.get('path')
+        if not isinstance(path, str) or not path.startswith('/'):
+            raise ValueError(f"requests[{index}]: path must start with '/'")
+        if '?' in path:
+            raise ValueError(f"requests[{index}]: put query parameters in 'query', not in the path")
+        if path.rstrip('/') == '/batch':
+            raise ValueError(f"requests[{index}]: batches cannot be nested")
+        if not isinstance(sub.get('query') or {}, dict):
+            raise ValueError(f"requests[{index}]: query must be an object")
+        depends_on = sub.get('depends_on', [])
+        if not isinstance(depends_on, list) or any(str(dep) not in seen for dep in depends_on):
+            raise ValueError(f"requests[{index}]: depends_on must list ids of earlier requests")
+        seen.add(sub_id)
+
+def _dispatch(method, path, query, body, headers):
+    """Run one sub-request through the app's handlers in-process and return (status, body)."""
+    # check_auth_token has validated the header if one was sent. A batch authorized with
+    # a body token can only reach endpoints that accept one
+    scope = HEADER if request.headers.get('Authorization') else HEADER_OR_TOKEN
+    # References are resolved by now and may have produced a path no request can have
+    if not isinstance(path, str) or not path.startswith('/') or '?' in path or path.rstrip('/') == '/batch':
+        return 400, {"error": f"Invalid path after resolving references: {path!r}"}
+    try:
+        builder = EnvironBuilder(
+            path=path,
+            method=method,
+            query_string=query,
+            json=body if method != 'GET' and body is not None else None,
+            headers=headers,
+            environ_base={
+                'REMOTE_ADDR': request.remote_addr,
+                SUBREQUEST_ENVIRON_KEY: scope,
+            },
+        )
+        try:
+            environ = builder.get_environ()
+        finally:
+            builder.close()
+    except (ValueError, TypeError) as e:
+        return 400, {"error": f"Invalid sub-request: {str(e)}"}
+
+    app = current_app._get_current_object()
+    with app.request_context(environ):
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            logger.error(f"Error in batch sub-request {method} {path}: {str(e)}")
+            response = app.make_response((jsonify({"error": "Internal server error"}), 500))
+    payload = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+    return response.status_code, payload
+
+@batch_bp.route('/batch', methods=['POST'])
+@swag_from({
+    'tags': ['Batch'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'requests': {
+                        'type': 'array',
+                        'description': f'Sub-requests, run in order. At most {MAX_BATCH_SIZE}.',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'id': {'type': 'string', 'description': 'Name used by depends_on and references. Default: the index.'},
+                                'method': {'type': 'string', 'enum': list(BATCH_METHODS), 'default': 'GET'},
+                                'path': {'type': 'string', 'description': 'Endpoint path without a query string, e.g. /symbol_info_tick/EURUSD or /order. Query parameters go in query.'},
+                                'query': {'type': 'object', 'description': 'Query string parameters.'},
+                                'body': {'type': 'object', 'description': 'JSON body.'},
+                                'headers': {'type': 'object', 'description': f'Optional headers among {list(SUBREQUEST_HEADERS)}.'},
+                                'depends_on': {
+                                    'type': 'array',
+                                    'items': {'type': 'string'},
+                                    'description': 'Ids of earlier sub-requests that must succeed (2xx); otherwise this one is skipped with status 424.'
+                                }
+                            },
+                            'required': ['path']
+                        }
+                    },
+                    'stop_on_error': {'type': 'boolean', 'default': False, 'description': 'Skip every remaining sub-request after the first failure.'},
+                    'token': {'type': 'string', 'description': 'API token for authentication if Authorization header is not provided.'}
+                },
+                'required': ['requests']
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Every sub-request succeeded.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'succeeded': {'type': 'integer'},
+                    'failed': {'type': 'integer'},
+                    'skipped': {'type': 'integer'},
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'id': {'type': 'string'},
+                                'status': {'type': 'integer', 'description': 'HTTP status of the sub-request; 424 if skipped.'},
+                                'body': {'type': 'object'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        207: {
+            'description': 'Some sub-requests failed or were skipped; see per-request results.'
+        },
+        400: {
+            'description': 'Malformed batch.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def batch_endpoint():
+    """
+    Run a Batch of Requests
+    ---
+    description: Run several API calls in one round trip, authenticated once. Sub-requests go through the same handlers as individual calls, in order. A string value "${id.path}" in a path, query or body is replaced by a value from the response body of an earlier sub-request, e.g. "${order.result.order}". Authenticate using Authorization header or token in request body.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"error": "Request body is required"}), 400
+
+        sub_requests = data.get('requests')
+        _validate(sub_requests)
+        stop_on_error = bool(data.get('stop_on_error', False))
+
+        results = {}
+        ordered = []
+        stopped = False
+        for index, sub in enumerate(sub_requests):
+            sub_id = str(sub.get('id', index))
+            failed_deps = [str(dep) for dep in sub.get('depends_on', []) if not 200 <= results[str(dep)]['status'] < 300]
+            if stopped or failed_deps:
+                reason = "Skipped after an earlier failure" if stopped else f"Skipped because {failed_deps} did not succeed"
+                result = {"id": sub_id, "status": 424, "body": {"error": reason}, "skipped": True}
+            else:
+                method = str(sub.get('method', 'GET')).upper()
+                try:
+                    path = resolve_references(sub['path'], results)
+                    query = resolve_references(sub.get('query') or {}, results)
+                    body = resolve_references(sub.get('body'), results)
+                except BatchReferenceError as e:
+                    result = {"id": sub_id, "status": 424, "body": {"error": str(e)}, "skipped": True}
+                else:
+                    headers = {name: str(value) for name, value in (sub.get('headers') or {}).items()
+                               if name in SUBREQUEST_HEADERS}
+                    status, payload = _dispatch(method, path, query, body, headers)
+                    result = {"id": sub_id, "status": status, "body": payload}
+            results[sub_id] = result
+            ordered.append(result)
+            if stop_on_error and not 200 <= result['status'] < 300:
+                stopped = True
+
+        skipped = sum(1 for result in ordered if result.get('skipped'))
+        succeeded = sum(1 for result in ordered if 200 <= result['status'] < 300)
+        failed = len(ordered) - succeeded - skipped
+        logger.info(f"Batch of {len(ordered)} requests: {succeeded} succeeded, {failed} failed, {skipped} skipped")
+        return jsonify({
+            "succeeded": succeeded,
+            "failed": failed,
+            "skipped": skipped,
+            "results": ordered
+        }), 200 if succeeded == len(ordered) else 207
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in batch: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
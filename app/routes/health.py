@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify
 import MetaTrader5 as mt5
 from flasgger import swag_from
+from auth import set_blueprint_policy, PUBLIC
 
 health_bp = Blueprint('health', __name__)
+set_blueprint_policy(health_bp, PUBLIC)
 
 @health_bp.route('/health')
 @swag_from({
@@ -1,9 +1,11 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
 import MetaTrader5 as mt5
 import logging
 from datetime import datetime
 from flasgger import swag_from
 from lib import get_deal_from_ticket, get_order_from_ticket
+import trade_ledger
+import history_cache
 
 history_bp = Blueprint('history', __name__)
 logger = logging.getLogger(__name__)
@@ -42,6 +44,9 @@ logger = logging.getLogger(__name__)
                 }
             }
         },
+        304: {
+            'description': 'Not modified, the cached copy identified by If-None-Match is current.'
+        },
         400: {
             'description': 'Invalid ticket format.'
         },
@@ -57,7 +62,7 @@ def get_deal_from_ticket_endpoint():
     """
     Get Deal Information from Ticket
     ---
-    description: Retrieve deal information associated with a specific ticket number.
+    description: Retrieve deal information associated with a specific ticket number. Responses for closed positions carry an ETag and a long Cache-Control lifetime; send If-None-Match to get 304 Not Modified.
     """
     try:
         ticket = request.args.get('ticket')
@@ -65,11 +70,33 @@ def get_deal_from_ticket_endpoint():
             return jsonify({"error": "Ticket parameter is required"}), 400
         
         ticket = int(ticket)
+        cache_key = f"deal:{ticket}"
+        response = history_cache.cached_response(cache_key)
+        if response is not None:
+            return response
+
+        # Check before reading the deals so an open position is never cached. A closed
+        # position is only cached once its closing deals are stored: if the ledger lacks
+        # them, sync now, and cache nothing if that fails. Before the backfill finished,
+        # deals are read from the terminal directly.
+        closed = history_cache.is_closed_position(ticket)
+        if closed and not history_cache.deals_close_position(trade_ledger.get_position_deals(ticket)):
+            closed = False
+            if trade_ledger.is_ready():
+                try:
+                    trade_ledger.sync(max_age=0)
+                    closed = history_cache.deals_close_position(trade_ledger.get_position_deals(ticket))
+                except trade_ledger.LedgerSyncError as e:
+                    logger.warning(f"Not caching position {ticket}, trade ledger sync failed: {str(e)}")
+
         deal = get_deal_from_ticket(ticket)
         if deal is None:
             return jsonify({"error": "Failed to get deal information"}), 404
         
-        return jsonify(deal)
+        response = jsonify(deal)
+        if closed:
+            response = history_cache.store_response(cache_key, response)
+        return response
     
     except ValueError:
         return jsonify({"error": "Invalid ticket format"}), 400
@@ -101,6 +128,9 @@ def get_deal_from_ticket_endpoint():
                 }
             }
         },
+        304: {
+            'description': 'Not modified, the cached copy identified by If-None-Match is current.'
+        },
         400: {
             'description': 'Invalid ticket format.'
         },
@@ -116,7 +146,7 @@ def get_order_from_ticket_endpoint():
     """
     Get Order Information from Ticket
     ---
-    description: Retrieve order information associated with a specific ticket number.
+    description: Retrieve order information associated with a specific ticket number. Responses for finalized orders carry an ETag and a long Cache-Control lifetime; send If-None-Match to get 304 Not Modified.
     """
     try:
         ticket = request.args.get('ticket')
@@ -124,11 +154,19 @@ def get_order_from_ticket_endpoint():
             return jsonify({"error": "Ticket parameter is required"}), 400
         
         ticket = int(ticket)
+        cache_key = f"order:{ticket}"
+        response = history_cache.cached_response(cache_key)
+        if response is not None:
+            return response
+
         order = get_order_from_ticket(ticket)
         if order is None:
             return jsonify({"error": "Failed to get order information"}), 404
         
-        return jsonify(order)
+        response = jsonify(order)
+        if history_cache.is_final_order(order):
+            response = history_cache.store_response(cache_key, response)
+        return response
     
     except ValueError:
         return jsonify({"error": "Invalid ticket format"}), 400
@@ -136,6 +174,33 @@ def get_order_from_ticket_endpoint():
         logger.error(f"Error in get_order_from_ticket: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+# Deal entry names accepted by the entry filter
+DEAL_ENTRY_MAP = {
+    'in': mt5.DEAL_ENTRY_IN,
+    'out': mt5.DEAL_ENTRY_OUT,
+    'inout': mt5.DEAL_ENTRY_INOUT,
+    'out_by': mt5.DEAL_ENTRY_OUT_BY
+}
+
+# Largest page a client can ask for, and the chunk size used when streaming
+MAX_PAGE_SIZE = 10000
+STREAM_CHUNK_SIZE = 5000
+
+def _parse_int_arg(name):
+    """Read an optional integer query parameter. Raises ValueError if it is present but malformed."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r}. Must be an integer.")
+
+def _parse_cursor(cursor):
+    """Decode a '<time>_<ticket>' cursor. Raises ValueError if malformed."""
+    deal_time, ticket = cursor.split('_', 1)
+    return int(deal_time), int(ticket)
+
 @history_bp.route('/history_deals_get', methods=['GET'])
 @swag_from({
     'tags': ['History'],
@@ -161,26 +226,76 @@ def get_order_from_ticket_endpoint():
             'name': 'position',
             'in': 'query',
             'type': 'integer',
-            'required': True,
+            'required': False,
             'description': 'Position number to filter deals.'
+        },
+        {
+            'name': 'symbol',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Only deals of this symbol.'
+        },
+        {
+            'name': 'group',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'MT5 symbol group mask, e.g. "*USD*,!EURUSD".'
+        },
+        {
+            'name': 'magic',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Only deals with this magic number.'
+        },
+        {
+            'name': 'entry',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['in', 'out', 'inout', 'out_by'],
+            'required': False,
+            'description': 'Only deals with this entry type.'
+        },
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': f'Page size (max {MAX_PAGE_SIZE}). When limit or cursor is given the response is a page object instead of a list.'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'next_cursor of the previous page.'
+        },
+        {
+            'name': 'stream',
+            'in': 'query',
+            'type': 'boolean',
+            'required': False,
+            'description': 'Stream the whole range as a chunked JSON array, read from the ledger in chunks.'
         }
     ],
     'responses': {
         200: {
-            'description': 'Deals history retrieved successfully.',
+            'description': 'Deals history retrieved successfully. A list, or a page object when limit or cursor is given.',
             'schema': {
-                'type': 'array',
-                'items': {
-                    'type': 'object'
-                    # Define properties based on deal structure
+                'type': 'object',
+                'properties': {
+                    'deals': {'type': 'array', 'items': {'type': 'object'}},
+                    'next_cursor': {'type': 'string', 'description': 'Cursor of the next page, null on the last page.'}
                 }
             }
         },
         400: {
             'description': 'Invalid parameter format or missing parameters.'
         },
-        404: {
-            'description': 'Failed to get deals history.'
+        503: {
+            'description': 'The trade ledger is still loading the account history and the terminal did not return the deals.'
         },
         500: {
             'description': 'Internal server error.'
@@ -191,32 +306,79 @@ def history_deals_get_endpoint():
     """
     Get Deals History
     ---
-    description: Retrieve historical deals within a specified date range for a particular position.
+    description: Retrieve historical deals within a specified date range, optionally filtered by position, symbol, group mask, magic number and entry type. Deals are ordered by (time, ticket). Use limit and cursor to page through large ranges, or stream=1 to receive the whole range as one chunked response. Served from the local trade ledger, which is kept in sync with the terminal. Until the ledger has loaded the account history, deals are read from the terminal.
     """
     try:
         from_date = request.args.get('from_date')
         to_date = request.args.get('to_date')
-        position = request.args.get('position')
         
-        if not all([from_date, to_date, position]):
-            return jsonify({"error": "from_date, to_date, and position parameters are required"}), 400
+        if not all([from_date, to_date]):
+            return jsonify({"error": "from_date and to_date parameters are required"}), 400
         
         from_date = datetime.fromisoformat(from_date.replace('Z', '+00:00'))
         to_date = datetime.fromisoformat(to_date.replace('Z', '+00:00'))
-        position = int(position)
-
         from_timestamp = int(from_date.timestamp())
         to_timestamp = int(to_date.timestamp())
-        deals = mt5.history_deals_get(from_timestamp, to_timestamp, position=position)
-        
-        if deals is None:
-            return jsonify({"error": "Failed to get deals history"}), 404
-        
-        deals_list = [deal._asdict() for deal in deals]
-        return jsonify(deals_list)
+
+        entry = request.args.get('entry')
+        if entry is not None and entry not in DEAL_ENTRY_MAP:
+            return jsonify({"error": f"Invalid entry. Must be one of {list(DEAL_ENTRY_MAP)}"}), 400
+        # A malformed filter must fail the request, not silently widen it to every deal
+        try:
+            position = _parse_int_arg('position')
+            magic = _parse_int_arg('magic')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        filters = {
+            'position': position,
+            'symbol': request.args.get('symbol'),
+            'group': request.args.get('group'),
+            'magic': magic,
+            'entry': DEAL_ENTRY_MAP.get(entry)
+        }
+
+        if trade_ledger.is_ready():
+            trade_ledger.ensure_fresh()
+            query_deals = trade_ledger.query_deals
+        else:
+            # Until the backfill finished, the terminal answers directly
+            query_deals = trade_ledger.terminal_deals
+
+        if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+            json_provider = current_app.json
+            if query_deals is trade_ledger.query_deals:
+                chunks = trade_ledger.iter_deals(from_timestamp, to_timestamp, STREAM_CHUNK_SIZE, **filters)
+            else:
+                chunks = [query_deals(from_timestamp, to_timestamp, **filters)]
+
+            def generate():
+                yield '['
+                first = True
+                for deals in chunks:
+                    for deal in deals:
+                        yield ('' if first else ',') + json_provider.dumps(deal)
+                        first = False
+                yield ']'
+
+            return Response(stream_with_context(generate()), mimetype='application/json')
+
+        limit = request.args.get('limit')
+        cursor = request.args.get('cursor')
+        if limit is None and cursor is None:
+            return jsonify(query_deals(from_timestamp, to_timestamp, **filters))
+
+        limit = min(int(limit), MAX_PAGE_SIZE) if limit is not None else MAX_PAGE_SIZE
+        if limit <= 0:
+            return jsonify({"error": "limit must be positive"}), 400
+        after = _parse_cursor(cursor) if cursor else None
+        deals = query_deals(from_timestamp, to_timestamp, after=after, limit=limit, **filters)
+        next_cursor = f"{deals[-1]['time']}_{deals[-1]['ticket']}" if len(deals) == limit else None
+        return jsonify({"deals": deals, "next_cursor": next_cursor})
     
     except ValueError:
         return jsonify({"error": "Invalid parameter format"}), 400
+    except (trade_ledger.LedgerNotReady, trade_ledger.LedgerSyncError) as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logger.error(f"Error in history_deals_get: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
@@ -245,6 +407,9 @@ def history_deals_get_endpoint():
                 }
             }
         },
+        304: {
+            'description': 'Not modified, the cached copy identified by If-None-Match is current.'
+        },
         400: {
             'description': 'Invalid ticket format or missing parameter.'
         },
@@ -260,7 +425,7 @@ def history_orders_get_endpoint():
     """
     Get Orders History
     ---
-    description: Retrieve historical orders associated with a specific ticket number.
+    description: Retrieve historical orders associated with a specific ticket number. Responses for finalized orders carry an ETag and a long Cache-Control lifetime; send If-None-Match to get 304 Not Modified.
     """
     try:
         ticket = request.args.get('ticket')
@@ -268,12 +433,19 @@ def history_orders_get_endpoint():
             return jsonify({"error": "Ticket parameter is required"}), 400
         
         ticket = int(ticket)
-        orders = mt5.history_orders_get(ticket=ticket)
-        if orders is None:
+        cache_key = f"orders:{ticket}"
+        response = history_cache.cached_response(cache_key)
+        if response is not None:
+            return response
+
+        orders_list = trade_ledger.get_orders(ticket)
+        if not orders_list:
             return jsonify({"error": "Failed to get orders history"}), 404
         
-        orders_list = [order._asdict() for order in orders]
-        return jsonify(orders_list)
+        response = jsonify(orders_list)
+        if all(history_cache.is_final_order(order) for order in orders_list):
+            response = history_cache.store_response(cache_key, response)
+        return response
     
     except ValueError:
         return jsonify({"error": "Invalid ticket format"}), 400
@@ -2,16 +2,19 @@ from flask import Blueprint, jsonify, request
 import MetaTrader5 as mt5
 import logging
 from flasgger import swag_from
-import json
 import os
-import uuid
+import time
+from datetime import datetime
+from position_snapshot import reset_account_mode
+from account_state import get_account_info, get_age_ms, invalidate as invalidate_account_state, DEFAULT_MAX_AGE_MS
+from auth import get_api_token, generate_and_save_token
+from equity_recorder import query as query_equity_history, MAX_POINTS
 
 login_bp = Blueprint('login', __name__)
 logger = logging.getLogger(__name__)
 
 # Đường dẫn tới thư mục cấu hình trong volume
 CONFIG_DIR = "/config"
-TOKEN_FILE = os.path.join(CONFIG_DIR, "api_token.json")
 
 # Tạo thư mục config nếu chưa tồn tại
 if not os.path.exists(CONFIG_DIR):
@@ -22,35 +25,24 @@ if not os.path.exists(CONFIG_DIR):
         logger.error(f"Failed to create config directory {CONFIG_DIR}: {str(e)}")
         raise
 
-def load_api_token():
-    """Load API token từ file api_token.json."""
-    try:
-        if os.path.exists(TOKEN_FILE):
-            with open(TOKEN_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get("token", "")
-        else:
-            logger.info(f"No api_token.json found at {TOKEN_FILE}, creating new token.")
-            return generate_and_save_token()
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in {TOKEN_FILE}: {str(e)}")
-        return generate_and_save_token()
-    except Exception as e:
-        logger.error(f"Error loading API token from {TOKEN_FILE}: {str(e)}")
-        return generate_and_save_token()
-
-def generate_and_save_token():
-    """Tạo token mới và lưu vào file api_token.json."""
-    try:
-        new_token = str(uuid.uuid4())
-        token_data = {"token": new_token}
-        with open(TOKEN_FILE, 'w') as f:
-            json.dump(token_data, f, indent=4)
-        logger.info(f"New API token generated and saved to {TOKEN_FILE}")
-        return new_token
-    except Exception as e:
-        logger.error(f"Error generating/saving API token to {TOKEN_FILE}: {str(e)}")
-        raise
+def account_info_payload(account_info):
+    """Build the /account_info response from an AccountInfo namedtuple."""
+    return {
+        'login': account_info.login,
+        'trade_mode': account_info.trade_mode,
+        'leverage': account_info.leverage,
+        'balance': account_info.balance,
+        'equity': account_info.equity,
+        'margin': account_info.margin,
+        'margin_free': account_info.margin_free,
+        'margin_level': account_info.margin_level,
+        'profit': account_info.profit,
+        'currency': account_info.currency,
+        'server': account_info.server,
+        'name': account_info.name,
+        'company': account_info.company,
+        'age_ms': round(get_age_ms() or 0.0, 1)
+    }
 
 @login_bp.route('/login', methods=['POST'])
 @swag_from({
@@ -137,6 +129,8 @@ def login_endpoint():
         if not all([login, password, server]):
             return jsonify({"error": "Missing required fields: login, password, server"}), 400
 
+        reset_account_mode()
+        invalidate_account_state()
         if mt5.initialize(login=int(login), password=password, server=server):
             logger.info(f"Successfully logged in to MT5 account {login} on server {server}")
             return jsonify({"status": "success", "message": "Logged in initialize"}), 200
@@ -160,6 +154,15 @@ def login_endpoint():
 @swag_from({
     'tags': ['Login'],
     'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'max_age_ms',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': f'Oldest acceptable account sample in milliseconds. A fresher one is read from the terminal if needed. 0 always reads the terminal. Default: {DEFAULT_MAX_AGE_MS}.'
+        }
+    ],
     'responses': {
         200: {
             'description': 'Account information retrieved successfully',
@@ -178,10 +181,14 @@ def login_endpoint():
                     'currency': {'type': 'string', 'description': 'Account currency'},
                     'server': {'type': 'string', 'description': 'Trade server name'},
                     'name': {'type': 'string', 'description': 'Account holder name'},
-                    'company': {'type': 'string', 'description': 'Broker company name'}
+                    'company': {'type': 'string', 'description': 'Broker company name'},
+                    'age_ms': {'type': 'number', 'description': 'Age of the account sample in milliseconds'}
                 }
             }
         },
+        400: {
+            'description': 'Invalid max_age_ms'
+        },
         401: {
             'description': 'Unauthorized access',
             'schema': {
@@ -207,39 +214,106 @@ def account_info_endpoint():
     Retrieve all information about the current MetaTrader5 account
     """
     try:
-        if not mt5.initialize():
-            logger.error("Failed to initialize MetaTrader5")
-            return jsonify({"error": "Failed to initialize MetaTrader5"}), 500
+        max_age_ms = request.args.get('max_age_ms', DEFAULT_MAX_AGE_MS, type=float)
+        if max_age_ms < 0:
+            return jsonify({"error": "max_age_ms must not be negative"}), 400
 
-        account_info = mt5.account_info()
+        account_info = get_account_info(max_age_ms=max_age_ms)
         if account_info is None:
             error_code = mt5.last_error()[0]
             logger.error(f"Failed to retrieve account info: error code {error_code}")
             return jsonify({"error": f"Failed to retrieve account info: error code {error_code}"}), 500
 
-        account_info_dict = {
-            'login': account_info.login,
-            'trade_mode': account_info.trade_mode,
-            'leverage': account_info.leverage,
-            'balance': account_info.balance,
-            'equity': account_info.equity,
-            'margin': account_info.margin,
-            'margin_free': account_info.margin_free,
-            'margin_level': account_info.margin_level,
-            'profit': account_info.profit,
-            'currency': account_info.currency,
-            'server': account_info.server,
-            'name': account_info.name,
-            'company': account_info.company
-        }
+        account_info_dict = account_info_payload(account_info)
 
-        logger.info(f"Successfully retrieved account info for login {account_info.login}")
+        logger.debug(f"Successfully retrieved account info for login {account_info.login}")
         return jsonify(account_info_dict), 200
 
     except Exception as e:
         logger.error(f"Error in account_info: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@login_bp.route('/account/equity_history', methods=['GET'])
+@swag_from({
+    'tags': ['Login'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'from_date',
+            'in': 'query',
+            'type': 'string',
+            'required': True,
+            'format': 'date-time',
+            'description': 'Start date in ISO format.'
+        },
+        {
+            'name': 'to_date',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'format': 'date-time',
+            'description': 'End date in ISO format. Default: now.'
+        },
+        {
+            'name': 'resolution',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['1s', '1m', '1h'],
+            'required': False,
+            'description': f'Bucket size. Default: the finest one returning at most {MAX_POINTS} points.'
+        },
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Comma separated subset of balance, equity, equity_min, equity_max, margin, margin_free, profit.'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Equity history retrieved successfully. One array per field, aligned with time.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'resolution': {'type': 'string'},
+                    'time': {'type': 'array', 'items': {'type': 'integer'}, 'description': 'Bucket start, epoch seconds.'},
+                    'equity': {'type': 'array', 'items': {'type': 'number'}, 'description': 'Last equity of each bucket.'}
+                }
+            }
+        },
+        400: {
+            'description': 'Invalid parameters or range too long for the resolution.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def equity_history_endpoint():
+    """
+    Get Equity and Balance History
+    ---
+    description: Balance, equity, margin, free margin and profit recorded by the server-side sampler, rolled up into 1 second, 1 minute and 1 hour buckets. Each bucket holds the last sampled values plus the equity low and high within the bucket.
+    """
+    try:
+        from_date = request.args.get('from_date')
+        if not from_date:
+            return jsonify({"error": "from_date parameter is required"}), 400
+        to_date = request.args.get('to_date')
+
+        from_timestamp = int(datetime.fromisoformat(from_date.replace('Z', '+00:00')).timestamp())
+        to_timestamp = int(datetime.fromisoformat(to_date.replace('Z', '+00:00')).timestamp()) if to_date else int(time.time())
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+
+        return jsonify(query_equity_history(from_timestamp, to_timestamp, request.args.get('resolution'), fields))
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in equity_history: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @login_bp.route('/generate_token', methods=['POST'])
 @swag_from({
     'tags': ['Login'],
@@ -315,7 +389,7 @@ def get_token_endpoint():
     Retrieve the current API token
     """
     try:
-        token = load_api_token()
+        token = get_api_token()
         logger.info("API token retrieved successfully")
         return jsonify({
             "status": "success",
@@ -3,13 +3,21 @@ import MetaTrader5 as mt5
 import logging
 from flasgger import swag_from
 import time
-from datetime import datetime, timedelta
-import pytz
 
-from trailing_stop_worker import add_trailing_stop_job_to_worker
-from lib import ensure_symbol_in_marketwatch
+from trailing_stop_worker import add_trailing_stop_job_to_worker, confirm_trailing_stop_position
+from position_snapshot import resolve_position_ticket, is_hedging_account
+from idempotency import idempotent, record_outcome
+from order_queue import wants_async, job_payload, submit_job, get_job
+import rate_governor
+from rate_governor import OrderRateLimited
+import risk_guard
+from lib import ensure_symbol_in_marketwatch, close_position, send_market_order
+from symbol_cache import get_symbol_info
+from trade_validator import TradeValidationError, resolve_filling_mode, validate_market_order, forget_filling_mode
+from auth import set_blueprint_policy, HEADER_OR_TOKEN
 
 order_bp = Blueprint('order', __name__)
+set_blueprint_policy(order_bp, HEADER_OR_TOKEN)
 logger = logging.getLogger(__name__)
 
 @order_bp.route('/order', methods=['POST'])
@@ -17,6 +25,13 @@ logger = logging.getLogger(__name__)
     'tags': ['Order'],
     'security': [{'ApiKeyAuth': []}],
     'parameters': [
+        {
+            'name': 'Idempotency-Key',
+            'in': 'header',
+            'type': 'string',
+            'required': False,
+            'description': 'Optional idempotency key. Retries with the same key return the original response instead of executing again; orders refused by the terminal or the market (requotes, market closed) are sent again.'
+        },
         {
             'name': 'body',
             'in': 'body',
@@ -30,10 +45,15 @@ logger = logging.getLogger(__name__)
                     'deviation': {'type': 'integer', 'default': 20, 'description': 'Maximum allowed deviation from the requested price in points (default is 20).'},
                     'magic': {'type': 'integer', 'default': 0, 'description': 'Magic number for the order (default is 0).'},
                     'comment': {'type': 'string', 'default': '', 'description': 'Comment for the order (default is empty string).'},
-                    'type_filling': {'type': 'string', 'enum': ['ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', 'ORDER_FILLING_RETURN'], 'description': 'Order filling type (IOC, FOK, or RETURN).'},
+                    'type_filling': {'type': 'string', 'enum': ['ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', 'ORDER_FILLING_RETURN'], 'description': 'Order filling type (IOC, FOK, or RETURN). Auto-detected from the symbol when omitted.'},
                     'sl': {'type': 'number', 'description': 'Optional Stop Loss price.'},
                     'tp': {'type': 'number', 'description': 'Optional Take Profit price.'},
                     'ts': {'type': 'number', 'description': 'Optional Trailing Stop distance in points. If provided, trailing stop is enabled for the new position.'},
+                    'client_order_id': {'type': 'string', 'description': 'Optional idempotency key, used when the Idempotency-Key header is not set.'},
+                    'retry_ms': {'type': 'integer', 'description': 'Time budget in milliseconds for re-pricing and resubmitting after a requote or price change (default 500, 0 disables).'},
+                    'max_slippage': {'type': 'integer', 'description': 'Maximum price move in points accepted when re-pricing (default: deviation).'},
+                    'async': {'type': 'boolean', 'default': False, 'description': 'Validate, queue and answer 202 immediately with a job ID instead of waiting for the broker.'},
+                    'callback_url': {'type': 'string', 'description': 'Optional URL the finished job is POSTed to (async mode only).'},
                     'token': {'type': 'string', 'description': 'API token for authentication if Authorization header is not provided.'}
                 },
                 'required': ['symbol', 'volume', 'type']
@@ -61,18 +81,55 @@ logger = logging.getLogger(__name__)
                         }
                     },
                     'position_ticket': {'type': 'integer', 'description': 'Ticket of the newly created position, if any.'},
+                    'attempts': {
+                        'type': 'array',
+                        'description': 'Price, retcode and latency of each submission attempt.',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'attempt': {'type': 'integer'},
+                                'price': {'type': 'number'},
+                                'retcode': {'type': 'integer'},
+                                'latency_ms': {'type': 'number'}
+                            }
+                        }
+                    },
                     'trailing_stop_status': {'type': 'string', 'description': 'Status of trailing stop activation (e.g., "activated", "not requested", "failed").'}
                 }
             }
         },
+        202: {
+            'description': 'Accepted for asynchronous execution (async mode).',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'message': {'type': 'string'},
+                    'job_id': {'type': 'string'},
+                    'status_url': {'type': 'string'}
+                }
+            }
+        },
         400: {
             'description': 'Bad request or order failed.'
         },
+        403: {
+            'description': 'Trading halted by the risk guard.'
+        },
+        429: {
+            'description': 'Order rate budget exhausted, retry shortly.'
+        },
+        409: {
+            'description': 'A request with the same idempotency key is still in progress.'
+        },
+        422: {
+            'description': 'The idempotency key was already used with a different request body.'
+        },
         500: {
             'description': 'Internal server error.'
         }
     }
 })
+@idempotent
 def post_order():
     """
     Place a Market Order
@@ -80,12 +137,16 @@ def post_order():
     description: Place a market buy or sell order for a given symbol and volume. Authenticate using Authorization header or token in request body.
     """
     try:
+        if risk_guard.is_tripped():
+            return jsonify({"error": "Trading halted by risk guard", "reason": risk_guard.get_status()['reason']}), 403
+
         data = request.get_json()
         if not data or 'symbol' not in data or 'volume' not in data or 'type' not in data:
             return jsonify({"error": "symbol, volume, and type are required"}), 400
 
         symbol = str(data['symbol'])
         if not ensure_symbol_in_marketwatch(symbol):
+            record_outcome(False)
             return jsonify({"error": f"Failed to add symbol {symbol} to MarketWatch"}), 400        
         
         volume = float(data['volume'])
@@ -93,8 +154,10 @@ def post_order():
         deviation = int(data.get('deviation', 20))
         magic = int(data.get('magic', 0))
         comment = str(data.get('comment', ''))
-        type_filling_str = data.get('type_filling', 'ORDER_FILLING_IOC').upper()
+        type_filling_str = data.get('type_filling')
         ts_distance = data.get('ts')
+        retry_ms = int(data['retry_ms']) if data.get('retry_ms') is not None else None
+        max_slippage = int(data['max_slippage']) if data.get('max_slippage') is not None else None
 
         order_type_map = {
             'BUY': mt5.ORDER_TYPE_BUY,
@@ -104,25 +167,34 @@ def post_order():
         if order_type is None:
             return jsonify({"error": f"Invalid order type: {order_type_str}. Must be 'BUY' or 'SELL'."}), 400
 
-        type_filling_map = {
-            'ORDER_FILLING_IOC': mt5.ORDER_FILLING_IOC,
-            'ORDER_FILLING_FOK': mt5.ORDER_FILLING_FOK,
-            'ORDER_FILLING_RETURN': mt5.ORDER_FILLING_RETURN
-        }
-        type_filling = type_filling_map.get(type_filling_str)
-        if type_filling is None:
-             return jsonify({"error": f"Invalid filling type: {type_filling_str}. Must be 'ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', or 'ORDER_FILLING_RETURN'."}), 400
-
+        # Market data may be missing for a moment; a retry should try again
         tick = mt5.symbol_info_tick(symbol)
         if tick is None:
             logger.error(f"Failed to get tick for symbol: {symbol}")
+            record_outcome(False)
             return jsonify({"error": f"Failed to get tick for symbol: {symbol}"}), 400
 
         price = tick.ask if order_type == mt5.ORDER_TYPE_BUY else tick.bid
         if price == 0.0:
              logger.error(f"Invalid price retrieved for symbol: {symbol}")
+             record_outcome(False)
              return jsonify({"error": f"Invalid price retrieved for symbol: {symbol}"}), 400
 
+        sl = float(data['sl']) if data.get('sl') is not None else None
+        tp = float(data['tp']) if data.get('tp') is not None else None
+
+        # Reject requests the server would refuse without spending a round trip on them
+        symbol_info = get_symbol_info(symbol)
+        if symbol_info is None:
+            record_outcome(False)
+            return jsonify({"error": f"Failed to get symbol info for: {symbol}"}), 400
+        try:
+            type_filling = resolve_filling_mode(symbol, type_filling_str)
+            validate_market_order(symbol_info, order_type, volume, tick, sl, tp)
+        except TradeValidationError as e:
+            logger.warning(f"Order rejected locally: {str(e)}")
+            return jsonify({"error": str(e)}), 400
+
         request_data = {
             "action": mt5.TRADE_ACTION_DEAL,
             "symbol": symbol,
@@ -136,28 +208,46 @@ def post_order():
             "type_filling": type_filling,
         }
 
-        if 'sl' in data and data['sl'] is not None:
-            request_data["sl"] = float(data['sl'])
-        if 'tp' in data and data['tp'] is not None:
-            request_data["tp"] = float(data['tp'])
+        if sl is not None:
+            request_data["sl"] = sl
+        if tp is not None:
+            request_data["tp"] = tp
+
+        if wants_async(data):
+            job = submit_job('order', job_payload(data), data.get('callback_url'))
+            return jsonify({
+                "message": "Order accepted",
+                "job_id": job['id'],
+                "status_url": f"/orders/jobs/{job['id']}"
+            }), 202
 
         logger.info(f"Sending order request: {request_data}")
 
-        result = mt5.order_send(request_data)
+        try:
+            result, attempts = send_market_order(request_data, rate_governor.CLASS_ENTRY, retry_ms, max_slippage)
+        except OrderRateLimited as e:
+            return jsonify({"error": str(e)}), 429
         logger.debug(f"Order result: {result}")
 
         if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
             error_code, error_str = mt5.last_error()
             error_message = result.comment if result else "MT5 order_send returned None"
             logger.error(f"Order failed: {error_message}. MT5 Error: {error_str}")
+            if result is not None and result.retcode == mt5.TRADE_RETCODE_INVALID_FILL:
+                forget_filling_mode(symbol)
+            # Requotes, off quotes or a closed market: a retry should trade again
+            record_outcome(False)
 
             return jsonify({
                 "error": f"Order failed: {error_message}",
                 "mt5_error": error_str,
-                "result": result._asdict() if result else None
+                "result": result._asdict() if result else None,
+                "attempts": attempts
             }), 400
 
         logger.info(f"Order executed successfully. Result: {result._asdict()}")
+        # The order is filled: a retry must get this response back, never a second fill
+        record_outcome()
 
         trailing_stop_status = "not requested"
         position_ticket = None
@@ -165,38 +255,19 @@ def post_order():
         if ts_distance is not None:
             deal_ticket = result.deal
             if deal_ticket != 0:
-                logger.info(f"Order resulted in deal ticket: {deal_ticket}. Attempting to find associated position.")
-                utc_now = datetime.now(pytz.UTC)
-                from_date = utc_now - timedelta(seconds=5)
-                to_date = utc_now + timedelta(seconds=1)
-
-                deals = mt5.history_deals_get(ticket=deal_ticket)
-                found_position_ticket = None
-                if deals:
-                    for deal in deals:
-                        if deal.ticket == deal_ticket and deal.position_id != 0 and deal.order == result.order:
-                            found_position_ticket = deal.position_id
-                            logger.info(f"Found position ticket {found_position_ticket} for deal {deal_ticket} and order {result.order}.")
-                            break
-
-                if found_position_ticket:
-                    position_ticket = found_position_ticket
-                    positions = mt5.positions_get(ticket=position_ticket)
-                    if positions and len(positions) > 0:
-                        new_position = positions[0]
-                        added_to_worker = add_trailing_stop_job_to_worker(position_ticket, float(ts_distance))
-                        if added_to_worker:
-                            trailing_stop_status = "activated"
-                            logger.info(f"Trailing stop job added to worker for position {position_ticket}.")
-                        else:
-                            trailing_stop_status = "failed to activate (worker add failed)"
-                            logger.error(f"Failed to add trailing stop job to worker for position {position_ticket}.")
-                    else:
-                        trailing_stop_status = "failed to activate (position details not found)"
-                        logger.error(f"Deal {deal_ticket} associated with position {position_ticket}, but position details could not be retrieved.")
-                else:
-                    trailing_stop_status = "failed to activate (position not linked to deal or order mismatch)"
-                    logger.error(f"Deal {deal_ticket} found, but no associated position_id or order mismatch with {result.order}.")
+                try:
+                    # Resolve the position from the order result and the shared snapshot; the
+                    # deal history is only consulted in the background when that is a guess
+                    position_ticket, confirmed = resolve_position_ticket(result, symbol)
+                    add_trailing_stop_job_to_worker(position_ticket, float(ts_distance), verify=False)
+                    trailing_stop_status = "activated"
+                    logger.info(f"Trailing stop job added to worker for position {position_ticket} (deal {deal_ticket}).")
+                    if not confirmed:
+                        confirm_trailing_stop_position(deal_ticket, position_ticket, float(ts_distance))
+                except Exception as e:
+                    # The fill stands; report the trailing stop instead of failing the order
+                    logger.error(f"Order {result.order} filled but the trailing stop was not set up: {str(e)}")
+                    trailing_stop_status = f"failed: {str(e)}"
             else:
                 trailing_stop_status = "not activated (no deal created)"
                 logger.warning(f"Order executed successfully but did not result in a deal (ticket {result.order}). Trailing stop not activated.")
@@ -204,6 +275,7 @@ def post_order():
         response_data = {
             "message": "Order executed successfully",
             "result": result._asdict(),
+            "attempts": attempts,
             "trailing_stop_status": trailing_stop_status
         }
         if position_ticket is not None:
@@ -213,4 +285,397 @@ def post_order():
 
     except Exception as e:
         logger.error(f"Error in post_order: {str(e)}")
-        return jsonify({"error": "Internal server error"}), 500
\ No newline at end of file
+        return jsonify({"error": "Internal server error"}), 500
+
+ORDER_TYPE_MAP = {
+    'BUY': mt5.ORDER_TYPE_BUY,
+    'SELL': mt5.ORDER_TYPE_SELL
+}
+
+def _parse_order_leg(leg, default_type_filling):
+    """Validate one leg of a batch request and normalize it. Raises ValueError on bad input."""
+    if not isinstance(leg, dict) or 'symbol' not in leg or 'volume' not in leg or 'type' not in leg:
+        raise ValueError("symbol, volume, and type are required")
+
+    order_type_str = str(leg['type']).upper()
+    if order_type_str not in ORDER_TYPE_MAP:
+        raise ValueError(f"Invalid order type: {order_type_str}. Must be 'BUY' or 'SELL'.")
+
+    volume = float(leg['volume'])
+    if volume <= 0:
+        raise ValueError(f"Invalid volume: {volume}")
+
+    return {
+        "symbol": str(leg['symbol']),
+        "volume": volume,
+        "type": ORDER_TYPE_MAP[order_type_str],
+        "deviation": int(leg.get('deviation', 20)),
+        "magic": int(leg.get('magic', 0)),
+        "comment": str(leg.get('comment', '')),
+        "type_filling": resolve_filling_mode(str(leg['symbol']), leg.get('type_filling', default_type_filling)),
+        "sl": float(leg['sl']) if leg.get('sl') is not None else None,
+        "tp": float(leg['tp']) if leg.get('tp') is not None else None,
+    }
+
+def _rollback_leg(leg, result):
+    """
+    Close the position opened by a filled leg.
+
+    Returns:
+        (status, close_result) - status is 'rolled_back', 'already_closed' or 'rollback_failed'.
+    """
+    # On hedging accounts the position ticket equals the ticket of the opening order
+    positions = mt5.positions_get(ticket=result.order)
+    if positions:
+        close_result = close_position(positions[0]._asdict(), deviation=leg['deviation'], magic=leg['magic'], type_filling=leg['type_filling'])
+        return ('rolled_back', close_result) if close_result is not None else ('rollback_failed', None)
+
+    hedging = is_hedging_account()
+    if hedging is None:
+        # An opposite deal on a hedging account would open a second position
+        logger.error(f"Unknown account margin mode, not rolling back order {result.order}.")
+        return 'rollback_failed', None
+    if hedging:
+        if positions is None:
+            logger.error(f"Failed to read position {result.order} while rolling back.")
+            return 'rollback_failed', None
+        # The position was closed in the meantime (SL hit, manual close); an opposite
+        # deal would open a new position instead of offsetting it
+        logger.warning(f"Position {result.order} is already closed, nothing to roll back.")
+        return 'already_closed', None
+
+    # Netting accounts: offset the filled volume with an opposite deal
+    tick = mt5.symbol_info_tick(leg['symbol'])
+    if tick is None:
+        logger.error(f"Failed to get tick for symbol {leg['symbol']} while rolling back order {result.order}.")
+        return 'rollback_failed', None
+    opposite_type = mt5.ORDER_TYPE_SELL if leg['type'] == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
+    try:
+        rollback_result = rate_governor.order_send({
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": leg['symbol'],
+            "volume": result.volume,
+            "type": opposite_type,
+            "price": tick.ask if opposite_type == mt5.ORDER_TYPE_BUY else tick.bid,
+            "deviation": leg['deviation'],
+            "magic": leg['magic'],
+            "comment": leg['comment'],
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": leg['type_filling'],
+        }, rate_governor.CLASS_CLOSE)
+    except OrderRateLimited as e:
+        logger.error(f"Failed to roll back order {result.order}: {str(e)}")
+        return 'rollback_failed', None
+    if rollback_result is None or rollback_result.retcode != mt5.TRADE_RETCODE_DONE:
+        logger.error(f"Failed to roll back order {result.order}: {rollback_result.comment if rollback_result else 'MT5 order_send returned None'}")
+        return 'rollback_failed', None
+    return 'rolled_back', rollback_result
+
+@order_bp.route('/orders/batch', methods=['POST'])
+@swag_from({
+    'tags': ['Order'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'orders': {
+                        'type': 'array',
+                        'description': 'Market orders to place, in dispatch order. Each leg accepts the same fields as /order (except ts).',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'symbol': {'type': 'string'},
+                                'volume': {'type': 'number'},
+                                'type': {'type': 'string', 'enum': ['BUY', 'SELL']},
+                                'deviation': {'type': 'integer', 'default': 20},
+                                'magic': {'type': 'integer', 'default': 0},
+                                'comment': {'type': 'string', 'default': ''},
+                                'type_filling': {'type': 'string', 'enum': ['ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', 'ORDER_FILLING_RETURN']},
+                                'sl': {'type': 'number'},
+                                'tp': {'type': 'number'}
+                            },
+                            'required': ['symbol', 'volume', 'type']
+                        }
+                    },
+                    'type_filling': {'type': 'string', 'enum': ['ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', 'ORDER_FILLING_RETURN'], 'description': 'Default filling type for legs that do not set one. Auto-detected from the symbol when omitted.'},
+                    'all_or_nothing': {'type': 'boolean', 'default': False, 'description': 'If a leg fails, skip the remaining legs and close the legs that were already filled.'},
+                    'token': {'type': 'string', 'description': 'API token for authentication if Authorization header is not provided.'}
+                },
+                'required': ['orders']
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'All legs executed successfully.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'message': {'type': 'string'},
+                    'filled': {'type': 'integer'},
+                    'failed': {'type': 'integer'},
+                    'rolled_back': {'type': 'boolean'},
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'index': {'type': 'integer'},
+                                'status': {'type': 'string', 'enum': ['filled', 'failed', 'skipped', 'rolled_back', 'already_closed', 'rollback_failed']},
+                                'error': {'type': 'string'},
+                                'result': {'type': 'object'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        207: {
+            'description': 'Some legs failed; see per-leg results.'
+        },
+        400: {
+            'description': 'Bad request.'
+        },
+        403: {
+            'description': 'Trading halted by the risk guard.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def post_orders_batch():
+    """
+    Place a Batch of Market Orders
+    ---
+    description: Place several market orders in one request. Legs are grouped by symbol so MarketWatch checks, ticks and symbol specs are fetched once per symbol, then dispatched back-to-back. With all_or_nothing, filled legs are closed if a later leg fails. Authenticate using Authorization header or token in request body.
+    """
+    try:
+        if risk_guard.is_tripped():
+            return jsonify({"error": "Trading halted by risk guard", "reason": risk_guard.get_status()['reason']}), 403
+
+        data = request.get_json()
+        if not data or not isinstance(data.get('orders'), list) or not data['orders']:
+            return jsonify({"error": "orders must be a non-empty list"}), 400
+
+        all_or_nothing = bool(data.get('all_or_nothing', False))
+        default_type_filling = data.get('type_filling')
+
+        # Market data is fetched once per symbol, not once per leg
+        market_data = {}
+        for symbol in dict.fromkeys(str(leg['symbol']) for leg in data['orders'] if isinstance(leg, dict) and 'symbol' in leg):
+            if not ensure_symbol_in_marketwatch(symbol):
+                return jsonify({"error": f"Failed to add symbol {symbol} to MarketWatch"}), 400
+            tick = mt5.symbol_info_tick(symbol)
+            symbol_info = get_symbol_info(symbol)
+            if tick is None or symbol_info is None:
+                logger.error(f"Failed to get market data for symbol: {symbol}")
+                return jsonify({"error": f"Failed to get tick for symbol: {symbol}"}), 400
+            market_data[symbol] = (tick, symbol_info)
+
+        # Every leg is validated locally before the first one is sent
+        legs = []
+        for index, leg in enumerate(data['orders']):
+            try:
+                parsed = _parse_order_leg(leg, default_type_filling)
+                tick, symbol_info = market_data[parsed['symbol']]
+                validate_market_order(symbol_info, parsed['type'], parsed['volume'], tick, parsed['sl'], parsed['tp'])
+                legs.append(parsed)
+            except (ValueError, TypeError) as e:
+                return jsonify({"error": f"Invalid order at index {index}: {str(e)}"}), 400
+
+        results = []
+        filled = []
+        aborted = False
+        for index, leg in enumerate(legs):
+            if aborted:
+                results.append({"index": index, "status": "skipped"})
+                continue
+
+            tick, symbol_info = market_data[leg['symbol']]
+            price = tick.ask if leg['type'] == mt5.ORDER_TYPE_BUY else tick.bid
+            if price == 0.0:
+                results.append({"index": index, "status": "failed", "error": f"Invalid price retrieved for symbol: {leg['symbol']}"})
+                aborted = all_or_nothing
+                continue
+
+            request_data = {
+                "action": mt5.TRADE_ACTION_DEAL,
+                "symbol": leg['symbol'],
+                "volume": leg['volume'],
+                "type": leg['type'],
+                "price": price,
+                "deviation": leg['deviation'],
+                "magic": leg['magic'],
+                "comment": leg['comment'],
+                "type_time": mt5.ORDER_TIME_GTC,
+                "type_filling": leg['type_filling'],
+            }
+            if leg['sl'] is not None:
+                request_data["sl"] = leg['sl']
+            if leg['tp'] is not None:
+                request_data["tp"] = leg['tp']
+
+            try:
+                result, attempts = send_market_order(request_data, rate_governor.CLASS_ENTRY)
+            except OrderRateLimited as e:
+                results.append({"index": index, "status": "failed", "error": str(e)})
+                aborted = all_or_nothing
+                continue
+            if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+                error_code, error_str = mt5.last_error()
+                error_message = result.comment if result else "MT5 order_send returned None"
+                logger.error(f"Batch leg {index} failed: {error_message}. MT5 Error: {error_str}")
+                results.append({
+                    "index": index,
+                    "status": "failed",
+                    "error": f"Order failed: {error_message}",
+                    "mt5_error": error_str,
+                    "result": result._asdict() if result else None,
+                    "attempts": attempts
+                })
+                aborted = all_or_nothing
+                continue
+
+            results.append({"index": index, "status": "filled", "result": result._asdict(), "attempts": attempts})
+            filled.append((index, leg, result))
+
+        rolled_back = False
+        if aborted and filled:
+            logger.warning(f"Batch aborted, rolling back {len(filled)} filled legs.")
+            rolled_back = True
+            for index, leg, result in filled:
+                status, rollback_result = _rollback_leg(leg, result)
+                results[index]["status"] = status
+                if rollback_result is not None:
+                    results[index]["rollback_result"] = rollback_result._asdict()
+
+        failed = sum(1 for entry in results if entry['status'] != 'filled')
+        response_data = {
+            "message": f"Filled {len(results) - failed} of {len(results)} orders",
+            "filled": len(results) - failed,
+            "failed": failed,
+            "rolled_back": rolled_back,
+            "results": results
+        }
+        return jsonify(response_data), 200 if failed == 0 else 207
+
+    except Exception as e:
+        logger.error(f"Error in post_orders_batch: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@order_bp.route('/orders/jobs/<job_id>', methods=['GET'])
+@swag_from({
+    'tags': ['Order'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'job_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'Job ID returned by an asynchronous submission.'
+        },
+        {
+            'name': 'token',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'API token for authentication if Authorization header is not provided.'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Job status retrieved successfully.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'id': {'type': 'string'},
+                    'kind': {'type': 'string'},
+                    'status': {'type': 'string', 'enum': ['queued', 'running', 'done', 'failed']},
+                    'created': {'type': 'number'},
+                    'expires': {'type': 'number', 'description': 'Time after which a job still queued fails without being sent.'},
+                    'started': {'type': 'number'},
+                    'finished': {'type': 'number'},
+                    'http_status': {'type': 'integer', 'description': 'Status code the synchronous endpoint returned.'},
+                    'result': {'type': 'object', 'description': 'Response body the synchronous endpoint returned.'},
+                    'error': {'type': 'string', 'description': 'Why a job failed without running, e.g. it expired in the queue.'}
+                }
+            }
+        },
+        404: {
+            'description': 'Job not found.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def get_order_job_endpoint(job_id):
+    """
+    Get Asynchronous Order Job Status
+    ---
+    description: Poll the status and result of an order or close job submitted in async mode. Authenticate using Authorization header or token in query parameter.
+    """
+    try:
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Job {job_id} not found"}), 404
+        job.pop('payload', None)
+        job.pop('callback_url', None)
+        return jsonify(job)
+
+    except Exception as e:
+        logger.error(f"Error in get_order_job: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@order_bp.route('/orders/rate_governor', methods=['GET'])
+@swag_from({
+    'tags': ['Order'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'token',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'API token for authentication if Authorization header is not provided.'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Rate governor statistics retrieved successfully.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'rate_per_second': {'type': 'number'},
+                    'burst': {'type': 'number'},
+                    'available_tokens': {'type': 'number'},
+                    'reserved_tokens': {'type': 'object'},
+                    'broker_throttled': {'type': 'integer', 'description': 'Number of TRADE_RETCODE_TOO_MANY_REQUESTS answers received.'},
+                    'classes': {'type': 'object', 'description': 'Granted, throttled (had to wait) and deferred (gave up) counts per request class.'}
+                }
+            }
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def get_rate_governor_stats_endpoint():
+    """
+    Get Order Rate Governor Statistics
+    ---
+    description: Retrieve the shared order_send budget and per-class counters of granted, throttled and deferred calls. Authenticate using Authorization header or token in query parameter.
+    """
+    try:
+        return jsonify(rate_governor.get_stats())
+
+    except Exception as e:
+        logger.error(f"Error in get_rate_governor_stats: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
@@ -1,13 +1,21 @@
 from flask import Blueprint, jsonify, request
 import MetaTrader5 as mt5
 import logging
-from lib import close_position, close_all_positions, get_positions, apply_trailing_stop, ensure_symbol_in_marketwatch
+from lib import close_position, close_all_positions, get_positions, apply_trailing_stop, ensure_symbol_in_marketwatch, modify_sl_tp_bulk
 from flasgger import swag_from
 import pandas as pd
+from trade_validator import TradeValidationError, TYPE_FILLING_MAP, resolve_filling_mode
+from idempotency import idempotent, record_outcome
+from order_queue import wants_async, job_payload, submit_job
+import rate_governor
+from rate_governor import OrderRateLimited
+from exposure import compute_exposure
 
 from trailing_stop_worker import add_trailing_stop_job_to_worker, remove_trailing_stop_job_from_worker, get_active_worker_jobs_list, active_trailing_stop_jobs
+from auth import set_blueprint_policy, HEADER_OR_TOKEN
 
 position_bp = Blueprint('position', __name__)
+set_blueprint_policy(position_bp, HEADER_OR_TOKEN)
 logger = logging.getLogger(__name__)
 
 @position_bp.route('/close_position', methods=['POST'])
@@ -15,6 +23,13 @@ logger = logging.getLogger(__name__)
     'tags': ['Position'],
     'security': [{'ApiKeyAuth': []}],
     'parameters': [
+        {
+            'name': 'Idempotency-Key',
+            'in': 'header',
+            'type': 'string',
+            'required': False,
+            'description': 'Optional idempotency key. Retries with the same key return the original response instead of executing again.'
+        },
         {
             'name': 'body',
             'in': 'body',
@@ -23,7 +38,10 @@ logger = logging.getLogger(__name__)
                 'type': 'object',
                 'properties': {
                     'ticket': {'type': 'integer', 'description': 'Ticket number of the position to close.'},
-                    'type_filling': {'type': 'string', 'enum': ['ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', 'ORDER_FILLING_RETURN'], 'description': 'Order filling type (IOC, FOK, or RETURN).'},
+                    'retry_ms': {'type': 'integer', 'description': 'Time budget in milliseconds for re-pricing and resubmitting after a requote or price change (default 500, 0 disables).'},
+                    'max_slippage': {'type': 'integer', 'description': 'Maximum price move in points accepted when re-pricing (default: deviation).'},
+                    'client_order_id': {'type': 'string', 'description': 'Optional idempotency key, used when the Idempotency-Key header is not set.'},
+                    'type_filling': {'type': 'string', 'enum': ['ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', 'ORDER_FILLING_RETURN'], 'description': 'Order filling type (IOC, FOK, or RETURN). Auto-detected from the symbol when omitted.'},
                     'token': {'type': 'string', 'description': 'API token for authentication if Authorization header is not provided.'}
                 },
                 'required': ['ticket']
@@ -53,11 +71,18 @@ logger = logging.getLogger(__name__)
         400: {
             'description': 'Bad request or failed to close position.'
         },
+        409: {
+            'description': 'A request with the same idempotency key is still in progress.'
+        },
+        422: {
+            'description': 'The idempotency key was already used with a different request body.'
+        },
         500: {
             'description': 'Internal server error.'
         }
     }
 })
+@idempotent
 def close_position_endpoint():
     """
     Close a Specific Position
@@ -73,29 +98,40 @@ def close_position_endpoint():
 
         positions = mt5.positions_get(ticket=position_ticket)
         if positions is None or len(positions) == 0:
+            if positions is None:
+                # The terminal did not answer, so the position may well exist
+                record_outcome(False)
             logger.error(f"Position with ticket {position_ticket} not found.")
             return jsonify({"error": f"Position with ticket {position_ticket} not found."}), 404
 
         position_to_close = positions[0]._asdict()
-        
-        type_filling_str = data.get('type_filling', 'ORDER_FILLING_IOC').upper()
-        type_filling_map = {
-            'ORDER_FILLING_IOC': mt5.ORDER_FILLING_IOC,
-            'ORDER_FILLING_FOK': mt5.ORDER_FILLING_FOK,
-            'ORDER_FILLING_RETURN': mt5.ORDER_FILLING_RETURN
-        }
-        type_filling = type_filling_map.get(type_filling_str)
-        if type_filling is None:
-             return jsonify({"error": f"Invalid filling type: {type_filling_str}. Must be 'ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', or 'ORDER_FILLING_RETURN'."}), 400
-        
-        result = close_position(position_to_close, type_filling=type_filling)
+
+        try:
+            type_filling = resolve_filling_mode(position_to_close['symbol'], data.get('type_filling'))
+        except TradeValidationError as e:
+            return jsonify({"error": str(e)}), 400
+
+        attempts = []
+        result = close_position(
+            position_to_close,
+            type_filling=type_filling,
+            retry_ms=int(data['retry_ms']) if data.get('retry_ms') is not None else None,
+            max_slippage=int(data['max_slippage']) if data.get('max_slippage') is not None else None,
+            attempts=attempts
+        )
         if result is None:
-            return jsonify({"error": "Failed to close position"}), 400
+            # Rejected by the terminal or the market; a retry should try to close again
+            record_outcome(False)
+            return jsonify({"error": "Failed to close position", "attempts": attempts}), 400
+        record_outcome()
 
         if position_ticket:
-             remove_trailing_stop_job_from_worker(position_ticket)
+            try:
+                remove_trailing_stop_job_from_worker(position_ticket)
+            except Exception as e:
+                logger.error(f"Position {position_ticket} closed but its trailing stop job was not removed: {str(e)}")
 
-        return jsonify({"message": "Position closed successfully", "result": result._asdict()})
+        return jsonify({"message": "Position closed successfully", "result": result._asdict(), "attempts": attempts})
 
     except Exception as e:
         logger.error(f"Error in close_position: {str(e)}")
@@ -106,6 +142,13 @@ def close_position_endpoint():
     'tags': ['Position'],
     'security': [{'ApiKeyAuth': []}],
     'parameters': [
+        {
+            'name': 'Idempotency-Key',
+            'in': 'header',
+            'type': 'string',
+            'required': False,
+            'description': 'Optional idempotency key. Retries with the same key return the original response instead of executing again.'
+        },
         {
             'name': 'body',
             'in': 'body',
@@ -114,10 +157,13 @@ def close_position_endpoint():
                 'type': 'object',
                 'properties': {
                     'order_type': {'type': 'string', 'enum': ['BUY', 'SELL', 'all'], 'default': 'all'},
+                    'client_order_id': {'type': 'string', 'description': 'Optional idempotency key, used when the Idempotency-Key header is not set.'},
                     'symbol': {'type': 'string'},
                     'comment': {'type': 'string'},
-                    'type_filling': {'type': 'string', 'enum': ['ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', 'ORDER_FILLING_RETURN'], 'description': 'Order filling type (IOC, FOK, or RETURN).'},
+                    'type_filling': {'type': 'string', 'enum': ['ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', 'ORDER_FILLING_RETURN'], 'description': 'Order filling type (IOC, FOK, or RETURN). Auto-detected from the symbol when omitted.'},
                     'magic': {'type': 'integer'},
+                    'async': {'type': 'boolean', 'default': False, 'description': 'Validate, queue and answer 202 immediately with a job ID instead of waiting for the broker.'},
+                    'callback_url': {'type': 'string', 'description': 'Optional URL the finished job is POSTed to (async mode only).'},
                     'token': {'type': 'string', 'description': 'API token for authentication if Authorization header is not provided.'}
                 }
             }
@@ -146,14 +192,32 @@ def close_position_endpoint():
                 }
             }
         },
+        202: {
+            'description': 'Accepted for asynchronous execution (async mode).',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'message': {'type': 'string'},
+                    'job_id': {'type': 'string'},
+                    'status_url': {'type': 'string'}
+                }
+            }
+        },
         400: {
             'description': 'Bad request or no positions were closed.'
         },
+        409: {
+            'description': 'A request with the same idempotency key is still in progress.'
+        },
+        422: {
+            'description': 'The idempotency key was already used with a different request body.'
+        },
         500: {
             'description': 'Internal server error.'
         }
     }
 })
+@idempotent
 def close_all_positions_endpoint():
     """
     Close All Positions
@@ -166,30 +230,47 @@ def close_all_positions_endpoint():
         magic = data.get('magic')
         comment = data.get('comment', '')
         symbol = data.get('symbol', '')
-        type_filling_str = data.get('type_filling', 'ORDER_FILLING_IOC').upper()
-        
+        type_filling_str = data.get('type_filling')
+
         if symbol and not ensure_symbol_in_marketwatch(symbol):
+            record_outcome(False)
             return jsonify({"error": f"Failed to add symbol {symbol} to MarketWatch"}), 400        
-        
-        type_filling_map = {
-            'ORDER_FILLING_IOC': mt5.ORDER_FILLING_IOC,
-            'ORDER_FILLING_FOK': mt5.ORDER_FILLING_FOK,
-            'ORDER_FILLING_RETURN': mt5.ORDER_FILLING_RETURN
-        }
-        type_filling = type_filling_map.get(type_filling_str)
-        if type_filling is None:
-             return jsonify({"error": f"Invalid filling type: {type_filling_str}. Must be 'ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', or 'ORDER_FILLING_RETURN'."}), 400
-        
+
+        # An explicit filling type is checked against the symbol when one is given;
+        # otherwise every position is closed with the mode detected for its own symbol
+        type_filling = None
+        if type_filling_str:
+            if type_filling_str.upper() not in TYPE_FILLING_MAP:
+                return jsonify({"error": f"Invalid filling type: {type_filling_str}. Must be 'ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', or 'ORDER_FILLING_RETURN'."}), 400
+            type_filling = TYPE_FILLING_MAP[type_filling_str.upper()]
+            if symbol:
+                try:
+                    resolve_filling_mode(symbol, type_filling_str)
+                except TradeValidationError as e:
+                    return jsonify({"error": str(e)}), 400
+
+        if wants_async(data):
+            job = submit_job('close_all_positions', job_payload(data), data.get('callback_url'))
+            return jsonify({
+                "message": "Close request accepted",
+                "job_id": job['id'],
+                "status_url": f"/orders/jobs/{job['id']}"
+            }), 202
+
         positions_to_close_df = get_positions(symbol, comment, magic)
         positions_to_close_tickets = positions_to_close_df['ticket'].tolist() if not positions_to_close_df.empty else []
 
         results = close_all_positions(order_type, symbol, comment, magic, type_filling)
         if not results:
             return jsonify({"message": "No positions were closed"}), 200
+        record_outcome()
 
         closed_tickets = [res._asdict().get('position') for res in results if res and res.retcode == mt5.TRADE_RETCODE_DONE]
         for ticket in closed_tickets:
-            remove_trailing_stop_job_from_worker(ticket)
+            try:
+                remove_trailing_stop_job_from_worker(ticket)
+            except Exception as e:
+                logger.error(f"Position {ticket} closed but its trailing stop job was not removed: {str(e)}")
 
         return jsonify({
             "message": f"Closed {len(results)} positions",
@@ -245,6 +326,9 @@ def close_all_positions_endpoint():
         400: {
             'description': 'Bad request or failed to modify SL/TP.'
         },
+        429: {
+            'description': 'Order rate budget exhausted, retry shortly.'
+        },
         500: {
             'description': 'Internal server error.'
         }
@@ -276,7 +360,10 @@ def modify_sl_tp_endpoint():
 
         logger.info(f"Attempting to modify SL/TP for position {position_ticket}: Symbol={symbol}, SL={sl}, TP={tp}")
 
-        result = mt5.order_send(request_data)
+        try:
+            result = rate_governor.order_send(request_data, rate_governor.CLASS_MODIFY)
+        except OrderRateLimited as e:
+            return jsonify({"error": str(e)}), 429
         if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
             error_code, error_str = mt5.last_error()
             error_message = result.comment if result else "MT5 order_send returned None"
@@ -290,6 +377,109 @@ def modify_sl_tp_endpoint():
         logger.error(f"Error in modify_sl_tp: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@position_bp.route('/modify_sl_tp_bulk', methods=['POST'])
+@swag_from({
+    'tags': ['Position'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'tickets': {'type': 'array', 'items': {'type': 'integer'}, 'description': 'Optional non-empty list of position tickets to modify.'},
+                    'symbol': {'type': 'string', 'description': 'Only modify positions on this symbol.'},
+                    'magic': {'type': 'integer', 'description': 'Only modify positions with this magic number.'},
+                    'comment': {'type': 'string', 'description': 'Only modify positions with this comment.'},
+                    'order_type': {'type': 'string', 'enum': ['BUY', 'SELL', 'all'], 'default': 'all'},
+                    'sl': {'type': 'number', 'description': 'New Stop Loss. Omit to keep, 0 to remove.'},
+                    'tp': {'type': 'number', 'description': 'New Take Profit. Omit to keep, 0 to remove.'},
+                    'mode': {'type': 'string', 'enum': ['price', 'points_from_open', 'points_from_current'], 'default': 'price', 'description': 'How sl/tp are interpreted: absolute prices or distances in points from the open or current price.'},
+                    'token': {'type': 'string', 'description': 'API token for authentication if Authorization header is not provided.'}
+                }
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Bulk SL/TP modification processed.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'message': {'type': 'string'},
+                    'modified': {'type': 'integer'},
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'ticket': {'type': 'integer'},
+                                'symbol': {'type': 'string'},
+                                'sl': {'type': 'number'},
+                                'tp': {'type': 'number'},
+                                'status': {'type': 'string', 'enum': ['modified', 'unchanged', 'rejected', 'deferred', 'failed']},
+                                'reason': {'type': 'string'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Bad request.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def modify_sl_tp_bulk_endpoint():
+    """
+    Modify Stop Loss and Take Profit for Multiple Positions
+    ---
+    description: Modify SL/TP for every position matching the filters or ticket list in one call. Levels are validated against the stops and freeze levels and only positions that would change are sent to the terminal. Authenticate using Authorization header or token in request body.
+    """
+    try:
+        data = request.get_json() or {}
+        if data.get('sl') is None and data.get('tp') is None:
+            return jsonify({"error": "At least one of sl or tp is required"}), 400
+
+        tickets = data.get('tickets')
+        if tickets is not None and not isinstance(tickets, list):
+            return jsonify({"error": "tickets must be a list of position tickets"}), 400
+        if tickets is not None and not tickets:
+            # An empty list must not widen to every open position
+            return jsonify({"error": "tickets must not be empty; omit it to select positions by the other filters"}), 400
+
+        magic = data.get('magic')
+        results = modify_sl_tp_bulk(
+            tickets=tickets,
+            symbol=data.get('symbol', ''),
+            comment=data.get('comment', ''),
+            magic=int(magic) if magic is not None else None,
+            order_type=data.get('order_type', 'all'),
+            sl=data.get('sl'),
+            tp=data.get('tp'),
+            mode=data.get('mode', 'price')
+        )
+        if results is None:
+            return jsonify({"error": "Failed to retrieve positions"}), 500
+
+        modified = sum(1 for entry in results if entry['status'] == 'modified')
+        return jsonify({
+            "message": f"Modified {modified} of {len(results)} matching positions",
+            "modified": modified,
+            "results": results
+        })
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in modify_sl_tp_bulk: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @position_bp.route('/get_positions', methods=['POST'])
 @swag_from({
     'tags': ['Position'],
@@ -377,6 +567,67 @@ def get_positions_endpoint():
         logger.error(f"Error in get_positions: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@position_bp.route('/exposure', methods=['GET'])
+@swag_from({
+    'tags': ['Position'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'token',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'API token for authentication if Authorization header is not provided.'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Exposure computed successfully.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'symbols': {
+                        'type': 'object',
+                        'description': 'Per symbol: positions, buy_volume, sell_volume, net_volume, notional, profit, swap, margin.'
+                    },
+                    'magics': {
+                        'type': 'object',
+                        'description': 'Per magic number: positions, profit, swap, margin and per symbol positions, net_volume, notional.'
+                    },
+                    'total': {
+                        'type': 'object',
+                        'properties': {
+                            'positions': {'type': 'integer'},
+                            'profit': {'type': 'number'},
+                            'swap': {'type': 'number'},
+                            'margin': {'type': 'number'}
+                        }
+                    }
+                }
+            }
+        },
+        500: {
+            'description': 'Internal server error or failed to retrieve positions.'
+        }
+    }
+})
+def exposure_endpoint():
+    """
+    Get Exposure per Symbol and Magic Number
+    ---
+    description: Net volume, notional (in the symbol's profit currency), floating profit, swap and estimated margin (in the account currency) of the open positions, aggregated per symbol and per magic number from a single positions snapshot. Authenticate using Authorization header or token in query parameter.
+    """
+    try:
+        exposure = compute_exposure()
+        if exposure is None:
+            return jsonify({"error": "Failed to retrieve positions"}), 500
+
+        return jsonify(exposure)
+
+    except Exception as e:
+        logger.error(f"Error in exposure: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @position_bp.route('/positions_total', methods=['GET'])
 @swag_from({
     'tags': ['Position'],
@@ -0,0 +1,187 @@
+from flask import Blueprint, jsonify, request
+import logging
+from flasgger import swag_from
+from risk_guard import get_status, set_risk_config, reset, trip
+
+risk_bp = Blueprint('risk', __name__)
+logger = logging.getLogger(__name__)
+
+STATUS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'config': {'type': 'object'},
+        'tripped': {'type': 'boolean', 'description': 'New orders are blocked while true.'},
+        'reason': {'type': 'string'},
+        'tripped_at': {'type': 'number'},
+        'day': {'type': 'string'},
+        'day_start_equity': {'type': 'number'},
+        'last_sample': {'type': 'object'}
+    }
+}
+
+@risk_bp.route('/risk_guard', methods=['GET'])
+@swag_from({
+    'tags': ['Risk'],
+    'security': [{'ApiKeyAuth': []}],
+    'responses': {
+        200: {
+            'description': 'Risk guard status retrieved successfully.',
+            'schema': STATUS_SCHEMA
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def get_risk_guard_endpoint():
+    """
+    Get Risk Guard Status
+    ---
+    description: Retrieve the risk limits, whether trading is halted and the latest account sample.
+    """
+    try:
+        return jsonify(get_status())
+
+    except Exception as e:
+        logger.error(f"Error in get_risk_guard: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@risk_bp.route('/risk_guard/config', methods=['POST'])
+@swag_from({
+    'tags': ['Risk'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'enabled': {'type': 'boolean', 'description': 'Turn the guard on or off.'},
+                    'interval_ms': {'type': 'integer', 'description': 'Account sampling interval in milliseconds. Default: 200.'},
+                    'max_daily_drawdown': {'type': 'number', 'description': "Maximum drop from the day's starting equity, in account currency. null disables."},
+                    'max_daily_drawdown_pct': {'type': 'number', 'description': "Maximum drop from the day's starting equity, in percent. null disables."},
+                    'equity_floor': {'type': 'number', 'description': 'Minimum equity, in account currency. null disables.'},
+                    'min_margin_level': {'type': 'number', 'description': 'Minimum margin level in percent. null disables.'},
+                    'flatten': {'type': 'boolean', 'description': 'Close all positions on a breach. Default: true.'}
+                }
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Risk guard configuration updated successfully.'
+        },
+        400: {
+            'description': 'Invalid settings.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def set_risk_guard_config_endpoint():
+    """
+    Configure Risk Guard
+    ---
+    description: Set the limits checked on every account sample. When one is breached, new orders are blocked and, if flatten is on, every position is closed with parallel close requests.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required"}), 400
+
+        changes = {key: value for key, value in data.items() if key != 'token'}
+        config = set_risk_config(**changes)
+        return jsonify({"message": "Risk guard configuration updated successfully", "config": config})
+
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in set_risk_guard_config: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@risk_bp.route('/risk_guard/reset', methods=['POST'])
+@swag_from({
+    'tags': ['Risk'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': False,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'rebase': {'type': 'boolean', 'description': "Measure the daily drawdown from the current equity instead of the day's starting equity. Default: false."}
+                }
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Risk guard reset, new orders are allowed again.',
+            'schema': STATUS_SCHEMA
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def reset_risk_guard_endpoint():
+    """
+    Reset Risk Guard
+    ---
+    description: Clear a breach so new orders are accepted again.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        reset(bool(data.get('rebase', False)))
+        return jsonify(get_status())
+
+    except Exception as e:
+        logger.error(f"Error in reset_risk_guard: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@risk_bp.route('/risk_guard/trip', methods=['POST'])
+@swag_from({
+    'tags': ['Risk'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': False,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'reason': {'type': 'string', 'description': 'Reason recorded with the halt.'}
+                }
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Trading halted.',
+            'schema': STATUS_SCHEMA
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def trip_risk_guard_endpoint():
+    """
+    Trip Risk Guard Manually
+    ---
+    description: Kill switch. Block new orders immediately and, if flatten is on, close every position.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        trip(str(data.get('reason', 'Manual trip')))
+        return jsonify(get_status())
+
+    except Exception as e:
+        logger.error(f"Error in trip_risk_guard: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
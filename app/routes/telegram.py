@@ -31,6 +31,10 @@ logger = logging.getLogger(__name__)
                     'send_modify_tp_sl': {
                         'type': 'boolean',
                         'description': 'Enable/disable sending TP/SL modification signals. Default: true.'
+                    },
+                    'send_alert': {
+                        'type': 'boolean',
+                        'description': 'Enable/disable sending price alert notifications. Default: true.'
                     }
                 },
                 'required': ['bot_token', 'chat_id']
@@ -52,7 +56,8 @@ logger = logging.getLogger(__name__)
                             'enabled': {'type': 'boolean'},
                             'send_open': {'type': 'boolean'},
                             'send_close': {'type': 'boolean'},
-                            'send_modify_tp_sl': {'type': 'boolean'}
+                            'send_modify_tp_sl': {'type': 'boolean'},
+                            'send_alert': {'type': 'boolean'}
                         }
                     }
                 }
@@ -82,8 +87,9 @@ def set_telegram_config_endpoint():
         send_open = data.get("send_open")
         send_close = data.get("send_close")
         send_modify_tp_sl = data.get("send_modify_tp_sl")
+        send_alert = data.get("send_alert")
 
-        set_telegram_config(bot_token, chat_id, send_open, send_close, send_modify_tp_sl)
+        set_telegram_config(bot_token, chat_id, send_open, send_close, send_modify_tp_sl, send_alert)
 
         test_message = "🔔 *MT5 Bot Configuration Updated*\nBot token, chat ID, and signal preferences configured successfully."
         config = get_telegram_config()
@@ -99,7 +105,8 @@ def set_telegram_config_endpoint():
                 "enabled": config["enabled"],
                 "send_open": config["send_open"],
                 "send_close": config["send_close"],
-                "send_modify_tp_sl": config["send_modify_tp_sl"]
+                "send_modify_tp_sl": config["send_modify_tp_sl"],
+                "send_alert": config["send_alert"]
             }
         })
 
@@ -125,7 +132,8 @@ def set_telegram_config_endpoint():
                             'enabled': {'type': 'boolean'},
                             'send_open': {'type': 'boolean'},
                             'send_close': {'type': 'boolean'},
-                            'send_modify_tp_sl': {'type': 'boolean'}
+                            'send_modify_tp_sl': {'type': 'boolean'},
+                            'send_alert': {'type': 'boolean'}
                         }
                     }
                 }
@@ -147,7 +155,8 @@ def get_telegram_config_endpoint():
                 "enabled": config["enabled"],
                 "send_open": config["send_open"],
                 "send_close": config["send_close"],
-                "send_modify_tp_sl": config["send_modify_tp_sl"]
+                "send_modify_tp_sl": config["send_modify_tp_sl"],
+                "send_alert": config["send_alert"]
             }
         })
 
@@ -193,7 +202,8 @@ def enable_telegram_signals():
             config["chat_id"],
             config["send_open"],
             config["send_close"],
-            config["send_modify_tp_sl"]
+            config["send_modify_tp_sl"],
+            config["send_alert"]
         )
 
         message = "🔔 *MT5 Bot Notification*\nTelegram signal sending has been enabled."
@@ -236,7 +246,8 @@ def disable_telegram_signals():
             config["chat_id"],
             config["send_open"],
             config["send_close"],
-            config["send_modify_tp_sl"]
+            config["send_modify_tp_sl"],
+            config["send_alert"]
         )
 
         if config["bot_token"] and config["chat_id"]:
@@ -0,0 +1,180 @@
+from flask import Blueprint, jsonify, request
+import logging
+from flasgger import swag_from
+from virtual_stops import set_virtual_stop, remove_virtual_stop, get_virtual_stops
+from auth import set_blueprint_policy, HEADER_OR_TOKEN
+
+virtual_stop_bp = Blueprint('virtual_stop', __name__)
+set_blueprint_policy(virtual_stop_bp, HEADER_OR_TOKEN)
+logger = logging.getLogger(__name__)
+
+@virtual_stop_bp.route('/virtual_stops', methods=['POST'])
+@swag_from({
+    'tags': ['Position'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'ticket': {'type': 'integer', 'description': 'Ticket number of the position.'},
+                    'sl': {'type': 'number', 'description': 'Hidden Stop Loss price (omit or 0 for none).'},
+                    'tp': {'type': 'number', 'description': 'Hidden Take Profit price (omit or 0 for none).'},
+                    'token': {'type': 'string', 'description': 'API token for authentication if Authorization header is not provided.'}
+                },
+                'required': ['ticket']
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Virtual stop registered successfully.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'message': {'type': 'string'},
+                    'virtual_stop': {
+                        'type': 'object',
+                        'properties': {
+                            'ticket': {'type': 'integer'},
+                            'symbol': {'type': 'string'},
+                            'type': {'type': 'integer'},
+                            'sl': {'type': 'number'},
+                            'tp': {'type': 'number'}
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Bad request, position not found or level already crossed.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def set_virtual_stop_endpoint():
+    """
+    Set Virtual (Hidden) SL/TP for a Position
+    ---
+    description: Register server-side Stop Loss / Take Profit levels that are never sent to the broker. When the price crosses a level, the position is closed at market. Replaces any levels already registered for the position. Authenticate using Authorization header or token in request body.
+    """
+    try:
+        data = request.get_json()
+        if not data or 'ticket' not in data:
+            return jsonify({"error": "ticket is required"}), 400
+
+        stop = set_virtual_stop(int(data['ticket']), data.get('sl'), data.get('tp'))
+        return jsonify({"message": "Virtual stop registered successfully", "virtual_stop": stop})
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in set_virtual_stop: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@virtual_stop_bp.route('/virtual_stops', methods=['GET'])
+@swag_from({
+    'tags': ['Position'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'token',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'API token for authentication if Authorization header is not provided.'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Virtual stops retrieved successfully.',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'virtual_stops': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'ticket': {'type': 'integer'},
+                                'symbol': {'type': 'string'},
+                                'type': {'type': 'integer'},
+                                'sl': {'type': 'number'},
+                                'tp': {'type': 'number'},
+                                'pending_close': {'type': 'boolean', 'description': 'A level was hit and the close is being retried.'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def list_virtual_stops_endpoint():
+    """
+    List Virtual (Hidden) SL/TP Levels
+    ---
+    description: Retrieve all registered server-side SL/TP levels. Authenticate using Authorization header or token in query parameter.
+    """
+    try:
+        return jsonify({"virtual_stops": get_virtual_stops()})
+
+    except Exception as e:
+        logger.error(f"Error in list_virtual_stops: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@virtual_stop_bp.route('/virtual_stops/<int:ticket>', methods=['DELETE'])
+@swag_from({
+    'tags': ['Position'],
+    'security': [{'ApiKeyAuth': []}],
+    'parameters': [
+        {
+            'name': 'ticket',
+            'in': 'path',
+            'type': 'integer',
+            'required': True,
+            'description': 'Ticket number of the position whose virtual levels should be removed.'
+        },
+        {
+            'name': 'token',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'API token for authentication if Authorization header is not provided.'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Virtual stop removed successfully.'
+        },
+        404: {
+            'description': 'No virtual stop registered for this position.'
+        },
+        500: {
+            'description': 'Internal server error.'
+        }
+    }
+})
+def remove_virtual_stop_endpoint(ticket):
+    """
+    Remove Virtual (Hidden) SL/TP for a Position
+    ---
+    description: Remove the server-side SL/TP levels of a position. Authenticate using Authorization header or token in query parameter.
+    """
+    try:
+        if not remove_virtual_stop(ticket):
+            return jsonify({"error": f"No virtual stop registered for position {ticket}"}), 404
+
+        return jsonify({"message": f"Virtual stop for position {ticket} removed successfully."})
+
+    except Exception as e:
+        logger.error(f"Error in remove_virtual_stop: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
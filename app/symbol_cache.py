@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+import MetaTrader5 as mt5
+
+logger = logging.getLogger(__name__)
+
+# Symbol specifications (point, digits, stops/freeze level, volume limits, ...) rarely
+# change during a session, so they are kept in memory instead of asking the terminal
+# on every request. Note: the cached object also carries bid/ask, which are stale by
+# definition - always use symbol_info_tick() for prices.
+SYMBOL_INFO_TTL_SECONDS = 300
+
+# {symbol: (fetched_at, symbol_info)}
+_symbol_info_cache = {}
+_cache_lock = threading.Lock()
+
+def get_symbol_info(symbol: str, max_age: float = SYMBOL_INFO_TTL_SECONDS):
+    """
+    Return the cached symbol_info for a symbol, refreshing it from the terminal when
+    it is missing or older than max_age seconds.
+
+    Args:
+        symbol: The trading symbol (e.g., 'EURUSD').
+        max_age: Maximum accepted age of the cached entry in seconds.
+
+    Returns:
+        The MT5 SymbolInfo namedtuple, or None if the terminal does not know the symbol.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _symbol_info_cache.get(symbol)
+    if entry is not None and now - entry[0] <= max_age:
+        return entry[1]
+
+    symbol_info = mt5.symbol_info(symbol)
+    if symbol_info is None:
+        logger.error(f"Failed to get symbol info for: {symbol}")
+        return None
+
+    with _cache_lock:
+        _symbol_info_cache[symbol] = (now, symbol_info)
+    logger.debug(f"Symbol info for {symbol} cached.")
+    return symbol_info
+
+def invalidate_symbol_info(symbol: str = None):
+    """Drop one symbol (or every symbol when None) from the cache."""
+    with _cache_lock:
+        if symbol is None:
+            _symbol_info_cache.clear()
+        else:
+            _symbol_info_cache.pop(symbol, None)
@@ -27,7 +27,8 @@ DEFAULT_CONFIG = {
     "enabled": False,
     "send_open": True,
     "send_close": True,
-    "send_modify_tp_sl": True
+    "send_modify_tp_sl": True,
+    "send_alert": True
 }
 
 # Biến toàn cục để lưu cấu hình trong bộ nhớ
@@ -68,7 +69,7 @@ def save_telegram_config():
         logger.error(f"Error saving Telegram config to {CONFIG_FILE}: {str(e)}")
         raise
 
-def set_telegram_config(bot_token, chat_id, send_open=None, send_close=None, send_modify_tp_sl=None):
+def set_telegram_config(bot_token, chat_id, send_open=None, send_close=None, send_modify_tp_sl=None, send_alert=None):
     """Thiết lập hoặc cập nhật cấu hình Telegram và lưu vào file."""
     try:
         telegram_config["bot_token"] = bot_token
@@ -80,6 +81,8 @@ def set_telegram_config(bot_token, chat_id, send_open=None, send_close=None, sen
             telegram_config["send_close"] = bool(send_close)
         if send_modify_tp_sl is not None:
             telegram_config["send_modify_tp_sl"] = bool(send_modify_tp_sl)
+        if send_alert is not None:
+            telegram_config["send_alert"] = bool(send_alert)
         save_telegram_config()  # Lưu cấu hình vào file
         logger.info("Telegram config updated and saved to signal_config.json")
     except Exception as e:
@@ -111,6 +114,9 @@ def send_telegram_message(message, action):
     if action == "modify_tp_sl" and not telegram_config["send_modify_tp_sl"]:
         logger.info("Modify TP/SL signal sending is disabled.")
         return False
+    if action == "alert" and not telegram_config["send_alert"]:
+        logger.info("Price alert sending is disabled.")
+        return False
 
     url = f"https://api.telegram.org/bot{telegram_config['bot_token']}/sendMessage"
     payload = {
@@ -0,0 +1,411 @@
+import logging
+import os
+from fnmatch import fnmatchcase
+import sqlite3
+import threading
+import time
+import MetaTrader5 as mt5
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn tới thư mục cấu hình trong volume
+CONFIG_DIR = "/config"
+LEDGER_FILE = os.path.join(CONFIG_DIR, "trade_ledger.db")
+
+# Background sync interval, and how stale the ledger may be when a query asks for fresh data
+SYNC_INTERVAL_SECONDS = float(os.environ.get('MT5_API_LEDGER_SYNC_INTERVAL', 10))
+FRESHNESS_SECONDS = 2
+# Re-read this much history before the watermark, for deals the server stamps slightly late
+SYNC_OVERLAP_SECONDS = 300
+# Ranges are fetched from the terminal in windows of this size to bound memory
+SYNC_CHUNK_SECONDS = 30 * 24 * 3600
+# First sync starts here (epoch seconds); the default backfills the whole account history
+LEDGER_START = int(os.environ.get('MT5_API_LEDGER_START', 946684800))
+
+# Column name -> SQLite type, in TradeDeal / TradeOrder field order
+DEAL_COLUMNS = {
+    'ticket': 'INTEGER PRIMARY KEY', 'order': 'INTEGER', 'time': 'INTEGER', 'time_msc': 'INTEGER',
+    'type': 'INTEGER', 'entry': 'INTEGER', 'magic': 'INTEGER', 'position_id': 'INTEGER',
+    'reason': 'INTEGER', 'volume': 'REAL', 'price': 'REAL', 'commission': 'REAL', 'swap': 'REAL',
+    'profit': 'REAL', 'fee': 'REAL', 'symbol': 'TEXT', 'comment': 'TEXT', 'external_id': 'TEXT',
+}
+ORDER_COLUMNS = {
+    'ticket': 'INTEGER PRIMARY KEY', 'time_setup': 'INTEGER', 'time_setup_msc': 'INTEGER',
+    'time_done': 'INTEGER', 'time_done_msc': 'INTEGER', 'time_expiration': 'INTEGER', 'type': 'INTEGER',
+    'type_time': 'INTEGER', 'type_filling': 'INTEGER', 'state': 'INTEGER', 'magic': 'INTEGER',
+    'position_id': 'INTEGER', 'position_by_id': 'INTEGER', 'reason': 'INTEGER', 'volume_initial': 'REAL',
+    'volume_current': 'REAL', 'price_open': 'REAL', 'sl': 'REAL', 'tp': 'REAL', 'price_current': 'REAL',
+    'price_stoplimit': 'REAL', 'symbol': 'TEXT', 'comment': 'TEXT', 'external_id': 'TEXT',
+}
+INDEXED_COLUMNS = {
+    'deals': ('position_id', 'symbol', 'magic', 'time'),
+    'orders': ('position_id', 'symbol', 'magic', 'time_setup'),
+}
+
+class LedgerNotReady(Exception):
+    """Raised when the ledger is needed before the worker finished the initial backfill."""
+    pass
+
+class LedgerSyncError(RuntimeError):
+    """Raised when the terminal fails to return a window of history."""
+    pass
+
+_connection = None
+_db_lock = threading.Lock()
+# Serializes syncs so an on-demand sync waits for a running one instead of repeating it
+_sync_lock = threading.Lock()
+_last_sync = 0.0
+# Set once a complete sync has run in this process; until then queries use the terminal
+_ready = threading.Event()
+
+_worker_thread = None
+_stop_event = threading.Event()
+
+def _connect():
+    """Open the ledger database, creating tables and indexes. Caller must hold _db_lock."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(LEDGER_FILE, check_same_thread=False)
+        _connection.row_factory = sqlite3.Row
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA synchronous=NORMAL")
+        for table, columns in (('deals', DEAL_COLUMNS), ('orders', ORDER_COLUMNS)):
+            column_sql = ", ".join(f'"{name}" {sql_type}' for name, sql_type in columns.items())
+            _connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({column_sql})")
+            for column in INDEXED_COLUMNS[table]:
+                _connection.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ("{column}")')
+        _connection.execute("CREATE TABLE IF NOT EXISTS watermarks (name TEXT PRIMARY KEY, value INTEGER)")
+        # Active pending orders seen by the last sync, stored once they leave the active list
+        _connection.execute("CREATE TABLE IF NOT EXISTS pending_orders (ticket INTEGER PRIMARY KEY)")
+        _connection.create_function("symbol_in_group", 2, symbol_in_group, deterministic=True)
+        _connection.commit()
+    return _connection
+
+def query(sql: str, params=()):
+    """Run a read query against the ledger and return the rows as dictionaries."""
+    with _db_lock:
+        rows = _connect().execute(sql, params).fetchall()
+    return [dict(row) for row in rows]
+
+def _store(table: str, columns: dict, records):
+    """Upsert terminal records (named tuples) into a table. Caller must hold _db_lock."""
+    names = list(columns)
+    placeholders = ", ".join("?" for _ in names)
+    column_sql = ", ".join(f'"{name}"' for name in names)
+    rows = []
+    for record in records:
+        record = record._asdict()
+        rows.append(tuple(record.get(name) for name in names))
+    _connect().executemany(f"INSERT OR REPLACE INTO {table} ({column_sql}) VALUES ({placeholders})", rows)
+
+def _get_watermark(name: str):
+    row = _connect().execute("SELECT value FROM watermarks WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+def _set_watermark(name: str, value: int):
+    _connect().execute("INSERT OR REPLACE INTO watermarks (name, value) VALUES (?, ?)", (name, value))
+
+def fetch_range(fetch, from_timestamp: int, to_timestamp: int, chunk_seconds: int = SYNC_CHUNK_SECONDS, **kwargs):
+    """
+    Call a terminal history function over a long range in consecutive windows.
+
+    Yields:
+        The records of each window, in order.
+
+    Raises:
+        LedgerSyncError: On the first failed window.
+    """
+    start = from_timestamp
+    while start < to_timestamp:
+        end = min(start + chunk_seconds, to_timestamp)
+        records = fetch(start, end, **kwargs)
+        if records is None:
+            raise LedgerSyncError(f"History request {start}-{end} failed. Last error: {mt5.last_error()}")
+        yield records
+        start = end
+
+def _sync_table(table: str, columns: dict, fetch, time_field: str):
+    """Pull records of one table newer than its watermark. Returns the new records."""
+    with _db_lock:
+        watermark = _get_watermark(table)
+    from_timestamp = LEDGER_START if watermark is None else max(LEDGER_START, watermark - SYNC_OVERLAP_SECONDS)
+    # Server time can be ahead of UTC, so look one day past now
+    to_timestamp = int(time.time()) + 86400
+
+    synced = []
+    for records in fetch_range(fetch, from_timestamp, to_timestamp):
+        if not records:
+            continue
+        with _db_lock:
+            _store(table, columns, records)
+            watermark = max(watermark or 0, max(getattr(record, time_field) for record in records))
+            _set_watermark(table, watermark)
+            _connect().commit()
+        synced.extend(records)
+    return synced
+
+def _sync_pending_orders():
+    """
+    Store the history orders of pending orders that left the active list since the last sync.
+
+    The orders window follows time_setup, so a pending order placed before the watermark
+    and canceled or expired later would otherwise never reach the ledger.
+    """
+    active = mt5.orders_get()
+    if active is None:
+        raise LedgerSyncError(f"Failed to read active orders. Last error: {mt5.last_error()}")
+    active_tickets = {order.ticket for order in active}
+    with _db_lock:
+        tracked = {row[0] for row in _connect().execute("SELECT ticket FROM pending_orders")}
+
+    finished = []
+    for ticket in tracked - active_tickets:
+        orders = mt5.history_orders_get(ticket=ticket)
+        if orders:
+            finished.extend(orders)
+    # Orders the history does not show yet are looked up again on the next sync
+    still_tracked = active_tickets | (tracked - active_tickets - {order.ticket for order in finished})
+
+    with _db_lock:
+        if finished:
+            _store('orders', ORDER_COLUMNS, finished)
+        _connect().execute("DELETE FROM pending_orders")
+        _connect().executemany("INSERT INTO pending_orders (ticket) VALUES (?)", [(ticket,) for ticket in still_tracked])
+        _connect().commit()
+
+def sync(max_age: float = None):
+    """
+    Pull deals and orders newer than the stored watermarks from the terminal.
+
+    Args:
+        max_age: Skip the sync if another one finished within max_age seconds, checked
+            after waiting for a running sync so concurrent callers share its result.
+
+    Returns:
+        Number of new or updated deals.
+
+    Raises:
+        LedgerSyncError: If the terminal failed to return part of the history.
+    """
+    global _last_sync
+    with _sync_lock:
+        if max_age is not None and time.monotonic() - _last_sync <= max_age:
+            return 0
+
+        deals = _sync_table('deals', DEAL_COLUMNS, mt5.history_deals_get, 'time')
+        _sync_table('orders', ORDER_COLUMNS, mt5.history_orders_get, 'time_setup')
+        _sync_pending_orders()
+
+        # Pending orders filled long after they were placed are outside the order window
+        order_tickets = sorted({deal.order for deal in deals if deal.order})
+        known = set()
+        for i in range(0, len(order_tickets), 500):
+            batch = order_tickets[i:i + 500]
+            known.update(row['ticket'] for row in query(
+                f"SELECT ticket FROM orders WHERE ticket IN ({', '.join('?' for _ in batch)})", batch))
+        for ticket in order_tickets:
+            if ticket not in known:
+                orders = mt5.history_orders_get(ticket=ticket)
+                if orders:
+                    with _db_lock:
+                        _store('orders', ORDER_COLUMNS, orders)
+                        _connect().commit()
+
+        _last_sync = time.monotonic()
+        if not _ready.is_set():
+            _ready.set()
+            logger.info("Trade ledger backfill complete.")
+        if deals:
+            logger.debug(f"Trade ledger synced {len(deals)} deals.")
+        return len(deals)
+
+def symbol_in_group(symbol: str, group: str) -> bool:
+    """
+    Match a symbol against an MT5 group mask such as "*USD*,!EURUSD": it has to match
+    one of the patterns and none of the patterns prefixed with '!'.
+    """
+    patterns = [pattern.strip() for pattern in group.split(',') if pattern.strip()]
+    includes = [pattern for pattern in patterns if not pattern.startswith('!')]
+    excludes = [pattern[1:] for pattern in patterns if pattern.startswith('!')]
+    if any(fnmatchcase(symbol, pattern) for pattern in excludes):
+        return False
+    return not includes or any(fnmatchcase(symbol, pattern) for pattern in includes)
+
+def query_deals(from_timestamp: int, to_timestamp: int, position: int = None, symbol: str = None,
+                group: str = None, magic: int = None, entry: int = None, after=None, limit: int = None):
+    """
+    Deals in a time range ordered by (time, ticket), with optional filters.
+
+    Args:
+        from_timestamp, to_timestamp: Inclusive time range.
+        position, symbol, magic, entry: Exact matches.
+        group: MT5 group mask for the symbol.
+        after: (time, ticket) of the last deal already returned, for keyset pagination.
+        limit: Maximum number of deals.
+    """
+    sql = "SELECT * FROM deals WHERE time >= ? AND time <= ?"
+    params = [from_timestamp, to_timestamp]
+    for column, value in (('position_id', position), ('symbol', symbol), ('magic', magic), ('entry', entry)):
+        if value is not None:
+            sql += f' AND "{column}" = ?'
+            params.append(value)
+    if group:
+        sql += " AND symbol_in_group(symbol, ?)"
+        params.append(group)
+    if after is not None:
+        sql += " AND (time > ? OR (time = ? AND ticket > ?))"
+        params.extend([after[0], after[0], after[1]])
+    sql += " ORDER BY time, ticket"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return query(sql, params)
+
+def iter_deals(from_timestamp: int, to_timestamp: int, chunk_size: int = 5000, **filters):
+    """Yield lists of at most chunk_size deals, walking the range with keyset pagination."""
+    after = None
+    while True:
+        deals = query_deals(from_timestamp, to_timestamp, after=after, limit=chunk_size, **filters)
+        if not deals:
+            return
+        yield deals
+        if len(deals) < chunk_size:
+            return
+        after = (deals[-1]['time'], deals[-1]['ticket'])
+
+def position_entries(position_ids):
+    """
+    Summarize the entry deals of the given positions.
+
+    Returns:
+        {position_id: {"open_time", "volume", "costs"}} - time of the first entry deal,
+        total entry volume, and commission, swap and fee charged on entry.
+    """
+    position_ids = sorted(set(position_ids))
+    entries = {}
+    for i in range(0, len(position_ids), 500):
+        batch = position_ids[i:i + 500]
+        rows = query(
+            f"SELECT position_id, MIN(time) AS open_time, SUM(volume) AS volume, "
+            f"SUM(commission + swap + fee) AS costs FROM deals WHERE entry = ? "
+            f"AND position_id IN ({', '.join('?' for _ in batch)}) GROUP BY position_id",
+            [mt5.DEAL_ENTRY_IN, *batch])
+        entries.update((row.pop('position_id'), row) for row in rows)
+    return entries
+
+def is_ready() -> bool:
+    """True once the initial backfill has completed."""
+    return _ready.is_set()
+
+def ensure_fresh(max_age: float = FRESHNESS_SECONDS):
+    """
+    Sync unless the ledger was synced within max_age seconds. A failed sync is logged
+    and the stored history is served as it is.
+
+    Raises:
+        LedgerNotReady: If the initial backfill is still running in the worker.
+    """
+    if not _ready.is_set():
+        raise LedgerNotReady("Trade history is still loading, retry shortly")
+    if time.monotonic() - _last_sync <= max_age:
+        return
+    try:
+        sync(max_age=max_age)
+    except LedgerSyncError as e:
+        logger.warning(f"Serving trade ledger without the latest history: {str(e)}")
+
+def _terminal_records(records, time_field: str, from_timestamp: int = None, to_timestamp: int = None):
+    """Terminal records as dictionaries ordered like ledger rows, within an optional time range."""
+    rows = [record._asdict() for record in records or ()]
+    rows = [row for row in rows
+            if (from_timestamp is None or row[time_field] >= from_timestamp)
+            and (to_timestamp is None or row[time_field] <= to_timestamp)]
+    return sorted(rows, key=lambda row: (row[time_field], row['ticket']))
+
+def terminal_deals(from_timestamp: int, to_timestamp: int, position: int = None, symbol: str = None,
+                   group: str = None, magic: int = None, entry: int = None, after=None, limit: int = None):
+    """
+    query_deals answered by the terminal, for use before the initial backfill finished.
+
+    Raises:
+        LedgerSyncError: If the terminal failed to return the deals.
+    """
+    if position is not None:
+        records = mt5.history_deals_get(position=position)
+        if records is None:
+            raise LedgerSyncError(f"History request for position {position} failed. Last error: {mt5.last_error()}")
+    else:
+        # Windows share their boundary second, so a deal can be returned twice
+        by_ticket = {}
+        for window in fetch_range(mt5.history_deals_get, from_timestamp, to_timestamp + 1):
+            by_ticket.update((deal.ticket, deal) for deal in window)
+        records = by_ticket.values()
+    deals = [deal for deal in _terminal_records(records, 'time', from_timestamp, to_timestamp)
+             if (symbol is None or deal['symbol'] == symbol)
+             and (magic is None or deal['magic'] == magic)
+             and (entry is None or deal['entry'] == entry)
+             and (not group or symbol_in_group(deal['symbol'], group))
+             and (after is None or (deal['time'], deal['ticket']) > tuple(after))]
+    return deals[:limit] if limit is not None else deals
+
+def get_position_deals(position_id: int, from_timestamp: int = None, to_timestamp: int = None):
+    """Deals of a position ordered by time, syncing first if none are known yet."""
+    if not _ready.is_set():
+        # The backfill may not have reached this position yet
+        return _terminal_records(mt5.history_deals_get(position=position_id), 'time', from_timestamp, to_timestamp)
+
+    sql = "SELECT * FROM deals WHERE position_id = ?"
+    params = [position_id]
+    if from_timestamp is not None:
+        sql += " AND time >= ?"
+        params.append(from_timestamp)
+    if to_timestamp is not None:
+        sql += " AND time <= ?"
+        params.append(to_timestamp)
+    sql += " ORDER BY time, ticket"
+
+    deals = query(sql, params)
+    if not deals:
+        ensure_fresh()
+        deals = query(sql, params)
+    return deals
+
+def get_orders(ticket: int):
+    """History orders with the given ticket, syncing first if it is not known yet."""
+    if not _ready.is_set():
+        return _terminal_records(mt5.history_orders_get(ticket=ticket), 'time_setup')
+
+    orders = query("SELECT * FROM orders WHERE ticket = ?", (ticket,))
+    if not orders:
+        ensure_fresh()
+        orders = query("SELECT * FROM orders WHERE ticket = ?", (ticket,))
+    return orders
+
+def ledger_worker():
+    """Keep the ledger in sync with the terminal. The first sync backfills the history."""
+    logger.info("Trade ledger worker started.")
+    while not _stop_event.is_set():
+        try:
+            sync()
+        except Exception as e:
+            logger.error(f"Error in trade ledger worker: {str(e)}")
+        _stop_event.wait(SYNC_INTERVAL_SECONDS)
+    logger.info("Trade ledger worker stopped.")
+
+def start_worker():
+    """Start the trade ledger sync thread."""
+    global _worker_thread
+    if _worker_thread is None or not _worker_thread.is_alive():
+        _stop_event.clear()
+        _worker_thread = threading.Thread(target=ledger_worker, daemon=True)
+        _worker_thread.start()
+    else:
+        logger.info("Trade ledger worker is already running.")
+
+def stop_worker():
+    """Stop the trade ledger sync thread."""
+    global _worker_thread
+    if _worker_thread is not None and _worker_thread.is_alive():
+        _stop_event.set()
+        _worker_thread.join(timeout=10)
+    _worker_thread = None
@@ -3,6 +3,8 @@ import time
 import logging
 import MetaTrader5 as mt5
 from telegram_utils import send_telegram_message, format_trade_signal
+from position_snapshot import update_snapshot
+from account_state import get_account_info
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,9 @@ position_states = {}  # {position_id: {'tp': float, 'sl': float}}
 # Lưu danh sách position_id đã biết
 known_positions = set()
 
+# Account sample age accepted as proof the terminal is alive
+ACCOUNT_MAX_AGE_MS = 5000
+
 # Biến toàn cục để kiểm soát worker
 _worker_thread = None
 _stop_event = threading.Event()
@@ -30,9 +35,9 @@ def trade_signal_worker():
                 time.sleep(5)
                 continue
 
-            account_info = mt5.account_info()
+            # Liveness check served by the account state sampler; reads the terminal only when stale
+            account_info = get_account_info(max_age_ms=ACCOUNT_MAX_AGE_MS)
             if not account_info:
-                logger.error(f"Failed to get account info. Last error: {mt5.last_error()}")
                 time.sleep(5)
                 continue
             logger.debug(f"Account info: {account_info}")
@@ -43,6 +48,7 @@ def trade_signal_worker():
                 time.sleep(5)
                 continue
             logger.debug(f"Retrieved {len(positions)} positions")
+            update_snapshot(positions)
 
             current_positions = set()
             for position in positions:
@@ -0,0 +1,129 @@
+import logging
+import threading
+import MetaTrader5 as mt5
+from constants import SYMBOL_FILLING_FOK, SYMBOL_FILLING_IOC
+from symbol_cache import get_symbol_info
+
+logger = logging.getLogger(__name__)
+
+TYPE_FILLING_MAP = {
+    'ORDER_FILLING_IOC': mt5.ORDER_FILLING_IOC,
+    'ORDER_FILLING_FOK': mt5.ORDER_FILLING_FOK,
+    'ORDER_FILLING_RETURN': mt5.ORDER_FILLING_RETURN
+}
+
+# Auto-detected filling mode per symbol: {symbol: ORDER_FILLING_*}
+_filling_mode_cache = {}
+_filling_lock = threading.Lock()
+
+class TradeValidationError(ValueError):
+    """Raised when a trade request is rejected locally, before reaching the terminal."""
+    pass
+
+def supported_filling_modes(symbol_info):
+    """
+    List the ORDER_FILLING_* modes a symbol accepts, in order of preference.
+
+    IOC and FOK are announced through the filling_mode bit flags. RETURN is available
+    for every execution mode except Market execution.
+    """
+    modes = []
+    if symbol_info.filling_mode & SYMBOL_FILLING_IOC:
+        modes.append(mt5.ORDER_FILLING_IOC)
+    if symbol_info.filling_mode & SYMBOL_FILLING_FOK:
+        modes.append(mt5.ORDER_FILLING_FOK)
+    if symbol_info.trade_exemode != mt5.SYMBOL_TRADE_EXECUTION_MARKET:
+        modes.append(mt5.ORDER_FILLING_RETURN)
+    return modes
+
+def resolve_filling_mode(symbol: str, type_filling_str: str = None):
+    """
+    Pick the filling mode for an order on symbol.
+
+    Args:
+        symbol: The trading symbol.
+        type_filling_str: Optional client choice ('ORDER_FILLING_IOC', ...). When omitted
+            a supported mode is detected from the symbol specification and cached.
+
+    Returns:
+        The ORDER_FILLING_* constant to send.
+
+    Raises:
+        TradeValidationError: If the requested mode is unknown or not supported by the symbol.
+    """
+    if type_filling_str:
+        type_filling = TYPE_FILLING_MAP.get(str(type_filling_str).upper())
+        if type_filling is None:
+            raise TradeValidationError(f"Invalid filling type: {type_filling_str}. Must be 'ORDER_FILLING_IOC', 'ORDER_FILLING_FOK', or 'ORDER_FILLING_RETURN'.")
+    else:
+        type_filling = None
+
+    with _filling_lock:
+        cached = _filling_mode_cache.get(symbol)
+    if type_filling is None and cached is not None:
+        return cached
+
+    symbol_info = get_symbol_info(symbol)
+    if symbol_info is None:
+        raise TradeValidationError(f"Unknown symbol: {symbol}")
+
+    modes = supported_filling_modes(symbol_info)
+    if type_filling is not None:
+        if type_filling not in modes:
+            raise TradeValidationError(f"Filling type {str(type_filling_str).upper()} is not supported for {symbol}")
+        return type_filling
+
+    if not modes:
+        raise TradeValidationError(f"No supported filling mode for {symbol}")
+    with _filling_lock:
+        _filling_mode_cache[symbol] = modes[0]
+    logger.info(f"Auto-detected filling mode {modes[0]} for {symbol}.")
+    return modes[0]
+
+def forget_filling_mode(symbol: str):
+    """Drop the detected filling mode, e.g. after the server answered TRADE_RETCODE_INVALID_FILL."""
+    with _filling_lock:
+        _filling_mode_cache.pop(symbol, None)
+
+def validate_market_order(symbol_info, order_type, volume, tick, sl=None, tp=None):
+    """
+    Check a market order against the symbol specification without calling the terminal.
+
+    Args:
+        symbol_info: Cached SymbolInfo of the symbol.
+        order_type: mt5.ORDER_TYPE_BUY or mt5.ORDER_TYPE_SELL.
+        volume: Requested volume in lots.
+        tick: Latest tick, used for the stops level check.
+        sl, tp: Optional Stop Loss / Take Profit prices.
+
+    Raises:
+        TradeValidationError: With a message describing the first violated rule.
+    """
+    symbol = symbol_info.name
+    is_buy = order_type == mt5.ORDER_TYPE_BUY
+
+    if symbol_info.trade_mode == mt5.SYMBOL_TRADE_MODE_DISABLED:
+        raise TradeValidationError(f"Trading is disabled for {symbol}")
+    if symbol_info.trade_mode == mt5.SYMBOL_TRADE_MODE_CLOSEONLY:
+        raise TradeValidationError(f"Only closing positions is allowed for {symbol}")
+    if symbol_info.trade_mode == mt5.SYMBOL_TRADE_MODE_LONGONLY and not is_buy:
+        raise TradeValidationError(f"Only long positions are allowed for {symbol}")
+    if symbol_info.trade_mode == mt5.SYMBOL_TRADE_MODE_SHORTONLY and is_buy:
+        raise TradeValidationError(f"Only short positions are allowed for {symbol}")
+
+    if volume < symbol_info.volume_min or volume > symbol_info.volume_max:
+        raise TradeValidationError(f"Volume {volume} is outside [{symbol_info.volume_min}, {symbol_info.volume_max}] for {symbol}")
+    if symbol_info.volume_step > 0:
+        steps = (volume - symbol_info.volume_min) / symbol_info.volume_step
+        if abs(steps - round(steps)) > 1e-6:
+            raise TradeValidationError(f"Volume {volume} is not a multiple of the volume step {symbol_info.volume_step} for {symbol}")
+
+    # Stops are checked against the price the position would be closed at
+    close_price = tick.bid if is_buy else tick.ask
+    stops_distance = symbol_info.trade_stops_level * symbol_info.point
+    if sl:
+        if (is_buy and sl > close_price - stops_distance) or (not is_buy and sl < close_price + stops_distance):
+            raise TradeValidationError(f"SL {sl} violates the stops level ({symbol_info.trade_stops_level} points from {close_price}) for {symbol}")
+    if tp:
+        if (is_buy and tp < close_price + stops_distance) or (not is_buy and tp > close_price - stops_distance):
+            raise TradeValidationError(f"TP {tp} violates the stops level ({symbol_info.trade_stops_level} points from {close_price}) for {symbol}")
@@ -45,9 +45,9 @@ def trailing_stop_worker_function():
 
                     if result is None:
                         logger.error(f"Worker: Failed to apply trailing stop for position {position_ticket}. Will retry.")
-                    elif "message" in result and result["message"] == "No SL update needed":
-                        # logger.info(f"Worker: Trailing stop for position {position_ticket}: No SL update needed.") # Avoid excessive logging
-                        pass
+                    elif "message" in result:
+                        # No SL update needed, or deferred by the rate governor until the next cycle
+                        logger.debug(f"Worker: Trailing stop for position {position_ticket}: {result['message']}.")
                     else:
                         logger.info(f"Worker: Trailing stop applied successfully for position {position_ticket}. Result: {result}")
 
@@ -107,22 +107,26 @@ def stop_worker():
     else:
         logger.warning("Trailing stop worker thread is not running.")
 
-def add_trailing_stop_job_to_worker(position_ticket: int, trailing_distance: float):
+def add_trailing_stop_job_to_worker(position_ticket: int, trailing_distance: float, verify: bool = True):
     """
     Adds or updates a trailing stop job in the worker's tracking dictionary.
 
     Args:
         position_ticket: The ticket number of the position.
         trailing_distance: The trailing stop distance in points.
+        verify: Check that the position exists first. Callers that already know the
+            position is open (e.g. right after a fill) can skip the terminal call; the
+            worker drops jobs whose position disappears anyway.
 
     Returns:
         True if added/updated successfully, False if position not found.
     """
     # Check if the position exists before adding/updating (Optional but good practice)
-    positions = mt5.positions_get(ticket=position_ticket)
-    if positions is None or len(positions) == 0:
-         logger.error(f"Position with ticket {position_ticket} not found. Cannot add/update job in worker.")
-         return False
+    if verify:
+        positions = mt5.positions_get(ticket=position_ticket)
+        if positions is None or len(positions) == 0:
+             logger.error(f"Position with ticket {position_ticket} not found. Cannot add/update job in worker.")
+             return False
 
     # If the position is already being tracked, log that we are updating the distance
     if position_ticket in active_trailing_stop_jobs:
@@ -136,6 +140,35 @@ def add_trailing_stop_job_to_worker(position_ticket: int, trailing_distance: flo
 
     return True
 
+def _confirm_trailing_stop_position(deal_ticket: int, assumed_ticket: int, trailing_distance: float):
+    """
+    Look up the position of a deal in the history and move the trailing stop job
+    registered under assumed_ticket if the real position ticket differs.
+    """
+    try:
+        deals = mt5.history_deals_get(ticket=deal_ticket)
+        if not deals or deals[0].position_id == 0:
+            logger.error(f"Could not confirm position for deal {deal_ticket}. Trailing stop job stays on {assumed_ticket}.")
+            return
+        position_ticket = deals[0].position_id
+        if position_ticket != assumed_ticket:
+            logger.info(f"Deal {deal_ticket} belongs to position {position_ticket}, not {assumed_ticket}. Moving trailing stop job.")
+            active_trailing_stop_jobs.pop(assumed_ticket, None)
+            active_trailing_stop_jobs[position_ticket] = trailing_distance
+    except Exception as e:
+        logger.error(f"Error confirming position for deal {deal_ticket}: {str(e)}")
+
+def confirm_trailing_stop_position(deal_ticket: int, assumed_ticket: int, trailing_distance: float):
+    """
+    Confirms the position of a freshly registered job in a background thread, so the
+    deal history lookup stays off the order response path.
+    """
+    threading.Thread(
+        target=_confirm_trailing_stop_position,
+        args=(deal_ticket, assumed_ticket, trailing_distance),
+        daemon=True
+    ).start()
+
 def remove_trailing_stop_job_from_worker(position_ticket: int):
     """
     Removes a trailing stop job from the worker's tracking dictionary.
@@ -0,0 +1,318 @@
+import json
+import logging
+import os
+import threading
+import time
+import MetaTrader5 as mt5
+from lib import close_position
+from price_level_index import PriceLevelIndex
+from position_snapshot import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn tới thư mục cấu hình trong volume
+CONFIG_DIR = "/config"
+VIRTUAL_STOPS_FILE = os.path.join(CONFIG_DIR, "virtual_stops.json")
+
+# Tick polling interval of the engine and how often closed positions are pruned
+CHECK_INTERVAL_SECONDS = float(os.environ.get('MT5_API_VIRTUAL_STOP_INTERVAL', 0.1))
+PRUNE_INTERVAL_SECONDS = 5
+# A failed close (market closed, trading disabled) is retried after this delay, doubled
+# after every further failure up to the cap, so it does not drain the close budget
+CLOSE_RETRY_SECONDS = 0.5
+CLOSE_RETRY_MAX_SECONDS = 60
+
+# Hidden levels per position: {ticket: {"ticket", "symbol", "type", "sl", "tp"}}
+virtual_stops = {}
+
+# Per symbol indexes. A BUY position is closed at Bid, a SELL position at Ask, so:
+#   bid_down: BUY SL (Bid <= level)     bid_up: BUY TP (Bid >= level)
+#   ask_up:   SELL SL (Ask >= level)    ask_down: SELL TP (Ask <= level)
+_indexes = {}
+# Last seen (bid, ask) per symbol
+_last_prices = {}
+# Tickets whose level triggered but whose close has not succeeded yet
+_pending_closes = set()
+# {ticket: (failed attempts, monotonic time of the next attempt)} of pending closes
+_close_backoff = {}
+# Tickets registered since the last tick of their symbol: {symbol: set(tickets)}. The
+# indexes compare levels with the previous engine price, which predates these levels
+_fresh_stops = {}
+_lock = threading.RLock()
+
+_worker_thread = None
+_stop_event = threading.Event()
+
+def _index_keys(position_type, kind):
+    """Return the name of the index holding the given level ('sl' or 'tp') of a position."""
+    if position_type == mt5.ORDER_TYPE_BUY:
+        return 'bid_down' if kind == 'sl' else 'bid_up'
+    return 'ask_up' if kind == 'sl' else 'ask_down'
+
+def _level_crossed(stop, bid, ask):
+    """True if the current price is at or beyond one of the levels of a stop entry."""
+    if stop['type'] == mt5.ORDER_TYPE_BUY:
+        return bool((stop['sl'] and bid <= stop['sl']) or (stop['tp'] and bid >= stop['tp']))
+    return bool((stop['sl'] and ask >= stop['sl']) or (stop['tp'] and ask <= stop['tp']))
+
+def _symbol_indexes(symbol):
+    if symbol not in _indexes:
+        _indexes[symbol] = {name: PriceLevelIndex() for name in ('bid_down', 'bid_up', 'ask_up', 'ask_down')}
+    return _indexes[symbol]
+
+def _index_stop(stop):
+    """Add the levels of a stop entry to the indexes. Caller must hold _lock."""
+    indexes = _symbol_indexes(stop['symbol'])
+    for kind in ('sl', 'tp'):
+        if stop[kind]:
+            indexes[_index_keys(stop['type'], kind)].add(stop[kind], stop['ticket'])
+
+def _unindex_stop(stop):
+    """Remove the levels of a stop entry from the indexes. Caller must hold _lock."""
+    indexes = _indexes.get(stop['symbol'])
+    if indexes is None:
+        return
+    for kind in ('sl', 'tp'):
+        if stop[kind]:
+            indexes[_index_keys(stop['type'], kind)].remove(stop[kind], stop['ticket'])
+    fresh = _fresh_stops.get(stop['symbol'])
+    if fresh is not None:
+        fresh.discard(stop['ticket'])
+    if not any(len(index) for index in indexes.values()):
+        del _indexes[stop['symbol']]
+        _last_prices.pop(stop['symbol'], None)
+        _fresh_stops.pop(stop['symbol'], None)
+
+def save_virtual_stops():
+    """Persist the registered levels to virtual_stops.json."""
+    try:
+        with _lock:
+            data = list(virtual_stops.values())
+        tmp_file = VIRTUAL_STOPS_FILE + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_file, VIRTUAL_STOPS_FILE)
+    except Exception as e:
+        logger.error(f"Error saving virtual stops to {VIRTUAL_STOPS_FILE}: {str(e)}")
+
+def load_virtual_stops():
+    """Restore registered levels from virtual_stops.json."""
+    if not os.path.exists(VIRTUAL_STOPS_FILE):
+        return
+    try:
+        with open(VIRTUAL_STOPS_FILE, 'r') as f:
+            data = json.load(f)
+        with _lock:
+            for stop in data:
+                virtual_stops[stop['ticket']] = stop
+                _index_stop(stop)
+        logger.info(f"Loaded {len(data)} virtual stops from {VIRTUAL_STOPS_FILE}")
+    except Exception as e:
+        logger.error(f"Error loading virtual stops from {VIRTUAL_STOPS_FILE}: {str(e)}")
+
+def set_virtual_stop(ticket: int, sl: float = None, tp: float = None):
+    """
+    Register or replace the hidden SL/TP of an open position.
+
+    Args:
+        ticket: Position ticket.
+        sl, tp: Hidden levels; None or 0 means no level on that side.
+
+    Returns:
+        The registered stop entry.
+
+    Raises:
+        ValueError: If the position does not exist or a level is already crossed.
+    """
+    positions = mt5.positions_get(ticket=ticket)
+    if not positions:
+        raise ValueError(f"Position with ticket {ticket} not found.")
+    position = positions[0]
+
+    tick = mt5.symbol_info_tick(position.symbol)
+    if tick is None:
+        raise ValueError(f"Failed to get tick for symbol: {position.symbol}")
+
+    sl = float(sl) if sl else 0.0
+    tp = float(tp) if tp else 0.0
+    if not sl and not tp:
+        raise ValueError("At least one of sl or tp is required")
+
+    stop = {"ticket": ticket, "symbol": position.symbol, "type": position.type, "sl": sl, "tp": tp}
+    if _level_crossed(stop, tick.bid, tick.ask):
+        price = f"Bid {tick.bid}" if position.type == mt5.ORDER_TYPE_BUY else f"Ask {tick.ask}"
+        raise ValueError(f"Levels are already crossed at the current {price}")
+
+    with _lock:
+        previous = virtual_stops.get(ticket)
+        if previous is not None:
+            _unindex_stop(previous)
+        virtual_stops[ticket] = stop
+        _index_stop(stop)
+        _pending_closes.discard(ticket)
+        _close_backoff.pop(ticket, None)
+        if position.symbol in _last_prices:
+            # Checked directly against the next tick, see _collect_triggered
+            _fresh_stops.setdefault(position.symbol, set()).add(ticket)
+    save_virtual_stops()
+    logger.info(f"Virtual stop set for position {ticket}: SL={sl}, TP={tp}")
+    return dict(stop)
+
+def remove_virtual_stop(ticket: int) -> bool:
+    """Remove the hidden levels of a position. Returns False if none were registered."""
+    with _lock:
+        stop = virtual_stops.pop(ticket, None)
+        if stop is None:
+            return False
+        _unindex_stop(stop)
+        _pending_closes.discard(ticket)
+        _close_backoff.pop(ticket, None)
+    save_virtual_stops()
+    logger.info(f"Virtual stop removed for position {ticket}.")
+    return True
+
+def get_virtual_stops():
+    """Return the registered stops as a list."""
+    with _lock:
+        return [dict(stop, pending_close=stop['ticket'] in _pending_closes) for stop in virtual_stops.values()]
+
+def _collect_triggered(symbol, tick):
+    """Return tickets whose levels were crossed since the previous tick. Caller must hold _lock."""
+    previous = _last_prices.get(symbol)
+    _last_prices[symbol] = (tick.bid, tick.ask)
+    if previous is None:
+        # First tick (e.g. after a restart): every level already beyond the price counts as crossed
+        down_bid = down_ask = float('inf')
+        up_bid = up_ask = float('-inf')
+    else:
+        down_bid = up_bid = previous[0]
+        down_ask = up_ask = previous[1]
+
+    indexes = _indexes[symbol]
+    triggered = set()
+    triggered.update(indexes['bid_down'].pop_crossed_down(down_bid, tick.bid))
+    triggered.update(indexes['bid_up'].pop_crossed_up(up_bid, tick.bid))
+    triggered.update(indexes['ask_up'].pop_crossed_up(up_ask, tick.ask))
+    triggered.update(indexes['ask_down'].pop_crossed_down(down_ask, tick.ask))
+
+    # A level registered between two ticks was valid at its own registration price,
+    # which can lie on either side of the previous engine price. Moving from the
+    # previous price may then never cross it, so compare it with the price directly.
+    for ticket in _fresh_stops.pop(symbol, ()):
+        if _level_crossed(virtual_stops[ticket], tick.bid, tick.ask):
+            triggered.add(ticket)
+    return triggered
+
+def _close_triggered(ticket):
+    """Close a position whose hidden level was hit. Returns True when it is gone."""
+    positions = mt5.positions_get(ticket=ticket)
+    if not positions:
+        logger.info(f"Virtual stop: position {ticket} is already closed.")
+        return True
+    result = close_position(positions[0]._asdict(), comment="virtual stop")
+    if result is None:
+        return False
+    logger.info(f"Virtual stop: position {ticket} closed at {result.price}.")
+    return True
+
+def _defer_close(ticket):
+    """Schedule the next attempt of a failed close with exponential backoff."""
+    with _lock:
+        failures = _close_backoff.get(ticket, (0, 0.0))[0] + 1
+        delay = min(CLOSE_RETRY_MAX_SECONDS, CLOSE_RETRY_SECONDS * 2 ** min(failures - 1, 16))
+        _close_backoff[ticket] = (failures, time.monotonic() + delay)
+    if failures == 1:
+        logger.error(f"Virtual stop: failed to close position {ticket}, retrying with backoff up to every {CLOSE_RETRY_MAX_SECONDS:g} s.")
+    else:
+        logger.debug(f"Virtual stop: close of position {ticket} failed {failures} times, next attempt in {delay:g} s.")
+
+def _close_pending():
+    """Attempt the pending closes that are not backing off after a failure."""
+    now = time.monotonic()
+    with _lock:
+        pending = [ticket for ticket in _pending_closes if _close_backoff.get(ticket, (0, 0.0))[1] <= now]
+    for ticket in pending:
+        if not _close_triggered(ticket):
+            _defer_close(ticket)
+            continue
+        with _lock:
+            _pending_closes.discard(ticket)
+            failures = _close_backoff.pop(ticket, (0, 0.0))[0]
+            stop = virtual_stops.pop(ticket, None)
+            if stop is not None:
+                # The other side of the position may still be indexed
+                _unindex_stop(stop)
+        if failures:
+            logger.info(f"Virtual stop: position {ticket} closed after {failures} failed attempts.")
+        save_virtual_stops()
+
+def _prune_closed_positions():
+    """Drop levels of positions that were closed by other means."""
+    positions = get_snapshot(max_age=PRUNE_INTERVAL_SECONDS)
+    if positions is None:
+        return
+    open_tickets = {position.ticket for position in positions}
+    with _lock:
+        missing = [ticket for ticket in virtual_stops if ticket not in open_tickets]
+    for ticket in missing:
+        # The shared snapshot can predate a position opened right before its levels
+        # were registered, so confirm with the terminal before dropping them
+        confirmed = mt5.positions_get(ticket=ticket)
+        if confirmed is None or len(confirmed) > 0:
+            continue
+        logger.info(f"Virtual stop: position {ticket} no longer exists, removing its levels.")
+        remove_virtual_stop(ticket)
+
+def virtual_stop_worker():
+    """Poll ticks for symbols with hidden levels and close positions whose level is crossed."""
+    logger.info("Virtual stop worker started.")
+    last_prune = time.monotonic()
+
+    while not _stop_event.is_set():
+        try:
+            with _lock:
+                symbols = list(_indexes)
+
+            for symbol in symbols:
+                tick = mt5.symbol_info_tick(symbol)
+                if tick is None:
+                    continue
+                with _lock:
+                    if symbol not in _indexes:
+                        continue
+                    triggered = _collect_triggered(symbol, tick)
+                    _pending_closes.update(triggered)
+
+            _close_pending()
+
+            if time.monotonic() - last_prune >= PRUNE_INTERVAL_SECONDS:
+                last_prune = time.monotonic()
+                if virtual_stops:
+                    _prune_closed_positions()
+
+        except Exception as e:
+            logger.error(f"Error in virtual stop worker: {str(e)}")
+
+        _stop_event.wait(CHECK_INTERVAL_SECONDS)
+
+    logger.info("Virtual stop worker stopped.")
+
+def start_worker():
+    """Start the virtual stop worker thread."""
+    global _worker_thread
+    if _worker_thread is None or not _worker_thread.is_alive():
+        _stop_event.clear()
+        load_virtual_stops()
+        _worker_thread = threading.Thread(target=virtual_stop_worker, daemon=True)
+        _worker_thread.start()
+        logger.info("Virtual stop worker started.")
+    else:
+        logger.info("Virtual stop worker is already running.")
+
+def stop_worker():
+    """Stop the virtual stop worker thread."""
+    global _worker_thread
+    if _worker_thread is not None and _worker_thread.is_alive():
+        _stop_event.set()
+        _worker_thread.join(timeout=10)
+    _worker_thread = None
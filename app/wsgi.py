@@ -0,0 +1,11 @@
+# WSGI entry point for servers that import the app instead of running app.py, e.g.
+#   waitress-serve --listen=0.0.0.0:5001 --threads=16 wsgi:application
+# Importing this module starts the background workers; they are stopped at exit.
+# app.py itself starts nothing on import, so tools and asgi.py can import it freely.
+import atexit
+from app import app, start_services, stop_services
+
+start_services()
+atexit.register(stop_services)
+
+application = app
@@ -0,0 +1,112 @@
+# Compare JSON response encoding of Flask's default provider with the providers in
+# app/json_provider.py on payloads shaped like our largest responses.
+#
+#   python benchmarks/bench_json_provider.py [--repeat 5]
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from json_provider import StdlibJSONProvider, OrjsonJSONProvider, orjson  # noqa: E402
+
+def rates_payload(bars: int):
+    """/fetch_data_range: DataFrame of bars with pandas Timestamps."""
+    rng = np.random.default_rng(1)
+    close = 1.1 + rng.standard_normal(bars).cumsum() * 1e-4
+    df = pd.DataFrame({
+        'time': pd.to_datetime(np.arange(bars) * 60 + 1_700_000_000, unit='s'),
+        'open': close, 'high': close + 2e-4, 'low': close - 2e-4, 'close': close,
+        'tick_volume': rng.integers(1, 500, bars), 'spread': rng.integers(0, 20, bars),
+        'real_volume': np.zeros(bars, dtype=np.int64),
+    })
+    return df.to_dict(orient='records')
+
+def deals_payload(count: int):
+    """/history_deals_get: flat dictionaries of Python scalars."""
+    return [{
+        'ticket': 1_000_000 + i, 'order': 2_000_000 + i, 'time': 1_700_000_000 + i, 'time_msc': (1_700_000_000 + i) * 1000,
+        'type': i % 2, 'entry': i % 2, 'magic': 1000 + i % 7, 'position_id': 3_000_000 + i // 2, 'reason': 3,
+        'volume': 0.1, 'price': 1.1 + i * 1e-6, 'commission': -0.7, 'swap': 0.0, 'profit': (i % 13) - 6.5,
+        'fee': 0.0, 'symbol': 'EURUSD', 'comment': 'strategy', 'external_id': ''
+    } for i in range(count)]
+
+Position = namedtuple('Position', 'ticket time type magic volume price_open sl tp price_current swap profit symbol comment')
+
+def positions_payload(count: int):
+    """/get_positions: DataFrame records holding NumPy scalars."""
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({
+        'ticket': np.arange(count, dtype=np.int64) + 5_000_000, 'type': rng.integers(0, 2, count),
+        'volume': rng.random(count).round(2), 'profit': rng.standard_normal(count) * 10,
+        'symbol': ['EURUSD'] * count,
+    })
+    records = [{key: (np.int64(value) if isinstance(value, int) else value) for key, value in row.items()}
+               for row in df.to_dict(orient='records')]
+    return records
+
+def namedtuple_payload(count: int):
+    """Route output built from MT5 namedtuples with _asdict()."""
+    return [Position(i, 1_700_000_000 + i, i % 2, 7, 0.1, 1.1, 1.09, 1.12, 1.105, 0.0, 1.5, 'EURUSD', '')._asdict()
+            for i in range(count)]
+
+def raw_namedtuple_payload(count: int):
+    """MT5 namedtuples returned as they are; the stdlib provider converts them first."""
+    return [Position(i, 1_700_000_000 + i, i % 2, 7, 0.1, 1.1, 1.09, 1.12, 1.105, 0.0, 1.5, 'EURUSD', '')
+            for i in range(count)]
+
+def bench(provider, payload, repeat: int):
+    app = provider._app
+    with app.app_context():
+        provider.response(payload)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = provider.response(payload)
+            best = min(best, time.perf_counter() - start)
+    return best, len(response.get_data())
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = {'flask default': DefaultJSONProvider(app), 'stdlib': StdlibJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonJSONProvider(app)
+    else:
+        print("orjson is not installed, only the stdlib providers are measured.")
+
+    payloads = {
+        'deals 1k': deals_payload(1_000),
+        'deals 50k': deals_payload(50_000),
+        'rates 10k bars': rates_payload(10_000),
+        'positions 500 (numpy)': positions_payload(500),
+        'positions 500 (_asdict)': namedtuple_payload(500),
+        'positions 500 (tuples)': raw_namedtuple_payload(500),
+    }
+
+    print(f"{'payload':<24}{'size':>10}" + ''.join(f"{name:>16}" for name in providers) + f"{'speedup':>10}")
+    for label, payload in payloads.items():
+        timings = {}
+        size = 0
+        for name, provider in providers.items():
+            try:
+                timings[name], size = bench(provider, payload, args.repeat)
+            except TypeError:
+                # The default provider cannot encode NumPy scalars
+                timings[name] = None
+        cells = ''.join(f"{timings[name] * 1000:>13.2f} ms" if timings[name] is not None else f"{'fails':>16}"
+                        for name in providers)
+        baseline = timings['flask default'] or timings['stdlib']
+        speedup = f"{baseline / timings['orjson']:>9.1f}x" if 'orjson' in timings else ''
+        print(f"{label:<24}{size / 1024:>8.0f}KB{cells}{speedup}")
+
+if __name__ == '__main__':
+    main()
@@ -12,4 +12,10 @@ if ! is_wine_python_package_installed "MetaTrader5"; then
     $wine_executable python -m pip install --no-cache-dir -r /app/requirements.txt
 fi
 
-
+# Install packages added to requirements.txt after terminals were first set up
+for package in waitress starlette uvicorn a2wsgi orjson brotli; do
+    if ! is_wine_python_package_installed "$package"; then
+        log_message "INFO" "Installing $package in Windows"
+        $wine_executable python -m pip install --no-cache-dir "$package"
+    fi
+done
@@ -4,10 +4,15 @@ source /scripts/02-common.sh
 
 log_message "RUNNING" "07-start-wine-flask.sh"
 
-log_message "INFO" "Starting Flask server in Wine environment..."
+log_message "INFO" "Starting Flask server (${MT5_API_SERVER:-waitress}) in Wine environment..."
 
-# Run the Flask app using Wine's Python
-wine python /app/app.py &
+# Run the Flask app using Wine's Python; MT5_API_SERVER=dev falls back to Flask's development server
+# and MT5_API_SERVER=asgi serves the streaming front end with uvicorn, mounting the Flask app
+if [ "${MT5_API_SERVER}" = "asgi" ]; then
+    wine python /app/asgi.py &
+else
+    wine python /app/app.py --server "${MT5_API_SERVER:-waitress}" &
+fi
 
 FLASK_PID=$!
 
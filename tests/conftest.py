@@ -0,0 +1,51 @@
+import itertools
+import os
+import sys
+import types
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+sys.path.insert(0, APP_DIR)
+
+# Values of the MT5 constants the tested logic compares against
+MT5_CONSTANTS = {
+    'ORDER_TYPE_BUY': 0,
+    'ORDER_TYPE_SELL': 1,
+    'DEAL_TYPE_BUY': 0,
+    'DEAL_TYPE_SELL': 1,
+    'DEAL_ENTRY_IN': 0,
+    'DEAL_ENTRY_OUT': 1,
+    'DEAL_ENTRY_INOUT': 2,
+    'DEAL_ENTRY_OUT_BY': 3,
+    'ORDER_FILLING_FOK': 0,
+    'ORDER_FILLING_IOC': 1,
+    'ORDER_FILLING_RETURN': 2,
+    'SYMBOL_TRADE_EXECUTION_MARKET': 2,
+    'ACCOUNT_MARGIN_MODE_RETAIL_NETTING': 0,
+    'ACCOUNT_MARGIN_MODE_RETAIL_HEDGING': 2,
+    'TRADE_RETCODE_DONE': 10009,
+    'TRADE_RETCODE_TOO_MANY_REQUESTS': 10024,
+}
+
+def _terminal_module():
+    """
+    Stand-in for the MetaTrader5 package, which only installs on Windows. Constants not
+    listed above get distinct placeholder values; tests patch the functions they call.
+    """
+    module = types.ModuleType('MetaTrader5')
+    module.__dict__.update(MT5_CONSTANTS)
+    placeholders = itertools.count(1000000)
+
+    def __getattr__(name):
+        if not name.isupper():
+            raise AttributeError(f"MetaTrader5.{name} is not available in tests; patch it")
+        value = next(placeholders)
+        setattr(module, name, value)
+        return value
+
+    module.__getattr__ = __getattr__
+    return module
+
+try:
+    import MetaTrader5  # noqa: F401
+except ImportError:
+    sys.modules['MetaTrader5'] = _terminal_module()
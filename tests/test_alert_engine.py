@@ -0,0 +1,55 @@
+from collections import namedtuple
+from types import SimpleNamespace
+import MetaTrader5 as mt5
+import pytest
+
+pytest.importorskip('requests')  # alert_engine notifies through telegram_utils
+import alert_engine  # noqa: E402
+
+Tick = namedtuple('Tick', 'bid ask')
+POINT = 0.00001
+
+@pytest.fixture
+def terminal(tmp_path, monkeypatch):
+    terminal = SimpleNamespace(tick=Tick(1.1000, 1.1002))
+    monkeypatch.setattr(mt5, 'symbol_info_tick', lambda symbol: terminal.tick, raising=False)
+    monkeypatch.setattr(alert_engine, 'get_symbol_info', lambda symbol: SimpleNamespace(point=POINT, digits=5))
+    monkeypatch.setattr(alert_engine, 'ALERTS_FILE', str(tmp_path / 'alerts.json'))
+    for name in ('alerts', '_indexes', '_last_values', '_fresh_alerts'):
+        monkeypatch.setattr(alert_engine, name, {})
+    return terminal
+
+def _tick(terminal, bid):
+    terminal.tick = Tick(bid, bid + 0.0002)
+    with alert_engine._lock:
+        return set(alert_engine._collect_triggered('EURUSD', terminal.tick, POINT))
+
+def test_price_cross_triggers_when_the_level_is_crossed(terminal):
+    alert = alert_engine.create_alert('EURUSD', 'price_cross', level=1.1050, direction='above')
+    assert _tick(terminal, 1.1000) == set()
+    assert _tick(terminal, 1.1049) == set()
+    assert _tick(terminal, 1.1051) == {alert['id']}
+
+def test_level_registered_between_ticks_is_checked_against_the_next_price(terminal):
+    alert_engine.create_alert('EURUSD', 'price_cross', level=1.2000, direction='above')
+    _tick(terminal, 1.1100)
+    # The price drops and the alert is registered above it, below the previous tick
+    terminal.tick = Tick(1.1040, 1.1042)
+    alert = alert_engine.create_alert('EURUSD', 'price_cross', level=1.1050, direction='above')
+    # Falling from 1.1100 to 1.1060 never crosses 1.1050, yet Bid is above the level
+    assert _tick(terminal, 1.1060) == {alert['id']}
+
+def test_fresh_level_not_reached_is_left_to_the_index(terminal):
+    alert_engine.create_alert('EURUSD', 'price_cross', level=1.2000, direction='above')
+    _tick(terminal, 1.1000)
+    alert = alert_engine.create_alert('EURUSD', 'price_cross', level=1.0900, direction='below')
+    assert _tick(terminal, 1.0950) == set()
+    assert _tick(terminal, 1.0890) == {alert['id']}
+
+def test_deleted_fresh_alert_does_not_trigger(terminal):
+    alert_engine.create_alert('EURUSD', 'price_cross', level=1.2000, direction='above')
+    _tick(terminal, 1.1100)
+    terminal.tick = Tick(1.1040, 1.1042)
+    alert = alert_engine.create_alert('EURUSD', 'price_cross', level=1.1050, direction='above')
+    alert_engine.delete_alert(alert['id'])
+    assert _tick(terminal, 1.1060) == set()
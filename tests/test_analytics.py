@@ -0,0 +1,81 @@
+import MetaTrader5 as mt5
+import pytest
+import analytics
+import trade_ledger
+
+def _deal(ticket, deal_time, position_id, entry, volume=1.0, profit=0.0, commission=0.0, symbol='EURUSD'):
+    return {
+        "ticket": ticket, "time": deal_time, "position_id": position_id, "entry": entry,
+        "type": mt5.DEAL_TYPE_BUY, "volume": volume, "profit": profit, "commission": commission,
+        "swap": 0.0, "fee": 0.0, "symbol": symbol, "magic": 0, "comment": "",
+    }
+
+@pytest.fixture
+def ledger(monkeypatch):
+    deals = []
+
+    def query_deals(from_timestamp, to_timestamp):
+        return [deal for deal in deals if from_timestamp <= deal['time'] <= to_timestamp]
+
+    def position_entries(position_ids):
+        position_ids = set(position_ids)
+        entries = {}
+        for deal in deals:
+            if deal['entry'] == mt5.DEAL_ENTRY_IN and deal['position_id'] in position_ids:
+                entry = entries.setdefault(deal['position_id'], {"open_time": deal['time'], "volume": 0.0, "costs": 0.0})
+                entry['open_time'] = min(entry['open_time'], deal['time'])
+                entry['volume'] += deal['volume']
+                entry['costs'] += deal['commission'] + deal['swap'] + deal['fee']
+        return entries
+
+    monkeypatch.setattr(trade_ledger, 'query_deals', query_deals)
+    monkeypatch.setattr(trade_ledger, 'position_entries', position_entries)
+    return deals
+
+def test_entry_commission_counts_towards_the_trade_result(ledger):
+    ledger.extend([
+        _deal(1, 100, 1, mt5.DEAL_ENTRY_IN, commission=-3.0),
+        _deal(2, 200, 1, mt5.DEAL_ENTRY_OUT, profit=2.0, commission=-3.0),
+    ])
+    metrics = analytics.finalize_metrics(analytics.compute_period(0, 1000)[analytics.TOTAL_KEY])
+    # Gross profit of 2 is a net loss of 4 once both commissions are paid
+    assert metrics["net_pnl"] == -4.0
+    assert metrics["expectancy"] == -4.0
+    assert (metrics["wins"], metrics["losses"]) == (0, 1)
+    assert metrics["max_drawdown"] == 4.0
+    assert metrics["avg_holding_seconds"] == 100
+
+def test_entry_costs_are_split_across_partial_closes(ledger):
+    ledger.extend([
+        _deal(1, 100, 1, mt5.DEAL_ENTRY_IN, volume=2.0, commission=-4.0),
+        _deal(2, 200, 1, mt5.DEAL_ENTRY_OUT, volume=1.0, profit=5.0),
+        _deal(3, 300, 1, mt5.DEAL_ENTRY_OUT, volume=1.0, profit=1.0),
+    ])
+    aggregate = analytics.compute_period(0, 1000)[analytics.TOTAL_KEY]
+    assert (aggregate["gross_profit"], aggregate["gross_loss"]) == (3.0, -1.0)
+
+def test_entry_before_the_window_is_still_attributed(ledger):
+    ledger.extend([
+        _deal(1, 100, 1, mt5.DEAL_ENTRY_IN, commission=-1.0),
+        _deal(2, 5000, 1, mt5.DEAL_ENTRY_OUT, profit=10.0, commission=-1.0),
+    ])
+    aggregate = analytics.compute_period(1000, 9000)[analytics.TOTAL_KEY]
+    assert aggregate["sum"] == 8.0
+    assert aggregate["commission"] == -1.0
+
+def test_merged_days_match_the_whole_period(ledger):
+    results = [5.0, -8.0, 3.0, -2.0, 6.0, -7.0]
+    for index, profit in enumerate(results):
+        position_id = index + 1
+        ledger.append(_deal(2 * index, index * 1000, position_id, mt5.DEAL_ENTRY_IN, commission=-0.5))
+        ledger.append(_deal(2 * index + 1, index * 1000 + 500, position_id, mt5.DEAL_ENTRY_OUT, profit=profit,
+                            symbol='EURUSD' if index % 2 else 'GBPUSD'))
+
+    whole = analytics.compute_period(0, 6000, 'symbol')
+    merged = {}
+    for start in range(0, 6000, 1000):
+        for key, aggregate in analytics.compute_period(start, start + 999, 'symbol').items():
+            merged[key] = analytics.merge_aggregates(merged.get(key, analytics.EMPTY_AGGREGATE), aggregate)
+    assert merged.keys() == whole.keys()
+    for key in whole:
+        assert merged[key] == pytest.approx(whole[key])
@@ -0,0 +1,83 @@
+import pytest
+from flask import Flask, jsonify, request
+from routes.batch import batch_bp,  MAX_BATCH_SIZE, BatchReferenceError, _validate, resolve_references
+
+RESULTS = {
+    'order': {'status': 200, 'body': {'result': {'order': 123, 'price': 1.1}, 'deals': [{'ticket': 7}]}},
+    '0': {'status': 200, 'body': [{'ticket': 5}]},
+}
+
+@pytest.mark.parametrize('value, expected', [
+    ('${order.result.order}', 123),
+    ('${order.result}', {'order': 123, 'price': 1.1}),
+    ('${order.deals.0.ticket}', 7),
+    ('${0.0.ticket}', 5),
+    ('ticket-${order.result.order}', 'ticket-123'),
+    ({'position': '${order.result.order}', 'tags': ['${0.0.ticket}', 'x']}, {'position': 123, 'tags': [5, 'x']}),
+    ('no references', 'no references'),
+    (1.5, 1.5),
+])
+def test_resolve_references(value, expected):
+    assert resolve_references(value, RESULTS) == expected
+
+@pytest.mark.parametrize('value', ['${later.result}', '${order.result.missing}', '${order.deals.3.ticket}', '${order.result.order.x}'])
+def test_unresolvable_references_raise(value):
+    with pytest.raises(BatchReferenceError):
+        resolve_references(value, RESULTS)
+
+def test_valid_batch():
+    _validate([
+        {'id': 'order', 'method': 'post', 'path': '/order', 'body': {}},
+        {'path': '/get_positions', 'depends_on': ['order']},
+    ])
+
+@pytest.mark.parametrize('sub_requests, message', [
+    ([], "non-empty list"),
+    ({'path': '/x'}, "non-empty list"),
+    ([{'path': '/x'}] * (MAX_BATCH_SIZE + 1), "at most"),
+    (['/x'], "must be an object"),
+    ([{'id': 'a', 'path': '/x'}, {'id': 'a', 'path': '/y'}], "Duplicate request id"),
+    ([{'method': 'HEAD', 'path': '/x'}], "invalid method"),
+    ([{'path': 'x'}], "path must start"),
+    ([{'path': '/batch/'}], "cannot be nested"),
+    ([{'path': '/history_deals_get?from_date=2024-01-01'}], "query"),
+    ([{'path': '/x', 'query': 'a=1'}], "query must be an object"),
+    ([{'path': '/x', 'depends_on': ['1']}, {'path': '/y'}], "depends_on"),
+    ([{'path': '/x', 'depends_on': 'a'}], "depends_on"),
+])
+def test_invalid_batches(sub_requests, message):
+    with pytest.raises(ValueError, match=message):
+        _validate(sub_requests)
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(batch_bp)
+    calls = []
+
+    @app.route('/side', methods=['POST'])
+    def side():
+        calls.append(request.get_json())
+        return jsonify({"order": 42, "suffix": "?order=42"})
+
+    @app.route('/echo')
+    def echo():
+        return jsonify(dict(request.args))
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+def test_bad_sub_request_fails_alone(client):
+    response = client.post('/batch', json={'requests': [
+        {'id': 'side', 'method': 'POST', 'path': '/side', 'body': {'volume': 1}},
+        {'path': '/echo${side.suffix}'},
+        {'path': '/side'},
+        {'path': '/echo', 'query': {'order': '${side.order}'}},
+    ]})
+    assert response.status_code == 207
+    results = response.json['results']
+    assert [result['status'] for result in results] == [200, 400, 405, 200]
+    assert results[0]['body']['order'] == 42
+    assert results[3]['body'] == {'order': '42'}
+    assert client.calls == [{'volume': 1}]
@@ -0,0 +1,89 @@
+import gzip
+import zlib
+import pytest
+import compression
+from compression import CompressionMiddleware, choose_encoding
+
+BODY = b'{"ticks": [' + b','.join(b'{"bid": 1.1, "ask": 1.1002}' for _ in range(200)) + b']}'
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('', None),
+    ('gzip', 'gzip'),
+    ('gzip, deflate, br', 'br'),
+    ('br;q=0, gzip', 'gzip'),
+    ('deflate', 'deflate'),
+    ('GZIP ; q=0.5', 'gzip'),
+    ('*', 'br'),
+    ('*, br;q=0', 'gzip'),
+    ('gzip;q=0, deflate;q=0', None),
+    ('gzip;q=abc, deflate', 'deflate'),
+    ('identity', None),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding) == expected
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    assert choose_encoding('br, gzip') == 'gzip'
+    assert choose_encoding('br') is None
+
+def _app(body_chunks, headers):
+    def app(environ, start_response):
+        start_response('200 OK', list(headers))
+        return iter(body_chunks)
+    return app
+
+def _call(app, accept_encoding, method='GET'):
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured['status'] = status
+        captured['headers'] = dict(headers)
+
+    environ = {'REQUEST_METHOD': method, 'HTTP_ACCEPT_ENCODING': accept_encoding}
+    chunks = list(CompressionMiddleware(app, min_size=1024)(environ, start_response))
+    return captured['headers'], chunks
+
+def test_known_length_body_is_compressed_whole():
+    app = _app([BODY], [('Content-Type', 'application/json'), ('Content-Length', str(len(BODY))), ('ETag', '"abc"')])
+    headers, chunks = _call(app, 'gzip')
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['ETag'] == 'W/"abc"'
+    assert int(headers['Content-Length']) == len(chunks[0])
+    assert gzip.decompress(chunks[0]) == BODY
+
+def test_small_and_uncompressible_responses_pass_through():
+    small = _app([b'{}'], [('Content-Type', 'application/json'), ('Content-Length', '2')])
+    headers, chunks = _call(small, 'gzip')
+    assert 'Content-Encoding' not in headers
+    assert chunks == [b'{}']
+
+    image = _app([BODY], [('Content-Type', 'image/png'), ('Content-Length', str(len(BODY)))])
+    headers, chunks = _call(image, 'gzip')
+    assert 'Content-Encoding' not in headers
+
+    json_body = _app([BODY], [('Content-Type', 'application/json'), ('Content-Length', str(len(BODY)))])
+    headers, chunks = _call(json_body, 'gzip', method='HEAD')
+    assert 'Content-Encoding' not in headers
+
+def test_streamed_chunks_can_be_decoded_as_they_arrive():
+    events = [b'data: {"bid": %d}\n\n' % i for i in range(5)]
+    app = _app(events, [('Content-Type', 'text/event-stream')])
+    headers, chunks = _call(app, 'deflate')
+    assert headers['Content-Encoding'] == 'deflate'
+    assert 'Content-Length' not in headers
+
+    decompressor = zlib.decompressobj()
+    # Every chunk is flushed, so each event decodes before the stream ends
+    for event, chunk in zip(events, chunks):
+        assert decompressor.decompress(chunk) == event
+    assert decompressor.decompress(b''.join(chunks[len(events):])) + decompressor.flush() == b''
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+def test_streamed_brotli_round_trip():
+    events = [b'data: %d\n\n' % i for i in range(3)]
+    app = _app(events, [('Content-Type', 'text/event-stream')])
+    headers, chunks = _call(app, 'br')
+    assert headers['Content-Encoding'] == 'br'
+    assert compression.brotli.decompress(b''.join(chunks)) == b''.join(events)
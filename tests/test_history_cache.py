@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from datetime import timezone
+import MetaTrader5 as mt5
+import pytest
+from flask import Flask
+import history_cache
+import trade_ledger
+from history_cache import deals_close_position
+from routes.history import history_bp
+
+def _deal(deal_type, volume, entry, deal_time=1_700_000_000):
+    return {'ticket': deal_time, 'type': deal_type, 'volume': volume, 'entry': entry, 'time': deal_time,
+            'symbol': 'EURUSD', 'price': 1.1, 'profit': 0.0, 'commission': 0.0, 'swap': 0.0, 'comment': ''}
+
+BUY, SELL = mt5.DEAL_TYPE_BUY, mt5.DEAL_TYPE_SELL
+IN, OUT, INOUT = mt5.DEAL_ENTRY_IN, mt5.DEAL_ENTRY_OUT, mt5.DEAL_ENTRY_INOUT
+
+@pytest.mark.parametrize('deals, expected', [
+    ([], False),
+    ([_deal(BUY, 1.0, IN)], False),
+    ([_deal(BUY, 1.0, IN), _deal(SELL, 1.0, OUT)], True),
+    ([_deal(BUY, 1.0, IN), _deal(SELL, 0.4, OUT)], False),
+    ([_deal(SELL, 0.3, IN), _deal(SELL, 0.2, IN), _deal(BUY, 0.1, OUT), _deal(BUY, 0.4, OUT)], True),
+    # Reversal on a netting account: 1.5 sold closes 1.0 and opens 0.5 short
+    ([_deal(BUY, 1.0, IN), _deal(SELL, 1.5, INOUT), _deal(BUY, 0.5, OUT)], True),
+    ([_deal(BUY, 1.0, IN), _deal(SELL, 1.5, INOUT)], False),
+])
+def test_deals_close_position(deals, expected):
+    assert deals_close_position(deals) is expected
+
+class Ledger:
+    """Ledger holding the opening deal; the closing deal arrives on the next sync."""
+
+    def __init__(self, sync_fails=False):
+        self.deals = [_deal(BUY, 1.0, IN)]
+        self.sync_fails = sync_fails
+        self.syncs = 0
+
+    def get_position_deals(self, position_id, from_timestamp=None, to_timestamp=None):
+        return list(self.deals)
+
+    def sync(self, max_age=None):
+        self.syncs += 1
+        if self.sync_fails:
+            raise trade_ledger.LedgerSyncError("history_deals_get failed")
+        self.deals = [_deal(BUY, 1.0, IN), _deal(SELL, 1.0, OUT, 1_700_000_060)]
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(history_cache, '_entries', OrderedDict())
+    monkeypatch.setattr(history_cache, '_total_bytes', 0)
+    monkeypatch.setattr(history_cache, 'is_closed_position', lambda ticket: True)
+    monkeypatch.setattr(trade_ledger, 'is_ready', lambda: True)
+    monkeypatch.setattr(mt5, 'TIMEZONE', timezone.utc, raising=False)
+    app = Flask(__name__)
+    app.register_blueprint(history_bp)
+    return app.test_client()
+
+def _use(monkeypatch, ledger):
+    monkeypatch.setattr(trade_ledger, 'get_position_deals', ledger.get_position_deals)
+    monkeypatch.setattr(trade_ledger, 'sync', ledger.sync)
+
+def test_closed_position_missing_its_exit_deal_syncs_before_caching(client, monkeypatch):
+    ledger = Ledger()
+    _use(monkeypatch, ledger)
+    response = client.get('/get_deal_from_ticket?ticket=1')
+    assert response.status_code == 200
+    assert ledger.syncs == 1
+    assert response.json['volume'] == 2.0
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'deal:1' in history_cache._entries
+
+def test_position_is_not_cached_after_a_failed_sync(client, monkeypatch):
+    ledger = Ledger(sync_fails=True)
+    _use(monkeypatch, ledger)
+    response = client.get('/get_deal_from_ticket?ticket=1')
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+    assert history_cache._entries == OrderedDict()
@@ -0,0 +1,93 @@
+import pytest
+from flask import Flask, jsonify
+import idempotency
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(idempotency, 'IDEMPOTENCY_FILE', str(tmp_path / 'idempotency_keys.jsonl'))
+    monkeypatch.setattr(idempotency, '_results', idempotency.OrderedDict())
+    monkeypatch.setattr(idempotency, '_in_flight', {})
+    monkeypatch.setattr(idempotency, '_journal_lines', 0)
+
+    app = Flask(__name__)
+    app.calls = 0
+    app.statuses = []
+    app.outcomes = []
+
+    @app.route('/order', methods=['POST'])
+    @idempotency.idempotent
+    def order():
+        app.calls += 1
+        status = app.statuses.pop(0) if app.statuses else 200
+        if app.outcomes:
+            idempotency.record_outcome(app.outcomes.pop(0))
+        return jsonify({"call": app.calls}), status
+
+    test_client = app.test_client()
+    test_client.application = app
+    return test_client
+
+def _post(client, body, key='key-1'):
+    return client.post('/order', json=body, headers={'Idempotency-Key': key})
+
+def test_success_is_replayed(client):
+    first = _post(client, {"symbol": "EURUSD", "volume": 0.1})
+    second = _post(client, {"symbol": "EURUSD", "volume": 0.1})
+    assert first.get_json() == second.get_json() == {"call": 1}
+    assert second.headers['Idempotent-Replayed'] == 'true'
+
+def test_token_does_not_change_the_fingerprint(client):
+    _post(client, {"symbol": "EURUSD", "token": "old"})
+    assert _post(client, {"symbol": "EURUSD", "token": "new"}).get_json() == {"call": 1}
+
+def test_key_reused_with_another_body_is_rejected(client):
+    _post(client, {"symbol": "EURUSD", "volume": 0.1})
+    response = _post(client, {"symbol": "EURUSD", "volume": 1.0})
+    assert response.status_code == 422
+    assert client.application.calls == 1
+
+@pytest.mark.parametrize('status', [403, 429, 500, 503])
+def test_transient_rejections_run_again(client, status):
+    client.application.statuses = [status]
+    assert _post(client, {"symbol": "EURUSD"}).status_code == status
+    retried = _post(client, {"symbol": "EURUSD"})
+    assert retried.status_code == 200
+    assert client.application.calls == 2
+
+@pytest.mark.parametrize('status', [400, 404, 422])
+def test_validation_errors_are_replayed(client, status):
+    client.application.statuses = [status]
+    _post(client, {"symbol": "EURUSD"})
+    assert _post(client, {"symbol": "EURUSD"}).status_code == status
+    assert client.application.calls == 1
+
+def test_rejection_by_the_terminal_runs_again(client):
+    # A requote answered with 400 after order_send
+    client.application.statuses = [400]
+    client.application.outcomes = [False]
+    assert _post(client, {"symbol": "EURUSD"}).status_code == 400
+    assert _post(client, {"symbol": "EURUSD"}).status_code == 200
+    assert client.application.calls == 2
+
+def test_failure_after_a_fill_is_replayed(client):
+    client.application.statuses = [500]
+    client.application.outcomes = [True]
+    assert _post(client, {"symbol": "EURUSD"}).status_code == 500
+    assert _post(client, {"symbol": "EURUSD"}).status_code == 500
+    assert client.application.calls == 1
+
+def test_journal_is_compacted_while_running(client, monkeypatch):
+    monkeypatch.setattr(idempotency, 'MAX_KEYS', 3)
+    for index in range(20):
+        _post(client, {}, key=f"key-{index}")
+    with open(idempotency.IDEMPOTENCY_FILE) as f:
+        lines = f.readlines()
+    assert len(lines) <= idempotency.COMPACT_RATIO * idempotency.MAX_KEYS
+    assert list(idempotency._results) == ['order:key-17', 'order:key-18', 'order:key-19']
+
+def test_journal_is_reloaded(client):
+    _post(client, {"symbol": "EURUSD"})
+    idempotency._results.clear()
+    idempotency.load_idempotency_cache()
+    assert _post(client, {"symbol": "EURUSD"}).get_json() == {"call": 1}
+    assert _post(client, {"symbol": "GBPUSD"}).status_code == 422
@@ -0,0 +1,49 @@
+import json
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+import pytest
+from flask import Flask
+from json_provider import StdlibJSONProvider, OrjsonJSONProvider, orjson
+
+Tick = namedtuple('Tick', 'time bid ask')
+
+PAYLOAD = {
+    'tick': Tick(1_700_000_000, 1.1, 1.1002),
+    'ticks': [Tick(1, 1.1, 1.2), Tick(2, 1.3, 1.4)],
+    'pair': (1, 2),
+    'nested': {'last': Tick(3, np.float64(1.5), np.int64(2))},
+    'when': np.datetime64('2024-01-02T03:04:05'),
+    'when_ns': np.datetime64('2024-01-02T03:04:05.123456789', 'ns'),
+    'day': np.datetime64('2024-01-02'),
+    'times': np.array(['2024-01-02T03:04:05', '2024-01-03'], dtype='datetime64[s]'),
+    'values': np.arange(3),
+    'created': datetime(2024, 1, 2, 3, 4, 5),
+}
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+def test_stdlib_provider_writes_namedtuples_as_objects(app):
+    encoded = json.loads(StdlibJSONProvider(app).dumps(PAYLOAD))
+    assert encoded['tick'] == {'time': 1_700_000_000, 'bid': 1.1, 'ask': 1.1002}
+    assert encoded['ticks'][1] == {'time': 2, 'bid': 1.3, 'ask': 1.4}
+    assert encoded['pair'] == [1, 2]
+    assert encoded['nested']['last'] == {'time': 3, 'bid': 1.5, 'ask': 2}
+
+def test_stdlib_provider_writes_datetime64_in_iso_format(app):
+    encoded = json.loads(StdlibJSONProvider(app).dumps(PAYLOAD))
+    assert encoded['when'] == '2024-01-02T03:04:05'
+    assert encoded['when_ns'] == '2024-01-02T03:04:05.123456'
+    assert encoded['day'] == '2024-01-02T00:00:00'
+    assert encoded['times'] == ['2024-01-02T03:04:05', '2024-01-03T00:00:00']
+    assert encoded['created'] == 'Tue, 02 Jan 2024 03:04:05 GMT'
+
+@pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+def test_providers_agree(app):
+    stdlib = StdlibJSONProvider(app)
+    fast = OrjsonJSONProvider(app)
+    assert json.loads(fast.dumps(PAYLOAD)) == json.loads(stdlib.dumps(PAYLOAD))
+    with app.app_context():
+        assert json.loads(fast.response(PAYLOAD).get_data()) == json.loads(stdlib.response(PAYLOAD).get_data())
@@ -0,0 +1,43 @@
+import json
+import time
+import pytest
+
+pytest.importorskip('requests')  # callbacks are posted with requests
+import order_queue  # noqa: E402
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(order_queue, 'JOBS_FILE', str(tmp_path / 'order_jobs.jsonl'))
+    monkeypatch.setattr(order_queue, '_jobs', {})
+    monkeypatch.setattr(order_queue, '_job_queue', order_queue.queue.Queue())
+    monkeypatch.setattr(order_queue, '_journal_lines', 0)
+    return tmp_path
+
+def test_job_expired_in_the_queue_is_not_sent(jobs, monkeypatch):
+    monkeypatch.setattr(order_queue, '_app', None)  # any attempt to run it would fail
+    job = order_queue.submit_job('order', {"symbol": "EURUSD"})
+    order_queue._jobs[job['id']]['expires'] = time.time() - 1
+    order_queue._run_job(job['id'])
+    stored = order_queue.get_job(job['id'])
+    assert stored['status'] == 'failed'
+    assert stored['started'] is None and stored['http_status'] is None
+    assert 'never sent' in stored['error']
+
+def test_restart_fails_running_jobs_and_expires_old_queued_ones(jobs, monkeypatch):
+    now = time.time()
+    journal = [
+        {"id": "a", "kind": "order", "status": "running", "created": now - 5, "expires": now + 55},
+        {"id": "b", "kind": "order", "status": "queued", "created": now - 3600, "expires": now - 3540},
+        {"id": "c", "kind": "order", "status": "queued", "created": now - 1, "expires": now + 59},
+    ]
+    with open(order_queue.JOBS_FILE, 'w') as f:
+        f.writelines(json.dumps(job) + '\n' for job in journal)
+
+    monkeypatch.setattr(order_queue, '_app', None)
+    order_queue._load_jobs()
+    assert order_queue.get_job('a')['status'] == 'failed'
+    order_queue._run_job(order_queue._job_queue.get_nowait())
+    expired = order_queue.get_job('b')
+    assert expired['status'] == 'failed'
+    assert expired.get('http_status') is None and 'never sent' in expired['error']
+    assert order_queue.get_job('c')['status'] == 'queued'
@@ -0,0 +1,29 @@
+from collections import namedtuple
+import MetaTrader5 as mt5
+import pytest
+
+pytest.importorskip('requests')  # routes.order submits jobs through order_queue
+from routes import order  # noqa: E402
+
+OrderResult = namedtuple('OrderResult', 'order volume')
+LEG = {'symbol': 'EURUSD', 'type': mt5.ORDER_TYPE_BUY, 'deviation': 20, 'magic': 0, 'comment': '', 'type_filling': mt5.ORDER_FILLING_IOC}
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(mt5, 'positions_get', lambda ticket=None: (), raising=False)
+    monkeypatch.setattr(mt5, 'symbol_info_tick', lambda symbol: namedtuple('Tick', 'bid ask')(1.1, 1.1002), raising=False)
+    monkeypatch.setattr(order.rate_governor, 'order_send', lambda request, order_class: sent.append(request))
+    return sent
+
+@pytest.mark.parametrize('hedging, expected', [(None, 'rollback_failed'), (True, 'already_closed')])
+def test_no_offset_deal_unless_the_account_is_known_to_net(sent, monkeypatch, hedging, expected):
+    monkeypatch.setattr(order, 'is_hedging_account', lambda: hedging)
+    assert order._rollback_leg(LEG, OrderResult(7, 0.1)) == (expected, None)
+    assert sent == []
+
+def test_netting_account_offsets_the_fill(sent, monkeypatch):
+    monkeypatch.setattr(order, 'is_hedging_account', lambda: False)
+    status, _ = order._rollback_leg(LEG, OrderResult(7, 0.1))
+    assert status == 'rollback_failed'  # order_send returned None here
+    assert [request['type'] for request in sent] == [mt5.ORDER_TYPE_SELL]
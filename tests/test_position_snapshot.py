@@ -0,0 +1,31 @@
+from collections import namedtuple
+import MetaTrader5 as mt5
+import pytest
+import position_snapshot
+
+AccountInfo = namedtuple('AccountInfo', 'margin_mode')
+OrderResult = namedtuple('OrderResult', 'order')
+
+@pytest.fixture
+def account(monkeypatch):
+    account = {'info': None}
+    monkeypatch.setattr(mt5, 'account_info', lambda: account['info'], raising=False)
+    monkeypatch.setattr(mt5, 'last_error', lambda: (1, 'failed'), raising=False)
+    monkeypatch.setattr(position_snapshot, '_hedging_account', None)
+    return account
+
+def test_margin_mode_is_unknown_until_the_terminal_answers(account):
+    assert position_snapshot.is_hedging_account() is None
+    account['info'] = AccountInfo(mt5.ACCOUNT_MARGIN_MODE_RETAIL_HEDGING)
+    assert position_snapshot.is_hedging_account() is True
+    # Cached once known
+    account['info'] = None
+    assert position_snapshot.is_hedging_account() is True
+
+def test_netting_account(account):
+    account['info'] = AccountInfo(mt5.ACCOUNT_MARGIN_MODE_RETAIL_NETTING)
+    assert position_snapshot.is_hedging_account() is False
+
+def test_position_of_an_unknown_margin_mode_is_left_unconfirmed(account, monkeypatch):
+    monkeypatch.setattr(position_snapshot, 'find_position_by_symbol', lambda symbol: None)
+    assert position_snapshot.resolve_position_ticket(OrderResult(5), 'EURUSD') == (5, False)
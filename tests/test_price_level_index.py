@@ -0,0 +1,38 @@
+from price_level_index import PriceLevelIndex
+
+def _index(*levels):
+    index = PriceLevelIndex()
+    for price, level_id in levels:
+        index.add(price, level_id)
+    return index
+
+def test_falling_price_pops_levels_between_previous_and_current():
+    index = _index((1.10, 'a'), (1.11, 'b'), (1.12, 'c'), (1.13, 'd'))
+    assert sorted(index.pop_crossed_down(1.125, 1.105)) == ['b', 'c']
+    assert len(index) == 2
+
+def test_falling_price_includes_current_and_excludes_previous():
+    index = _index((1.10, 'at_current'), (1.12, 'at_previous'))
+    assert index.pop_crossed_down(1.12, 1.10) == ['at_current']
+
+def test_rising_price_includes_current_and_excludes_previous():
+    index = _index((1.10, 'at_previous'), (1.12, 'at_current'))
+    assert index.pop_crossed_up(1.10, 1.12) == ['at_current']
+
+def test_move_in_the_other_direction_pops_nothing():
+    index = _index((1.10, 'a'), (1.12, 'b'))
+    assert index.pop_crossed_down(1.10, 1.13) == []
+    assert index.pop_crossed_up(1.13, 1.09) == []
+    assert len(index) == 2
+
+def test_same_price_holds_several_ids():
+    index = _index((1.10, 'a'), (1.10, 'b'), (1.10, 'c'))
+    assert index.remove(1.10, 'b')
+    assert not index.remove(1.10, 'b')
+    assert sorted(index.pop_crossed_up(1.09, 1.10)) == ['a', 'c']
+    assert len(index) == 0
+
+def test_popped_levels_do_not_trigger_again():
+    index = _index((1.10, 'a'))
+    assert index.pop_crossed_up(1.09, 1.11) == ['a']
+    assert index.pop_crossed_down(1.11, 1.09) == []
@@ -0,0 +1,63 @@
+from collections import namedtuple
+import MetaTrader5 as mt5
+import pytest
+import rate_governor
+
+OrderSendResult = namedtuple('OrderSendResult', 'retcode comment')
+
+@pytest.fixture(autouse=True)
+def bucket(monkeypatch):
+    """A full bucket that does not refill during a test unless time is advanced."""
+    clock = [1000.0]
+    monkeypatch.setattr(rate_governor.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(rate_governor, '_tokens', rate_governor.ORDER_BURST)
+    monkeypatch.setattr(rate_governor, '_last_refill', clock[0])
+    monkeypatch.setattr(rate_governor, '_broker_throttled', 0)
+    monkeypatch.setattr(rate_governor, '_stats', {
+        request_class: {"granted": 0, "throttled": 0, "deferred": 0, "wait_seconds": 0.0}
+        for request_class in rate_governor.RESERVED_TOKENS
+    })
+    return clock
+
+def _drain(request_class):
+    granted = 0
+    while rate_governor.acquire(request_class, timeout=0):
+        granted += 1
+    return granted
+
+def test_burst_is_granted_then_deferred():
+    assert _drain(rate_governor.CLASS_CLOSE) == int(rate_governor.ORDER_BURST)
+    assert rate_governor.get_stats()['classes']['close']['deferred'] == 1
+
+def test_lower_priority_classes_leave_their_reserve():
+    burst = rate_governor.ORDER_BURST
+    assert _drain(rate_governor.CLASS_TRAILING) == int(burst - rate_governor.RESERVED_TOKENS['trailing'])
+    assert _drain(rate_governor.CLASS_MODIFY) == int(rate_governor.RESERVED_TOKENS['trailing'] - rate_governor.RESERVED_TOKENS['modify'])
+    assert _drain(rate_governor.CLASS_ENTRY) == int(rate_governor.RESERVED_TOKENS['modify'] - rate_governor.RESERVED_TOKENS['entry'])
+    # The last token is only available to closes
+    assert _drain(rate_governor.CLASS_CLOSE) == 1
+
+def test_tokens_refill_at_the_configured_rate(bucket):
+    _drain(rate_governor.CLASS_CLOSE)
+    bucket[0] += 3.5 / rate_governor.ORDER_RATE
+    assert _drain(rate_governor.CLASS_CLOSE) == 3
+
+def test_refill_is_capped_at_the_burst(bucket):
+    _drain(rate_governor.CLASS_CLOSE)
+    bucket[0] += 3600
+    assert _drain(rate_governor.CLASS_CLOSE) == int(rate_governor.ORDER_BURST)
+
+def test_order_send_raises_when_deferred(monkeypatch):
+    monkeypatch.setattr(mt5, 'order_send', lambda request: pytest.fail("order_send must not be called"), raising=False)
+    _drain(rate_governor.CLASS_CLOSE)
+    with pytest.raises(rate_governor.OrderRateLimited):
+        rate_governor.order_send({}, rate_governor.CLASS_ENTRY, timeout=0)
+
+def test_broker_throttling_drains_the_bucket(monkeypatch):
+    result = OrderSendResult(mt5.TRADE_RETCODE_TOO_MANY_REQUESTS, 'Too many requests')
+    monkeypatch.setattr(mt5, 'order_send', lambda request: result, raising=False)
+    assert rate_governor.order_send({}, rate_governor.CLASS_ENTRY) is result
+    stats = rate_governor.get_stats()
+    assert stats['available_tokens'] == 0
+    assert stats['broker_throttled'] == 1
+    assert not rate_governor.acquire(rate_governor.CLASS_CLOSE, timeout=0)
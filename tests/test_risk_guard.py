@@ -0,0 +1,146 @@
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+import pytest
+import account_state
+import risk_guard
+
+AccountInfo = namedtuple('AccountInfo', 'equity balance margin margin_level')
+# The fixture replaces flatten; its own test calls the real one
+ORIGINAL_FLATTEN = risk_guard.flatten
+
+@pytest.fixture
+def account(tmp_path, monkeypatch):
+    """The account the guard reads; flatten calls are counted instead of closing anything."""
+    account = SimpleNamespace(info=AccountInfo(10000.0, 10000.0, 0.0, 0.0), flattened=0)
+    monkeypatch.setattr(risk_guard, 'RISK_GUARD_FILE', str(tmp_path / 'risk_guard.json'))
+    monkeypatch.setattr(risk_guard, 'risk_config', dict(risk_guard.DEFAULT_CONFIG))
+    monkeypatch.setattr(risk_guard, '_state', {
+        "tripped": False, "reason": None, "tripped_at": None, "day": None, "day_start_equity": None,
+    })
+    monkeypatch.setattr(risk_guard, '_last_sample', {})
+    monkeypatch.setattr(account_state, 'get_account_info', lambda max_age_ms=None: account.info)
+    monkeypatch.setattr(account_state, 'request_interval', lambda name, seconds: None)
+
+    def flatten():
+        account.flattened += 1
+
+    monkeypatch.setattr(risk_guard, 'flatten', flatten)
+    return account
+
+def _wait_for(condition, timeout=2.0):
+    """Wait for work the guard hands to a background thread, such as flattening."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.01)
+
+@pytest.fixture
+def sample(account):
+    """Publish an account update to the guard, as the account state sampler does."""
+    def publish(equity, margin=0.0, margin_level=0.0):
+        account.info = AccountInfo(equity, 10000.0, margin, margin_level)
+        risk_guard._on_account_update(account.info, {"equity": equity})
+    return publish
+
+def test_enabling_the_guard_past_a_limit_trips_at_once(account):
+    account.info = AccountInfo(9400.0, 10000.0, 0.0, 0.0)
+    risk_guard.set_risk_config(equity_floor=9500)
+    assert not risk_guard.is_tripped()
+    risk_guard.set_risk_config(enabled=True)
+    assert risk_guard.is_tripped()
+    _wait_for(lambda: account.flattened == 1)
+
+def test_tightening_a_limit_trips_without_an_equity_change(account, sample):
+    risk_guard.set_risk_config(enabled=True, equity_floor=9000)
+    sample(9500.0)
+    assert not risk_guard.is_tripped()
+    risk_guard.set_risk_config(equity_floor=9600)
+    assert risk_guard.is_tripped()
+    assert "floor" in risk_guard.get_status()["reason"]
+
+def test_reset_without_rebase_trips_again_while_past_the_limit(account, sample):
+    risk_guard.set_risk_config(enabled=True, max_daily_drawdown=500)
+    sample(10000.0)
+    sample(9400.0)
+    assert risk_guard.is_tripped()
+    risk_guard.reset()
+    assert risk_guard.is_tripped()
+
+def test_reset_with_rebase_measures_from_the_current_equity(account, sample):
+    risk_guard.set_risk_config(enabled=True, max_daily_drawdown=500)
+    sample(10000.0)
+    sample(9400.0)
+    risk_guard.reset(rebase=True)
+    assert not risk_guard.is_tripped()
+    sample(9000.0)
+    assert not risk_guard.is_tripped()
+    sample(8900.0)
+    assert risk_guard.is_tripped()
+
+def test_equity_floor(account, sample):
+    risk_guard.set_risk_config(enabled=True, equity_floor=9000)
+    sample(9000.01)
+    assert not risk_guard.is_tripped()
+    sample(9000.0)
+    assert risk_guard.is_tripped()
+
+def test_daily_drawdown_in_percent_of_the_starting_equity(account, sample):
+    risk_guard.set_risk_config(enabled=True, max_daily_drawdown_pct=5)
+    sample(10000.0)
+    sample(9501.0)
+    assert not risk_guard.is_tripped()
+    sample(9500.0)
+    assert risk_guard.is_tripped()
+
+def test_margin_level_is_only_checked_while_margin_is_used(account, sample):
+    risk_guard.set_risk_config(enabled=True, min_margin_level=100)
+    sample(10000.0, margin=0.0, margin_level=0.0)
+    assert not risk_guard.is_tripped()
+    sample(10000.0, margin=5000.0, margin_level=90.0)
+    assert risk_guard.is_tripped()
+
+def test_drawdown_restarts_from_the_equity_of_a_new_day(account, sample):
+    risk_guard.set_risk_config(enabled=True, max_daily_drawdown=500)
+    sample(10000.0)
+    risk_guard._state["day"] = "2000-01-01"
+    sample(9400.0)
+    assert not risk_guard.is_tripped()
+    assert risk_guard.get_status()["day_start_equity"] == 9400.0
+
+def test_disabled_guard_never_trips(account, sample):
+    risk_guard.set_risk_config(equity_floor=9000)
+    sample(100.0)
+    assert not risk_guard.is_tripped()
+
+def test_trip_survives_a_restart(account, sample, monkeypatch):
+    risk_guard.set_risk_config(enabled=True, equity_floor=9000)
+    sample(8000.0)
+    monkeypatch.setattr(risk_guard, '_state', {
+        "tripped": False, "reason": None, "tripped_at": None, "day": None, "day_start_equity": None,
+    })
+    risk_guard.load_risk_guard()
+    assert risk_guard.is_tripped()
+    assert risk_guard.risk_config["equity_floor"] == 9000
+
+def test_flatten_retries_positions_that_refuse_to_close(account, monkeypatch):
+    Position = namedtuple('Position', 'ticket')
+    open_positions = {1: Position(1), 2: Position(2), 3: Position(3)}
+    refusals = {3: 1}
+    rounds = []
+
+    def close_positions(positions, comment, max_workers):
+        rounds.append(sorted(position['ticket'] for position in positions))
+        closed = []
+        for position in positions:
+            if refusals.get(position['ticket']):
+                refusals[position['ticket']] -= 1
+                continue
+            closed.append(open_positions.pop(position['ticket']))
+        return closed
+
+    monkeypatch.setattr(risk_guard.mt5, 'positions_get', lambda: tuple(open_positions.values()), raising=False)
+    monkeypatch.setattr(risk_guard, 'close_positions', close_positions)
+    ORIGINAL_FLATTEN()
+    assert rounds == [[1, 2, 3], [3]]
+    assert open_positions == {}
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+import MetaTrader5 as mt5
+import pytest
+from flask import Flask
+import trade_ledger
+from routes.history import history_bp
+
+Deal = namedtuple('Deal', list(trade_ledger.DEAL_COLUMNS))
+Order = namedtuple('Order', list(trade_ledger.ORDER_COLUMNS))
+ActiveOrder = namedtuple('ActiveOrder', 'ticket')
+
+def _deal(ticket, deal_time, position_id=1, order=0):
+    values = dict.fromkeys(trade_ledger.DEAL_COLUMNS, 0)
+    values.update(ticket=ticket, time=deal_time, position_id=position_id, order=order, symbol='EURUSD', comment='', external_id='')
+    return Deal(**values)
+
+def _order(ticket, time_setup):
+    values = dict.fromkeys(trade_ledger.ORDER_COLUMNS, 0)
+    values.update(ticket=ticket, time_setup=time_setup, symbol='EURUSD', comment='', external_id='')
+    return Order(**values)
+
+class Terminal:
+    def __init__(self):
+        self.deals = []
+        self.history_orders = []
+        self.active_orders = []
+        self.fail = False
+
+    def history_deals_get(self, from_timestamp=None, to_timestamp=None, position=None):
+        if self.fail:
+            return None
+        if position is not None:
+            return tuple(deal for deal in self.deals if deal.position_id == position)
+        return tuple(deal for deal in self.deals if from_timestamp <= deal.time <= to_timestamp)
+
+    def history_orders_get(self, from_timestamp=None, to_timestamp=None, ticket=None):
+        if ticket is not None:
+            return tuple(order for order in self.history_orders if order.ticket == ticket)
+        return tuple(order for order in self.history_orders if from_timestamp <= order.time_setup <= to_timestamp)
+
+    def orders_get(self):
+        return tuple(ActiveOrder(ticket) for ticket in self.active_orders)
+
+@pytest.fixture
+def terminal(tmp_path, monkeypatch):
+    terminal = Terminal()
+    for name in ('history_deals_get', 'history_orders_get', 'orders_get'):
+        monkeypatch.setattr(mt5, name, getattr(terminal, name), raising=False)
+    monkeypatch.setattr(mt5, 'last_error', lambda: (1, 'failed'), raising=False)
+    monkeypatch.setattr(trade_ledger, 'LEDGER_FILE', str(tmp_path / 'trade_ledger.db'))
+    monkeypatch.setattr(trade_ledger, '_connection', None)
+    monkeypatch.setattr(trade_ledger, '_ready', threading.Event())
+    monkeypatch.setattr(trade_ledger, '_last_sync', 0.0)
+    yield terminal
+    if trade_ledger._connection is not None:
+        trade_ledger._connection.close()
+
+@pytest.mark.parametrize('symbol, group, expected', [
+    ('EURUSD', '*', True),
+    ('EURUSD', '*USD*', True),
+    ('EURUSD', '*USD*,!EURUSD', False),
+    ('GBPUSD', '*USD*,!EURUSD', True),
+    ('XAUUSD', 'EUR*,GBP*', False),
+    ('EURUSD', '!GBP*', True),
+    ('EURUSD.m', ' EURUSD* , !*.x ', True),
+    ('eurusd', 'EURUSD', False),
+])
+def test_symbol_in_group(symbol, group, expected):
+    assert trade_ledger.symbol_in_group(symbol, group) is expected
+
+def test_queries_use_the_terminal_until_the_backfill_finished(terminal):
+    now = int(time.time())
+    terminal.deals = [_deal(2, now, position_id=7), _deal(1, now - 60, position_id=7)]
+    assert [deal['ticket'] for deal in trade_ledger.get_position_deals(7)] == [1, 2]
+    with pytest.raises(trade_ledger.LedgerNotReady):
+        trade_ledger.ensure_fresh()
+
+    trade_ledger.sync()
+    assert trade_ledger.is_ready()
+    assert [deal['ticket'] for deal in trade_ledger.query_deals(0, now)] == [1, 2]
+
+def test_failed_backfill_keeps_the_ledger_not_ready(terminal):
+    terminal.fail = True
+    with pytest.raises(trade_ledger.LedgerSyncError):
+        trade_ledger.sync()
+    assert not trade_ledger.is_ready()
+
+def test_concurrent_stale_requests_share_one_sync(terminal, monkeypatch):
+    trade_ledger.sync()
+    trade_ledger._last_sync = 0.0
+    calls = []
+
+    def slow_sync_table(table, columns, fetch, time_field):
+        calls.append(table)
+        time.sleep(0.05)
+        return []
+
+    monkeypatch.setattr(trade_ledger, '_sync_table', slow_sync_table)
+    threads = [threading.Thread(target=trade_ledger.ensure_fresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == ['deals', 'orders']
+
+def test_pending_order_placed_before_the_watermark_is_stored_when_it_ends(terminal):
+    now = int(time.time())
+    terminal.active_orders = [42]
+    terminal.history_orders = [_order(41, now)]
+    trade_ledger.sync()
+
+    # Canceled weeks after it was placed: outside every later sync window
+    terminal.active_orders = []
+    terminal.history_orders.append(_order(42, now - 30 * 86400))
+    trade_ledger.sync()
+    assert [order['ticket'] for order in trade_ledger.get_orders(42)] == [42]
+    assert trade_ledger.query("SELECT ticket FROM pending_orders") == []
+
+def test_terminal_answers_deal_queries_like_the_ledger(terminal):
+    now = int(time.time())
+    terminal.deals = [_deal(ticket, now - 3600 * ticket, position_id=ticket % 3, order=ticket) for ticket in range(1, 40)]
+    terminal.deals += [_deal(100, now - 7200, position_id=1)]
+    queries = [
+        {},
+        {'position': 1},
+        {'symbol': 'EURUSD', 'entry': 0},
+        {'group': '*USD*,!EURUSD'},
+        {'after': (now - 20 * 3600, 20), 'limit': 5},
+    ]
+    before = [trade_ledger.terminal_deals(now - 30 * 3600, now - 3600, **filters) for filters in queries]
+    trade_ledger.sync()
+    after = [trade_ledger.query_deals(now - 30 * 3600, now - 3600, **filters) for filters in queries]
+    assert before == after
+    assert [len(deals) for deals in before] == [31, 11, 31, 0, 5]
+
+def test_terminal_failure_raises(terminal):
+    terminal.fail = True
+    with pytest.raises(trade_ledger.LedgerSyncError):
+        trade_ledger.terminal_deals(0, int(time.time()))
+    with pytest.raises(trade_ledger.LedgerSyncError):
+        trade_ledger.terminal_deals(0, int(time.time()), position=1)
+
+def test_deals_endpoint_answers_from_the_terminal_while_loading(terminal):
+    app = Flask(__name__)
+    app.register_blueprint(history_bp)
+    client = app.test_client()
+    now = int(time.time())
+    terminal.deals = [_deal(1, now - 60, position_id=7), _deal(2, now - 30, position_id=8)]
+    day_ago = datetime.fromtimestamp(now - 86400, tz=timezone.utc).isoformat()
+    in_a_day = datetime.fromtimestamp(now + 86400, tz=timezone.utc).isoformat()
+    query = {'from_date': day_ago, 'to_date': in_a_day}
+
+    response = client.get('/history_deals_get', query_string={**query, 'position': 7})
+    assert response.status_code == 200
+    assert [deal['ticket'] for deal in response.json] == [1]
+    response = client.get('/history_deals_get', query_string={**query, 'stream': 1})
+    assert [deal['ticket'] for deal in response.json] == [1, 2]
+    assert not trade_ledger.is_ready()
+
+    terminal.fail = True
+    assert client.get('/history_deals_get', query_string=query).status_code == 503
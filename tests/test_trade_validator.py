@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+import MetaTrader5 as mt5
+import pytest
+import trade_validator
+from constants import SYMBOL_FILLING_FOK, SYMBOL_FILLING_IOC
+from trade_validator import TradeValidationError, forget_filling_mode, resolve_filling_mode, supported_filling_modes
+
+def _symbol(filling_mode, trade_exemode=mt5.SYMBOL_TRADE_EXECUTION_MARKET):
+    return SimpleNamespace(filling_mode=filling_mode, trade_exemode=trade_exemode)
+
+@pytest.fixture
+def symbols(monkeypatch):
+    """Symbol specifications returned by the symbol cache; lookups are counted."""
+    symbols = SimpleNamespace(specs={}, lookups=[])
+
+    def get_symbol_info(symbol):
+        symbols.lookups.append(symbol)
+        return symbols.specs.get(symbol)
+
+    monkeypatch.setattr(trade_validator, 'get_symbol_info', get_symbol_info)
+    monkeypatch.setattr(trade_validator, '_filling_mode_cache', {})
+    return symbols
+
+@pytest.mark.parametrize('filling_mode, trade_exemode, expected', [
+    (SYMBOL_FILLING_IOC | SYMBOL_FILLING_FOK, mt5.SYMBOL_TRADE_EXECUTION_MARKET, [mt5.ORDER_FILLING_IOC, mt5.ORDER_FILLING_FOK]),
+    (SYMBOL_FILLING_FOK, mt5.SYMBOL_TRADE_EXECUTION_MARKET, [mt5.ORDER_FILLING_FOK]),
+    (0, mt5.SYMBOL_TRADE_EXECUTION_INSTANT, [mt5.ORDER_FILLING_RETURN]),
+    (SYMBOL_FILLING_IOC, mt5.SYMBOL_TRADE_EXECUTION_EXCHANGE, [mt5.ORDER_FILLING_IOC, mt5.ORDER_FILLING_RETURN]),
+    (0, mt5.SYMBOL_TRADE_EXECUTION_MARKET, []),
+])
+def test_supported_filling_modes(filling_mode, trade_exemode, expected):
+    assert supported_filling_modes(_symbol(filling_mode, trade_exemode)) == expected
+
+def test_detected_mode_is_cached_until_forgotten(symbols):
+    symbols.specs['EURUSD'] = _symbol(SYMBOL_FILLING_FOK)
+    assert resolve_filling_mode('EURUSD') == mt5.ORDER_FILLING_FOK
+    symbols.specs['EURUSD'] = _symbol(SYMBOL_FILLING_IOC)
+    assert resolve_filling_mode('EURUSD') == mt5.ORDER_FILLING_FOK
+    assert symbols.lookups == ['EURUSD']
+
+    forget_filling_mode('EURUSD')
+    assert resolve_filling_mode('EURUSD') == mt5.ORDER_FILLING_IOC
+
+def test_requested_mode_is_checked_against_the_symbol(symbols):
+    symbols.specs['EURUSD'] = _symbol(SYMBOL_FILLING_IOC)
+    assert resolve_filling_mode('EURUSD', 'order_filling_ioc') == mt5.ORDER_FILLING_IOC
+    with pytest.raises(TradeValidationError, match="not supported"):
+        resolve_filling_mode('EURUSD', 'ORDER_FILLING_FOK')
+
+def test_requested_mode_is_checked_even_when_a_mode_is_cached(symbols):
+    symbols.specs['EURUSD'] = _symbol(SYMBOL_FILLING_IOC)
+    resolve_filling_mode('EURUSD')
+    with pytest.raises(TradeValidationError, match="not supported"):
+        resolve_filling_mode('EURUSD', 'ORDER_FILLING_RETURN')
+
+@pytest.mark.parametrize('symbol, type_filling, message', [
+    ('EURUSD', 'ORDER_FILLING_ALL', "Invalid filling type"),
+    ('UNKNOWN', None, "Unknown symbol"),
+    ('LOCKED', None, "No supported filling mode"),
+])
+def test_resolve_errors(symbols, symbol, type_filling, message):
+    symbols.specs['EURUSD'] = _symbol(SYMBOL_FILLING_IOC)
+    symbols.specs['LOCKED'] = _symbol(0)
+    with pytest.raises(TradeValidationError, match=message):
+        resolve_filling_mode(symbol, type_filling)
@@ -0,0 +1,127 @@
+from collections import namedtuple
+import MetaTrader5 as mt5
+import pytest
+import virtual_stops
+
+Position = namedtuple('Position', 'ticket symbol type')
+Tick = namedtuple('Tick', 'bid ask')
+CloseResult = namedtuple('CloseResult', 'price')
+
+class Terminal:
+    def __init__(self):
+        self.positions = {}
+        self.tick = Tick(1.1000, 1.1002)
+
+    def positions_get(self, ticket=None):
+        if ticket is None:
+            return tuple(self.positions.values())
+        return tuple(position for position in self.positions.values() if position.ticket == ticket)
+
+    def symbol_info_tick(self, symbol):
+        return self.tick
+
+@pytest.fixture
+def terminal(tmp_path, monkeypatch):
+    terminal = Terminal()
+    monkeypatch.setattr(mt5, 'positions_get', terminal.positions_get, raising=False)
+    monkeypatch.setattr(mt5, 'symbol_info_tick', terminal.symbol_info_tick, raising=False)
+    monkeypatch.setattr(virtual_stops, 'VIRTUAL_STOPS_FILE', str(tmp_path / 'virtual_stops.json'))
+    for name in ('virtual_stops', '_indexes', '_last_prices', '_fresh_stops'):
+        monkeypatch.setattr(virtual_stops, name, {})
+    monkeypatch.setattr(virtual_stops, '_pending_closes', set())
+    monkeypatch.setattr(virtual_stops, '_close_backoff', {})
+    return terminal
+
+def _open(terminal, ticket, position_type=mt5.ORDER_TYPE_BUY):
+    terminal.positions[ticket] = Position(ticket, 'EURUSD', position_type)
+
+def _tick(terminal, bid):
+    terminal.tick = Tick(bid, bid + 0.0002)
+    with virtual_stops._lock:
+        return virtual_stops._collect_triggered('EURUSD', terminal.tick)
+
+def test_buy_stop_loss_triggers_when_bid_falls_through_it(terminal):
+    _open(terminal, 1)
+    virtual_stops.set_virtual_stop(1, sl=1.0950, tp=1.1100)
+    assert _tick(terminal, 1.0990) == set()
+    assert _tick(terminal, 1.0940) == {1}
+
+def test_sell_take_profit_triggers_on_ask(terminal):
+    _open(terminal, 2, mt5.ORDER_TYPE_SELL)
+    virtual_stops.set_virtual_stop(2, sl=1.1100, tp=1.0950)
+    assert _tick(terminal, 1.0960) == set()
+    assert _tick(terminal, 1.0947) == {2}
+
+def test_crossed_levels_are_rejected(terminal):
+    _open(terminal, 3)
+    with pytest.raises(ValueError):
+        virtual_stops.set_virtual_stop(3, sl=1.1000)
+
+def test_level_registered_between_ticks_is_checked_against_the_next_price(terminal):
+    _open(terminal, 4)
+    _open(terminal, 5)
+    virtual_stops.set_virtual_stop(4, tp=1.2000)
+    _tick(terminal, 1.1000)
+    # The price rallies and the new stop is registered below it, above the previous tick
+    terminal.tick = Tick(1.1200, 1.1202)
+    virtual_stops.set_virtual_stop(5, sl=1.1100)
+    # Falling from 1.1000 to 1.1050 never crosses 1.1100, yet Bid is below the stop
+    assert _tick(terminal, 1.1050) == {5}
+
+def test_fresh_level_not_crossed_is_left_to_the_index(terminal):
+    _open(terminal, 4)
+    _open(terminal, 6)
+    virtual_stops.set_virtual_stop(4, tp=1.2000)
+    _tick(terminal, 1.1000)
+    virtual_stops.set_virtual_stop(6, sl=1.0900)
+    assert _tick(terminal, 1.0950) == set()
+    assert _tick(terminal, 1.0890) == {6}
+
+def test_prune_keeps_positions_missing_from_a_stale_snapshot(terminal, monkeypatch):
+    _open(terminal, 7)
+    virtual_stops.set_virtual_stop(7, sl=1.0900)
+    monkeypatch.setattr(virtual_stops, 'get_snapshot', lambda max_age=None: [])
+    virtual_stops._prune_closed_positions()
+    assert 7 in virtual_stops.virtual_stops
+
+def test_prune_removes_closed_positions(terminal, monkeypatch):
+    _open(terminal, 8)
+    virtual_stops.set_virtual_stop(8, sl=1.0900)
+    del terminal.positions[8]
+    monkeypatch.setattr(virtual_stops, 'get_snapshot', lambda max_age=None: [])
+    virtual_stops._prune_closed_positions()
+    assert virtual_stops.virtual_stops == {}
+    assert virtual_stops._indexes == {}
+
+def test_failing_close_backs_off(terminal, monkeypatch):
+    _open(terminal, 9)
+    virtual_stops.set_virtual_stop(9, sl=1.0900)
+    clock = [1000.0]
+    attempts = []
+
+    def close_position(position, comment):
+        attempts.append(clock[0])
+        return None
+
+    monkeypatch.setattr(virtual_stops.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(virtual_stops, 'close_position', close_position)
+    virtual_stops._pending_closes.add(9)
+    # Polled every 100 ms for 10 s: 0.5 s, 1 s, 2 s and 4 s between the attempts
+    for _ in range(100):
+        virtual_stops._close_pending()
+        clock[0] += 0.1
+    assert [round(attempt - 1000.0, 1) for attempt in attempts] == [0.0, 0.5, 1.5, 3.5, 7.5]
+
+    clock[0] += 60
+    monkeypatch.setattr(virtual_stops, 'close_position', lambda position, comment: CloseResult(1.0899))
+    virtual_stops._close_pending()
+    assert virtual_stops.virtual_stops == {}
+    assert virtual_stops._close_backoff == {}
+
+def test_failed_close_delay_is_capped(terminal, monkeypatch):
+    monkeypatch.setattr(virtual_stops.time, 'monotonic', lambda: 0.0)
+    for _ in range(30):
+        virtual_stops._defer_close(10)
+    failures, next_attempt = virtual_stops._close_backoff[10]
+    assert failures == 30
+    assert next_attempt == virtual_stops.CLOSE_RETRY_MAX_SECONDS